@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# a stand-in for a pterodactyl panel, its wings nodes and a plugin origin, served from one
+# local http server, plus the wings console websocket on a second port. it keeps servers and
+# their files in memory, counts and times every call by endpoint and can add latency and a
+# per minute rate limit like the real panel.
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib import parse
+
+import base64
+import email.parser
+import email.policy
+import hashlib
+import io
+import json
+import random
+import re
+import socket
+import struct
+import tarfile
+import threading
+import time
+
+
+class rpMockPanel:
+
+    def __init__(self, servers:int=1, pagesize:int=50, latency:float=0, ratelimit:int=0, origins:dict=None, state:str='running', renameorder:str='ordered'):
+        self.pagesize = pagesize
+        # 'ordered' applies the renames of one request in order and stops at the first that fails,
+        # 'shuffle' applies them in any order and carries on past failures like wings, which runs
+        # them concurrently.
+        self.renameorder = renameorder
+        # rename destinations answered 500 without moving anything, to test recovery.
+        self.renamefailures = set()
+        # seconds added to every panel and wings response.
+        self.latency = latency
+        # panel requests allowed per minute, 0 for no limit. past it the panel answers 429.
+        self.ratelimit = ratelimit
+        self.servers = {}
+        for i in range(servers):
+            identifier = "{:08x}".format(i + 1)
+            self.servers[identifier] = {'identifier':identifier, 'uuid':"{}-0000-0000-0000-000000000000".format(identifier), 'name':"Rust {}".format(i + 1), 'docker_image':'quay.io/pterodactyl/core:rust', 'state':state, 'files':{}}
+        # path -> body served by the origin, with an ETag derived from the body.
+        self.origins = dict(origins or {})
+        # path -> X-Checksum-Sha256 the origin sends with it, to test integrity checks.
+        self.checksums = {}
+        # plugin stem -> how the console answers its oxide.reload: 'loaded' (the default) prints the
+        # compiled and loaded lines, 'failed' a compile error and 'silent' nothing at all.
+        self.reloads = {}
+        self.calls = {}
+        # call type -> seconds each call took to answer, latency included.
+        self.samples = {}
+        self._lock = threading.Lock()
+        self._window = []
+        self._httpd = None
+        self._wslistener = None
+
+    def start(self) -> 'rpMockPanel':
+        panel = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                panel._timed(self, 'GET')
+
+            def do_POST(self):
+                panel._timed(self, 'POST')
+
+            def do_PUT(self):
+                panel._timed(self, 'PUT')
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        self._wslistener = socket.create_server(('127.0.0.1', 0))
+        threading.Thread(target=self._wsserve, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        if self._wslistener:
+            self._wslistener.close()
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:{}".format(self._httpd.server_address[1])
+
+    def origin(self, name:str) -> str:
+        return "{}/origin/{}".format(self.url, name)
+
+    def setfile(self, identifier:str, path:str, body:bytes):
+        with self._lock:
+            self.servers[identifier]['files'][path.strip('/')] = (body, time.time())
+
+    def getfile(self, identifier:str, path:str) -> bytes:
+        with self._lock:
+            entry = self.servers[identifier]['files'].get(path.strip('/'))
+        return entry[0] if entry else None
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.samples.clear()
+            self._window.clear()
+
+    def count(self, prefix:str='') -> int:
+        with self._lock:
+            return sum(n for key, n in self.calls.items() if key.startswith(prefix))
+
+    def _count(self, key:str):
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def _timed(self, handler, method:str):
+        started = time.perf_counter()
+        key = self._dispatch(handler, method)
+        with self._lock:
+            self.samples.setdefault(key, []).append(time.perf_counter() - started)
+
+    def _limited(self):
+        # (limited, remaining, retry after) for one more panel request.
+        if not self.ratelimit:
+            return False, None, 0
+        with self._lock:
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 60]
+            if len(self._window) >= self.ratelimit:
+                return True, 0, max(1, int(60 - (now - self._window[0])) + 1)
+            self._window.append(now)
+            return False, self.ratelimit - len(self._window), 0
+
+    def _reply(self, handler, status:int, body=b'', headers:dict=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers = dict(headers or {}, **{'Content-Type':'application/json'})
+        handler.send_response(status)
+        for key, value in (headers or {}).items():
+            handler.send_header(key, str(value))
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        if handler.command != 'HEAD':
+            handler.wfile.write(body)
+
+    def _body(self, handler) -> bytes:
+        length = int(handler.headers.get('Content-Length') or 0)
+        return handler.rfile.read(length) if length else b''
+
+    def _dispatch(self, handler, method:str):
+        url = parse.urlsplit(handler.path)
+        query = dict(parse.parse_qsl(url.query))
+        path = url.path
+        # returns the call type the request was counted under.
+        if path.startswith('/origin/'):
+            self._count('origin')
+            self._origin(handler, path[len('/origin/'):])
+            return 'origin'
+        if self.latency:
+            time.sleep(self.latency)
+        if path.startswith('/upload/'):
+            self._count('wings upload')
+            self._upload(handler, path[len('/upload/'):], query)
+            return 'wings upload'
+        match = re.match(r'^/api/client(?:/servers/([^/]+)(/.*)?)?$', path)
+        if not match:
+            self._reply(handler, 404, {'errors':[{'detail':'not found'}]})
+            return 'unknown'
+        identifier, action = match.group(1), (match.group(2) or '').lstrip('/')
+        key = "{} {}".format(method, action or ('servers' if identifier is None else 'server'))
+        self._count(key)
+        self._panel(handler, method, identifier, action, query)
+        return key
+
+    def _panel(self, handler, method:str, identifier:str, action:str, query:dict):
+        limited, remaining, retryafter = self._limited()
+        headers = {'X-RateLimit-Limit':self.ratelimit, 'X-RateLimit-Remaining':remaining} if self.ratelimit else {}
+        if limited:
+            return self._reply(handler, 429, {'errors':[{'code':'TooManyRequestsHttpException', 'detail':'Too Many Attempts.'}]}, dict(headers, **{'Retry-After':retryafter}))
+        if identifier is None:
+            return self._list(handler, query, headers)
+        server = self.servers.get(identifier)
+        if server is None:
+            return self._reply(handler, 404, {'errors':[{'detail':'server not found'}]}, headers)
+        if action == 'resources':
+            return self._reply(handler, 200, {'attributes':{'current_state':server['state'], 'resources':{}}}, headers)
+        if action == 'files/list':
+            return self._listfiles(handler, server, query.get('directory', '/'), headers)
+        if action == 'files/contents':
+            with self._lock:
+                entry = server['files'].get(query.get('file', '').strip('/'))
+            if entry is None:
+                return self._reply(handler, 404, {'errors':[{'detail':'file not found'}]}, headers)
+            return self._reply(handler, 200, entry[0], dict(headers, **{'Content-Type':'text/plain'}))
+        if action == 'websocket':
+            return self._reply(handler, 200, {'data':{'token':"token-{}".format(identifier), 'socket':"ws://127.0.0.1:{}/api/servers/{}/ws".format(self._wslistener.getsockname()[1], server['uuid'])}}, headers)
+        if action == 'files/upload':
+            return self._reply(handler, 200, {'object':'signed_url', 'attributes':{'url':"{}/upload/{}?token=signed".format(self.url, identifier)}}, headers)
+        if action == 'files/rename' and method == 'PUT':
+            payload = json.loads(self._body(handler))
+            root = payload.get('root', '/').strip('/')
+            renames = list(payload['files'])
+            if self.renameorder == 'shuffle':
+                random.shuffle(renames)
+            failure = None
+            with self._lock:
+                for rename in renames:
+                    source = "/".join(p for p in (root, rename['from'].strip('/')) if p)
+                    dest = "/".join(p for p in (root, rename['to'].strip('/')) if p)
+                    if dest in self.renamefailures:
+                        failure = failure or (500, "could not rename to {}".format(dest))
+                    elif source not in server['files']:
+                        failure = failure or (404, "{} not found".format(source))
+                    elif dest in server['files']:
+                        failure = failure or (400, "{} already exists".format(dest))
+                    else:
+                        server['files'][dest] = server['files'].pop(source)
+                    if failure and self.renameorder != 'shuffle':
+                        break
+            if failure:
+                return self._reply(handler, failure[0], {'errors':[{'detail':failure[1]}]}, headers)
+            return self._reply(handler, 204, b'', headers)
+        if action == 'files/delete' and method == 'POST':
+            payload = json.loads(self._body(handler))
+            root = payload.get('root', '/').strip('/')
+            with self._lock:
+                for name in payload['files']:
+                    server['files'].pop("/".join(p for p in (root, name.strip('/')) if p), None)
+            return self._reply(handler, 204, b'', headers)
+        if action == 'files/decompress' and method == 'POST':
+            payload = json.loads(self._body(handler))
+            root = payload.get('root', '/').strip('/')
+            with self._lock:
+                entry = server['files'].get("/".join(p for p in (root, payload['file'].strip('/')) if p))
+                if entry is None:
+                    return self._reply(handler, 404, {'errors':[{'detail':'file not found'}]}, headers)
+                with tarfile.open(fileobj=io.BytesIO(entry[0]), mode='r:*') as tar:
+                    for member in tar.getmembers():
+                        if member.isfile():
+                            server['files']["/".join(p for p in (root, member.name.strip('/')) if p)] = (tar.extractfile(member).read(), time.time())
+            return self._reply(handler, 204, b'', headers)
+        if action == 'command' and method == 'POST':
+            self._body(handler)
+            return self._reply(handler, 204, b'', headers)
+        return self._reply(handler, 404, {'errors':[{'detail':'not found'}]}, headers)
+
+    def _list(self, handler, query:dict, headers:dict):
+        page = int(query.get('page', 1))
+        servers = list(self.servers.values())
+        pages = max(1, (len(servers) + self.pagesize - 1) // self.pagesize)
+        data = [{'object':'server', 'attributes':{k: v for k, v in s.items() if k not in ('files', 'state')}} for s in servers[(page - 1) * self.pagesize:page * self.pagesize]]
+        return self._reply(handler, 200, {'object':'list', 'data':data, 'meta':{'pagination':{'total':len(servers), 'per_page':self.pagesize, 'current_page':page, 'total_pages':pages}}}, headers)
+
+    def _listfiles(self, handler, server:dict, directory:str, headers:dict):
+        directory = directory.strip('/')
+        data = []
+        with self._lock:
+            for path, (body, modified) in server['files'].items():
+                parent, _sep, name = path.rpartition('/')
+                if parent == directory:
+                    data.append({'object':'file_object', 'attributes':{'name':name, 'mode':'-rw-r--r--', 'size':len(body), 'is_file':True, 'is_symlink':False, 'mimetype':'text/plain', 'created_at':time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(modified)), 'modified_at':"{:.6f}".format(modified)}})
+        return self._reply(handler, 200, {'object':'list', 'data':data}, headers)
+
+    def _upload(self, handler, identifier:str, query:dict):
+        server = self.servers.get(identifier)
+        body = self._body(handler)
+        message = email.parser.BytesParser(policy=email.policy.default).parsebytes(b'Content-Type: ' + handler.headers['Content-Type'].encode() + b'\r\n\r\n' + body)
+        directory = query.get('directory', '/').strip('/')
+        with self._lock:
+            for part in message.iter_parts():
+                name = part.get_filename()
+                server['files']["/".join(p for p in (directory, name) if p)] = (part.get_payload(decode=True), time.time())
+        return self._reply(handler, 200, b'')
+
+    def _wsserve(self):
+        while True:
+            try:
+                sock, address = self._wslistener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._wsconsole, args=(sock,), daemon=True).start()
+
+    def _wsconsole(self, sock):
+        # the wings console protocol: json {'event', 'args'} text frames, an auth event with the
+        # token from the websocket endpoint first, then commands answered with console output.
+        with sock:
+            request = b''
+            while b'\r\n\r\n' not in request:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    return
+                request += chunk
+            match = re.match(rb'GET /api/servers/([0-9a-f]{8})-\S* HTTP', request)
+            key = re.search(rb'(?i)sec-websocket-key:\s*(\S+)', request)
+            if not match or not key:
+                sock.sendall(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+                return
+            identifier = match.group(1).decode()
+            accept = base64.b64encode(hashlib.sha1(key.group(1) + b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11').digest())
+            sock.sendall(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+            self._count('wings websocket')
+            authed = False
+            while True:
+                message = self._wsrecv(sock)
+                if message is None:
+                    return
+                event, args = message.get('event'), message.get('args') or []
+                if event == 'auth':
+                    authed = args == ["token-{}".format(identifier)]
+                    self._wssend(sock, 'auth success' if authed else 'jwt error', *([] if authed else ['invalid token']))
+                elif event == 'send command' and authed and args:
+                    started = time.perf_counter()
+                    self._count('console command')
+                    for line in self._console(args[0]):
+                        self._wssend(sock, 'console output', line)
+                    with self._lock:
+                        self.samples.setdefault('console command', []).append(time.perf_counter() - started)
+
+    def _console(self, command:str) -> list:
+        # console lines oxide prints for a command, compiles are reported for the batch at once.
+        words = command.split()
+        if not words or words[0] != 'oxide.reload':
+            return []
+        loaded = [stem for stem in words[1:] if self.reloads.get(stem, 'loaded') == 'loaded']
+        lines = ["Error while compiling: {}.cs(1,1): error CS1002: ; expected".format(stem) for stem in words[1:] if self.reloads.get(stem) == 'failed']
+        if len(loaded) == 1:
+            lines.append("{} was compiled successfully in 812ms".format(loaded[0]))
+        elif loaded:
+            lines.append("{} and {} were compiled successfully in 1534ms".format(", ".join(loaded[:-1]), loaded[-1]))
+        lines.extend("Loaded plugin {} v1.0.0 by me".format(stem) for stem in loaded)
+        return lines
+
+    def _wsrecv(self, sock):
+        # the next text frame as json, None once the client closes. pings are answered.
+        while True:
+            header = self._wsread(sock, 2)
+            if header is None:
+                return None
+            opcode, length = header[0] & 0x0f, header[1] & 0x7f
+            if length == 126:
+                length = struct.unpack('>H', self._wsread(sock, 2) or b'\0\0')[0]
+            elif length == 127:
+                length = struct.unpack('>Q', self._wsread(sock, 8) or b'\0' * 8)[0]
+            mask = self._wsread(sock, 4) if header[1] & 0x80 else b'\0' * 4
+            payload = self._wsread(sock, length)
+            if mask is None or payload is None or opcode == 0x8:
+                return None
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if opcode == 0x9:
+                self._wsframe(sock, 0xa, payload)
+            elif opcode == 0x1:
+                return json.loads(payload)
+
+    def _wsread(self, sock, length:int) -> bytes:
+        data = b''
+        while len(data) < length:
+            try:
+                chunk = sock.recv(length - len(data))
+            except OSError:
+                return None
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _wssend(self, sock, event:str, *args):
+        self._wsframe(sock, 0x1, json.dumps({'event':event, 'args':list(args)}).encode())
+
+    def _wsframe(self, sock, opcode:int, payload:bytes):
+        if len(payload) < 126:
+            header = struct.pack('>BB', 0x80 | opcode, len(payload))
+        elif len(payload) < 1 << 16:
+            header = struct.pack('>BBH', 0x80 | opcode, 126, len(payload))
+        else:
+            header = struct.pack('>BBQ', 0x80 | opcode, 127, len(payload))
+        try:
+            sock.sendall(header + payload)
+        except OSError:
+            pass
+
+    def _origin(self, handler, name:str):
+        body = self.origins.get(name)
+        if body is None:
+            return self._reply(handler, 404, b'')
+        etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:16])
+        headers = {'ETag':etag, 'Accept-Ranges':'bytes', 'Content-Type':'text/plain'}
+        if name in self.checksums:
+            headers['X-Checksum-Sha256'] = self.checksums[name]
+        if handler.headers.get('If-None-Match') == etag:
+            return self._reply(handler, 304, b'', headers)
+        match = re.match(r'bytes=(\d+)-(\d*)$', handler.headers.get('Range') or '')
+        if match and handler.headers.get('If-Range') in (None, etag):
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+            if start < len(body):
+                headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, len(body))
+                return self._reply(handler, 206, body[start:end + 1], headers)
+        return self._reply(handler, 200, body, headers)
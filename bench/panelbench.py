@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# drives rustplugins.py against bench/mockpanel.py at several fleet sizes and reports wall time,
+# p50/p99 latency per call type and the api calls each operation made. call counts and wall
+# times are compared with bench/baseline.json and the run fails when either regressed.
+from pathlib import Path
+
+from mockpanel import rpMockPanel
+import argparse
+import compileall
+import json
+import shutil
+import subprocess
+import sys, os
+import tempfile
+import time
+
+approot = Path(__file__).resolve().parent.parent
+baselinefile = Path(__file__).resolve().parent / 'baseline.json'
+
+def plugin(title:str, version:str) -> bytes:
+    return 'namespace Oxide.Plugins\n{{\n    [Info("{0}", "bench", "{1}")]\n    class {0} : RustPlugin {{ }}\n}}\n'.format(title, version).encode() + b'//' + b'x' * 20000 + b'\n'
+
+def percentile(samples:list, p:float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))] if samples else 0
+
+class rpBench:
+
+    def __init__(self, size:int, latency:float, ratelimit:int):
+        self.size = size
+        self.panel = rpMockPanel(size, latency=latency, ratelimit=ratelimit, renameorder='shuffle', origins={'Alpha.cs':plugin('Alpha', '1.0.0'), 'Beta.cs':plugin('Beta', '1.0.0'), 'Gamma.cs':plugin('Gamma', '1.0.0')})
+        self.workdir = None
+        self.env = dict(os.environ, RUSTPLUGINS_BEARER='bench')
+
+    def __enter__(self):
+        self.panel.start()
+        self.workdir = tempfile.mkdtemp(prefix='rustplugins-bench-')
+        for name in ('rustplugins.py', 'config.py'):
+            shutil.copy(approot / name, self.workdir)
+        shutil.copytree(approot / 'pyrustplugins', os.path.join(self.workdir, 'pyrustplugins'), ignore=shutil.ignore_patterns('__pycache__'))
+        compileall.compile_dir(os.path.join(self.workdir, 'pyrustplugins'), quiet=1)
+        with open(os.path.join(self.workdir, 'config.py'), 'a') as file:
+            file.write("\n#bench overrides\ncredentialbackend = 'env'\numodbase = '{}/origin/'\n".format(self.panel.url))
+        return self
+
+    def __exit__(self, *exc):
+        self.panel.stop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def cli(self, *argv):
+        r = subprocess.run([sys.executable, os.path.join(self.workdir, 'rustplugins.py')] + list(argv), cwd=self.workdir, env=self.env, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        if r.returncode != 0:
+            raise RuntimeError("rustplugins.py {} exited {}:\n{}{}".format(" ".join(argv), r.returncode, r.stdout, r.stderr))
+        return r.stdout
+
+    def measure(self, name:str, invocations:list) -> dict:
+        # every invocation of one operation is counted together, wall time covers them all.
+        self.panel.reset()
+        started = time.perf_counter()
+        for argv in invocations:
+            self.cli(*argv)
+        wall = time.perf_counter() - started
+        samples = {key: list(values) for key, values in self.panel.samples.items()}
+        return {
+            'operation':name,
+            'size':self.size,
+            'invocations':len(invocations),
+            'wall':wall,
+            'calls':sum(self.panel.calls.values()),
+            'types':{key: {'calls':len(values), 'p50':percentile(values, 50), 'p99':percentile(values, 99)} for key, values in sorted(samples.items())},
+        }
+
+    def run(self) -> list:
+        servers = list(self.panel.servers)
+        results = []
+        self.cli('-i', self.panel.url, 'bench')
+        results.append(self.measure('sadd', [('--sadd', identifier) for identifier in servers]))
+        results.append(self.measure('slist', [('--slist',)]))
+        results.append(self.measure('list-available', [('--list-available', '--state', 'any')]))
+        results.append(self.measure('umod', [('--smanage', identifier, '--umod', 'Alpha.cs', 'Beta.cs', '--force') for identifier in servers]))
+        results.append(self.measure('gen', [('--smanage', identifier, '--gen', 'Gamma.cs', self.panel.origin('Gamma.cs'), '--force') for identifier in servers]))
+        results.append(self.measure('update-converged', [('--update', '--all-servers')]))
+        self.panel.origins['Alpha.cs'] = plugin('Alpha', '1.1.0')
+        results.append(self.measure('update', [('--update', '--all-servers')]))
+        results.append(self.measure('rollback', [('--rollback', 'Alpha.cs', '--all-servers')]))
+        results.append(self.measure('outdated', [('--outdated',)]))
+        return results
+
+def report(results:list):
+    for r in results:
+        print("{operation:<17} servers {size:>4}  invocations {invocations:>4}  wall {wall:8.2f}s  api calls {calls:>6}".format(**r))
+        for key, t in r['types'].items():
+            print("    {:<22} {:>6} calls  p50 {:7.1f}ms  p99 {:7.1f}ms".format(key, t['calls'], t['p50'] * 1000, t['p99'] * 1000))
+
+def compare(results:list, baseline:dict, tolerance:float, slack:float) -> list:
+    # call counts are deterministic and must not grow, wall time may vary by tolerance plus a fixed
+    # slack so single short runs dominated by interpreter startup don't flap.
+    problems = []
+    for r in results:
+        key = "{}@{}".format(r['operation'], r['size'])
+        base = baseline.get(key)
+        if not base:
+            continue
+        if r['calls'] > base['calls']:
+            problems.append("{}: {} api calls, baseline {}".format(key, r['calls'], base['calls']))
+        for calltype, count in base.get('types', {}).items():
+            if r['types'].get(calltype, {}).get('calls', 0) > count:
+                problems.append("{}: {} {} calls, baseline {}".format(key, r['types'][calltype]['calls'], calltype, count))
+        if r['wall'] > base['wall'] * (1 + tolerance) + slack:
+            problems.append("{}: {:.2f}s wall, baseline {:.2f}s".format(key, r['wall'], base['wall']))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rustplugins.py against a local mock panel.')
+    parser.add_argument('--sizes', default='1,10,100', help='Comma separated fleet sizes to run.')
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds the mock panel and wings add to every response.')
+    parser.add_argument('--ratelimit', type=int, default=0, help='Panel requests per minute before the mock answers 429, 0 for no limit.')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Fraction wall time may exceed the baseline by.')
+    parser.add_argument('--slack', type=float, default=0.5, help='Seconds wall time may exceed the baseline by on top of the tolerance.')
+    parser.add_argument('--json', metavar='file', help='Also write the results to this file.')
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline instead of comparing.')
+    args = parser.parse_args()
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(',') if s]:
+        with rpBench(size, args.latency, args.ratelimit) as bench:
+            results.extend(bench.run())
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.update_baseline:
+        baseline = json.loads(baselinefile.read_text()) if baselinefile.exists() else {}
+        baseline.update({"{}@{}".format(r['operation'], r['size']): {'calls':r['calls'], 'wall':round(r['wall'], 3), 'types':{k: t['calls'] for k, t in r['types'].items()}} for r in results})
+        baselinefile.write_text(json.dumps(baseline, indent=1, sort_keys=True) + "\n")
+        print("baseline written to {}".format(baselinefile))
+        return
+    if not baselinefile.exists():
+        print("no baseline at {}, run with --update-baseline to create one".format(baselinefile))
+        return
+    problems = compare(results, json.loads(baselinefile.read_text()), args.tolerance, args.slack)
+    for problem in problems:
+        print("REGRESSION {}".format(problem))
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
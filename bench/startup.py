@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# startup time of rustplugins.py for commands that never reach the network.
+# runs against a scratch copy so the real state database, log and cache are untouched,
+# exits non-zero when a command's median wall time goes past its budget or when
+# importing rustplugins pulls in a heavy dependency or touches the disk.
+from pathlib import Path
+
+import argparse
+import compileall
+import json
+import shutil
+import statistics
+import subprocess
+import sys, os
+import tempfile
+import time
+
+approot = Path(__file__).resolve().parent.parent
+
+#commands - argv after rustplugins.py and the exit codes they are expected to end with.
+#--slist on an unconfigured copy goes through config, logging and gettext before refusing with a usage error.
+commands = [
+    (['--help'], (0,)),
+    (['--slist'], (2,)),
+]
+#heavy - modules that must only be imported on the code paths that use them.
+heavy = ['requests', 'yaml', 'validators', 'keyring', 'tqdm', 'websocket', 'pydactyl', 'fake_useragent', 'aiohttp', 'asyncio']
+
+def scratch_copy(workdir:str) -> str:
+    for name in ('rustplugins.py', 'config.py'):
+        shutil.copy(approot / name, workdir)
+    shutil.copytree(approot / 'pyrustplugins', os.path.join(workdir, 'pyrustplugins'), ignore=shutil.ignore_patterns('__pycache__'))
+    # like an installed copy, even where PYTHONDONTWRITEBYTECODE keeps runs from caching it.
+    compileall.compile_dir(os.path.join(workdir, 'pyrustplugins'), quiet=1)
+    if (approot / 'locales').is_dir():
+        shutil.copytree(approot / 'locales', os.path.join(workdir, 'locales'))
+    return os.path.join(workdir, 'rustplugins.py')
+
+def reset(workdir:str):
+    for name in os.listdir(workdir):
+        if name in ('rustplugins.py', 'config.py', 'pyrustplugins', 'locales', '__pycache__'):
+            continue
+        path = os.path.join(workdir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+def time_command(script:str, argv:list, expected:tuple, runs:int) -> list:
+    samples = []
+    for i in range(runs):
+        reset(os.path.dirname(script))
+        started = time.perf_counter()
+        r = subprocess.run([sys.executable, script] + argv, cwd=os.path.dirname(script), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        samples.append(time.perf_counter() - started)
+        if r.returncode not in expected:
+            raise RuntimeError("{} exited {}:\n{}".format(" ".join(argv), r.returncode, r.stderr.decode(errors='replace')))
+    return samples
+
+def import_check(script:str) -> list:
+    workdir = os.path.dirname(script)
+    reset(workdir)
+    probe = "import sys, json, rustplugins; print(json.dumps([m for m in {} if m in sys.modules]))".format(heavy)
+    r = subprocess.run([sys.executable, '-c', probe], cwd=workdir, capture_output=True)
+    if r.returncode != 0:
+        return ["import rustplugins failed:\n{}".format(r.stderr.decode(errors='replace'))]
+    problems = ["importing rustplugins loaded {}".format(m) for m in json.loads(r.stdout)]
+    created = [name for name in os.listdir(workdir) if name not in ('rustplugins.py', 'config.py', 'pyrustplugins', 'locales', '__pycache__')]
+    if created:
+        problems.append("importing rustplugins created {}".format(", ".join(created)))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Time rustplugins.py startup for commands that never reach the network.')
+    parser.add_argument('--runs', type=int, default=10, help='Runs per command, the median is compared to the budget.')
+    parser.add_argument('--budget', type=float, default=250, help='Milliseconds a command may take, median of all runs.')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as workdir:
+        script = scratch_copy(workdir)
+        # the first run warms the os caches, don't count it.
+        time_command(script, ['--help'], (0,), 1)
+        for argv, expected in commands:
+            samples = time_command(script, argv, expected, args.runs)
+            median = statistics.median(samples) * 1000
+            status = 'ok' if median <= args.budget else 'OVER'
+            failed = failed or median > args.budget
+            print("{:<24} median {:7.1f}ms  min {:7.1f}ms  max {:7.1f}ms  budget {:.0f}ms  {}".format(" ".join(argv), median, min(samples) * 1000, max(samples) * 1000, args.budget, status))
+        for problem in import_check(script):
+            print(problem)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,5 @@
 #Configurable Variables
+#every setting with its default and description is in pyrustplugins/settings.py, copy the ones you want to change
+#here. rustplugins.py applies them over the defaults when it starts.
 #appkey - change this before working with rustplugins.py
 appkey = 'changeme'
-
-#umodbase - base url for umod plugin downloads.
-umodbase = 'https://umod.org/plugins/'
-#configname - Filename or absolute path, filename defaults to location of rustplugins.py
-configname = 'config.yaml'
-#cachedirname - directory name or absolute path, directory name defaults to a directory under the location of rustplugins.py
-cachedirname = 'cache'
-#logname - Filename or absolute path, filename defaults to location of rustplugins.py
-logname = 'rustplugins.log'
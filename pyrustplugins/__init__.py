@@ -0,0 +1,25 @@
+# importable api of rustplugins.py. importing it reads nothing, not even config.py: settings
+# come from pyrustplugins.settings, no arguments are parsed, no log, cache or state files are
+# opened and no request is made.
+# rpAsyncConnection and rpAsyncServer drive servers from one asyncio event loop.
+from .util import rpLazyModule, rpReloadBatch, rpTTLCache, rpUtil
+from .trace import rpSpan, rpTracer, tracer
+from .connection import rpConnection, rpConsole
+from .cache import rpCache
+from .server import rpMultipartBody, rpServer, rpPlan
+from .aio import rpAsyncConnection, rpAsyncServer
+from .state import rpCredentials, rpKeyringCredentials, rpEnvCredentials, rpFileCredentials, rpConfig
+from .rollout import rpRollout, rpDaemon
+from .cli import main
+
+__all__ = [
+    'rpLazyModule', 'rpReloadBatch', 'rpTTLCache', 'rpUtil',
+    'rpSpan', 'rpTracer', 'tracer',
+    'rpConnection', 'rpConsole',
+    'rpCache',
+    'rpMultipartBody', 'rpServer', 'rpPlan',
+    'rpAsyncConnection', 'rpAsyncServer',
+    'rpCredentials', 'rpKeyringCredentials', 'rpEnvCredentials', 'rpFileCredentials', 'rpConfig',
+    'rpRollout', 'rpDaemon',
+    'main',
+]
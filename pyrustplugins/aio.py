@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+from . import settings
+import logging
+import os
+import time
+from .util import _, aiohttp, asyncio, rpReloadBatch, rpTTLCache, rpUtil
+from .trace import tracer
+from .connection import rpRateLimiter
+from .cache import rpCache
+from .server import rpMultipartBody, rpServer
+
+class rpAsyncConnection:
+    # asyncio counterpart of rpConnection, so one event loop can drive hundreds of servers.
+    # panel, wings and origin requests share one aiohttp client holding at most asyncconnections
+    # connections, httppoolsize per host. use it with async with so the client is closed.
+
+    def __init__(self, instance:str, authbearer:str, limit:int=None):
+        self._instance = instance
+        self._authbearer = authbearer
+        self.limit = limit or settings.asyncconnections
+        # same keys and lifetimes as rpConnection.listings and rpConnection.metadata
+        self.listings = rpTTLCache(settings.listingttl)
+        self.metadata = rpTTLCache(settings.metadatattl)
+        self._locks = {}
+        self._client = None
+        self.ratelimit = rpRateLimiter.panelbucket(instance, authbearer)
+        self.logger = logging.getLogger('rustplugins.ratelimit')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def client(self) -> aiohttp.ClientSession:
+        if self._client is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=settings.httppoolsize)
+            self._client = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(sock_connect=settings.httptimeout, sock_read=settings.httptimeout))
+        return self._client
+
+    def lock(self, key) -> asyncio.Lock:
+        # concurrent tasks asking for the same listing, server list or origin share one request.
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    def get_instance_url(self):
+        return self._instance
+
+    async def request(self, service:str, method:str, url:str, **kwargs) -> aiohttp.ClientResponse:
+        # the whole body is read before returning, which hands the connection back to the pool
+        # and keeps status, headers, read(), text() and json() usable on the response.
+        # rate limits and retries are rpConnection's, on the same process wide buckets.
+        bucket = self.ratelimit if service == 'panel' else rpRateLimiter.hostbucket(url)
+        replayable = not hasattr(kwargs.get('data'), '__aiter__') and not hasattr(kwargs.get('data'), 'read')
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait:
+                tracer.throttled(wait)
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            try:
+                r = await self.client().request(method, url, **kwargs)
+                await r.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= settings.httpretries or not replayable or method.upper() not in rpRateLimiter.idempotent:
+                    raise
+                self.logger.debug("%s %s failed, retrying: %s", method, rpUtil.redact(url), e)
+            else:
+                tracer.observe(r, service, time.perf_counter() - started)
+                limit, remaining, retryafter = rpRateLimiter.headers(r.headers)
+                bucket.update(limit, remaining, retryafter if r.status == 429 else None)
+                if attempt >= settings.httpretries or not replayable or not rpRateLimiter.retryable(method, r.status):
+                    return r
+                self.logger.debug("%s %s answered %s, retrying", method, rpUtil.redact(url), r.status)
+            tracer.retried()
+            await asyncio.sleep(rpRateLimiter.backoff(attempt))
+            attempt += 1
+
+    async def panel_request(self, method:str, path:str, **kwargs) -> aiohttp.ClientResponse:
+        kwargs['headers'] = dict(kwargs.get('headers') or {}, **{'Accept': 'application/json', 'Authorization': 'Bearer {}'.format(self._authbearer)})
+        uri = '{}/api/client{}'.format(self._instance.rstrip('/'), '/' + path if path else '')
+        return await self.request('panel', method, uri, **kwargs)
+
+    async def node_request(self, method:str, url:str, **kwargs) -> aiohttp.ClientResponse:
+        return await self.request('wings', method, url, **kwargs)
+
+    async def list_servers(self, refresh:bool=False) -> dict:
+        async with self.lock('servers'):
+            servers = None if refresh else self.metadata.get('servers')
+            if servers is None:
+                servers = {}
+                page = 1
+                while page:
+                    r = await self.panel_request('GET', '', params={'page': page})
+                    r.raise_for_status()
+                    attributes, page = rpUtil.server_page(await r.json(), page)
+                    servers.update((server['identifier'], server) for server in attributes)
+                self.metadata.put('servers', servers)
+            return servers
+
+    async def server_metadata(self, serverid:str) -> dict:
+        servers = await self.list_servers()
+        if serverid not in servers:
+            raise LookupError(_("Server {} is not available on {}.").format(serverid, self._instance))
+        return servers[serverid]
+
+    async def server_utilization(self, serverid:str, refresh:bool=False) -> dict:
+        key = ('resources', serverid)
+        utilization = None if refresh else self.metadata.get(key)
+        if utilization is None:
+            r = await self.panel_request('GET', 'servers/{}/resources'.format(serverid))
+            r.raise_for_status()
+            utilization = self.metadata.put(key, (await r.json())['attributes'])
+        return utilization
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def __repr__(self):
+        return "{}({}, ***)".format(self.__class__.__name__,self._instance)
+
+
+class rpAsyncServer:
+    # asyncio counterpart of rpServer's remote operations. it works on an rpServer, so plugin
+    # lists loaded from rpConfig are updated in place and can be saved back with server_save.
+
+    def __init__(self, server:rpServer):
+        self.server = server
+        self.identifier = server.identifier
+        self.logger = logging.getLogger('rustplugins.server')
+
+    async def fetch(self, connection:rpAsyncConnection):
+        with tracer.span('fetch', self.identifier):
+            metadata = await connection.server_metadata(self.identifier)
+            utilization = await connection.server_utilization(self.identifier)
+        self.server.uuid = metadata['uuid']
+        self.server.name = metadata['name']
+        self.server.state = utilization['current_state']
+
+    async def console_command(self, connection:rpAsyncConnection, command:str) -> aiohttp.ClientResponse:
+        return await connection.panel_request('POST', 'servers/{}/command'.format(self.identifier), json={'command': command})
+
+    async def file_listing(self, connection:rpAsyncConnection, remotepath:str, refresh:bool=False) -> dict:
+        key = self.server._listingkey(remotepath)
+        async with connection.lock(key):
+            if not refresh:
+                listing = connection.listings.get(key)
+                if listing is not None:
+                    return listing
+            with tracer.span('listing', self.identifier, directory=remotepath) as span:
+                r = await connection.panel_request('GET', 'servers/{}/files/list'.format(self.identifier), params={'directory': remotepath})
+                span.bytes = len(await r.read())
+            if not r.ok:
+                await self._logfailure(self.file_listing, r)
+                return None
+            return connection.listings.put(key, rpUtil.file_listing(await r.json()))
+
+    async def files_upload(self, connection:rpAsyncConnection, files:list, remotedir:str='/') -> aiohttp.ClientResponse:
+        # files is a list of (localpath, uploadname), streamed into remotedir in one request.
+        with tracer.span('upload', self.identifier, files=len(files)) as span:
+            signeduriresp = await connection.panel_request('GET', 'servers/{}/files/upload'.format(self.identifier))
+            signeduriresp.raise_for_status()
+            posturi = rpUtil.url_with_params((await signeduriresp.json())['attributes']['url'], {'directory': '/{}'.format(remotedir.strip('/'))})
+            with rpMultipartBody([('files', name, path) for path, name in files]) as body:
+                span.bytes = len(body)
+                r = await connection.node_request('POST', posturi, data=rpAsyncServer._chunks(body), headers={'Content-Type': body.content_type, 'Content-Length': str(len(body))})
+        connection.listings.invalidate(self.server._listingkey(remotedir))
+        if not r.ok:
+            await self._logfailure(self.files_upload, r)
+        return r
+
+    async def files_rename(self, connection:rpAsyncConnection, renames:list, root:str='/') -> aiohttp.ClientResponse:
+        payload = {'root': root, 'files': [{'from': source, 'to': dest} for source, dest in renames]}
+        with tracer.span('rename', self.identifier, files=len(renames)):
+            r = await connection.panel_request('PUT', 'servers/{}/files/rename'.format(self.identifier), json=payload)
+        for source, dest in renames:
+            for path in (source, dest):
+                connection.listings.invalidate(self.server._listingkey(os.path.join(root, os.path.split(path)[0])))
+        if not r.ok:
+            await self._logfailure(self.files_rename, r)
+        return r
+
+    async def files_delete(self, connection:rpAsyncConnection, remotefiles:list, root:str='/') -> aiohttp.ClientResponse:
+        payload = {'root': root, 'files': list(remotefiles)}
+        with tracer.span('delete', self.identifier, files=len(remotefiles)):
+            r = await connection.panel_request('POST', 'servers/{}/files/delete'.format(self.identifier), json=payload)
+        for remotefile in remotefiles:
+            connection.listings.invalidate(self.server._listingkey(os.path.join(root, os.path.split(remotefile)[0])))
+        if not r.ok:
+            await self._logfailure(self.files_delete, r)
+        return r
+
+    async def pluginreload(self, connection:rpAsyncConnection, localnames:list) -> dict:
+        # one oxide.reload for every plugin in localnames, confirmed on the console websocket
+        # like rpServer.pluginreloadflush. results are localname -> (ok, detail, seconds).
+        if not localnames:
+            return {}
+        batch = rpReloadBatch(localnames)
+        with tracer.span('reload', self.identifier, plugins=len(batch.pending)):
+            try:
+                ws = await self._console(connection)
+            except Exception as e:
+                self.logger.debug("console websocket for %s unavailable: %s", self.identifier, e)
+                cmdresp = await self.console_command(connection, batch.command)
+                return batch.sent(cmdresp.ok)
+            try:
+                await ws.send_json({'event': 'send command', 'args': [batch.command]})
+                done = False
+                while not done:
+                    message = await asyncio.wait_for(ws.receive_json(), max(0.1, batch.deadline - time.monotonic()))
+                    if message.get('event') == 'console output' and message.get('args'):
+                        done = batch.line(message['args'][0])
+            except (asyncio.TimeoutError, aiohttp.ClientError, TypeError, ValueError) as e:
+                self.logger.debug("console websocket for %s failed: %s", self.identifier, e)
+            finally:
+                await ws.close()
+        return batch.finish()
+
+    async def _console(self, connection:rpAsyncConnection) -> aiohttp.ClientWebSocketResponse:
+        r = await connection.panel_request('GET', 'servers/{}/websocket'.format(self.identifier))
+        r.raise_for_status()
+        credentials = (await r.json())['data']
+        # aiohttp before 3.10 takes the close timeout as a float, later ones as ClientWSTimeout.
+        timeout = aiohttp.ClientWSTimeout(ws_close=settings.httptimeout) if hasattr(aiohttp, 'ClientWSTimeout') else settings.httptimeout
+        ws = await connection.client().ws_connect(credentials['socket'], origin=connection.get_instance_url().rstrip('/'), timeout=timeout)
+        await ws.send_json({'event': 'auth', 'args': [credentials['token']]})
+        deadline = time.monotonic() + settings.httptimeout
+        while True:
+            message = await asyncio.wait_for(ws.receive_json(), max(0.1, deadline - time.monotonic()))
+            if message.get('event') == 'auth success':
+                return ws
+            if message.get('event') in ('jwt error', 'token expired'):
+                await ws.close()
+                raise ConnectionError(_("Console websocket rejected the token: {}").format(message.get('args')))
+
+    async def plugindownloadmany(self, connection:rpAsyncConnection, cache:rpCache, localnames:list) -> dict:
+        # results are (ok, errors) per plugin, distinct origins download concurrently.
+        results = {}
+        wanted = {}
+        for localname in localnames:
+            if self.server.pluginlist and localname in self.server.pluginlist:
+                wanted[localname] = self.server.pluginlist[localname]['origin']
+            else:
+                results[localname] = (False, [_("{} is unknown and not maintained.").format(localname)])
+        origins = {origin: localname for localname, origin in wanted.items()}
+        fetched = dict(zip(origins, await asyncio.gather(*[cache.fetchasync(connection, origin, name) for origin, name in origins.items()])))
+        for localname, origin in wanted.items():
+            ok, errors, digest = fetched[origin]
+            if ok:
+                self.server.plugincached(cache, localname, digest)
+            results[localname] = (ok, errors)
+        return results
+
+    async def _logfailure(self, caller, r:aiohttp.ClientResponse):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(_("Error in %s: %s %s -> %s\nResp Text: %s"), caller.__qualname__, r.method, rpUtil.redact(str(r.url)), r.status, rpUtil.log_body(await r.read()))
+
+    async def _chunks(body:rpMultipartBody):
+        # the plugin files are read on the default executor, the event loop never waits on the disk.
+        loop = asyncio.get_running_loop()
+        while True:
+            data = await loop.run_in_executor(None, body.read, settings.downloadchunksize)
+            if not data:
+                return
+            yield data
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__,self.identifier)
@@ -0,0 +1,419 @@
+from __future__ import annotations
+
+from . import settings
+import logging
+import os
+import threading
+import re
+import time
+import hashlib
+import concurrent.futures
+import typing
+from .util import _, aiohttp, asyncio, requests, rpUtil, tqdm, yaml
+from .trace import tracer
+from .connection import rpRateLimiter
+if typing.TYPE_CHECKING:
+    from .aio import rpAsyncConnection
+
+class rpCache:
+
+    def __init__(self, cachedir:str, maxbytes:int=0):
+        self.cachedir = cachedir
+        self.objectdir = os.path.join(cachedir, 'objects')
+        self.tmpdir = os.path.join(cachedir, 'tmp')
+        self.indexfile = os.path.join(cachedir, 'index.yaml')
+        self.maxbytes = maxbytes
+        self.logger = logging.getLogger('rustplugins.cache')
+        self._lock = threading.RLock()
+        self._originlocks = {}
+        # origins already validated against their origin during this process,
+        # every later server tracking the same origin reuses the result.
+        self._fresh = {}
+        # origin -> [Info] of what the origin currently serves, see origininfo.
+        self._origininfo = {}
+        self._verified = set()
+        self._session = None
+        self.index = self._read_index()
+
+    def _read_index(self) -> dict:
+        index = None
+        if os.path.isfile(self.indexfile):
+            try:
+                with open(self.indexfile) as file:
+                    index = yaml.safe_load(file)
+            except (OSError, yaml.YAMLError) as e:
+                self.logger.debug("cache index unreadable, starting empty: %s", e)
+        if not isinstance(index, dict):
+            index = {}
+        index.setdefault('origins', {})
+        index.setdefault('objects', {})
+        return index
+
+    def _write_index(self):
+        with self._lock:
+            os.makedirs(self.cachedir, exist_ok=True)
+            tmpfile = "{}.tmp".format(self.indexfile)
+            with open(tmpfile, 'w') as file:
+                yaml.safe_dump(self.index, file)
+            os.replace(tmpfile, self.indexfile)
+
+    def _originlock(self, origin:str):
+        with self._lock:
+            return self._originlocks.setdefault(origin, threading.Lock())
+
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                # identity encoding keeps Content-Length and Range offsets in body bytes.
+                self._session = rpUtil.pooled_session({'User-Agent': settings.useragent, 'Accept-Encoding': 'identity'})
+            return self._session
+
+    def origin_request(self, url:str, **kwargs) -> requests.Response:
+        return rpRateLimiter.request(rpRateLimiter.hostbucket(url), self.session(), 'origin', 'GET', url, **kwargs)
+
+    def objectpath(self, digest:str) -> str:
+        return os.path.join(self.objectdir, digest[:2], digest)
+
+    def lookup(self, origin:str):
+        with self._lock:
+            entry = self.index['origins'].get(origin)
+            return entry['hash'] if entry else None
+
+    def get(self, digest:str):
+        # returns the object path for digest only if its content still hashes to its name.
+        path = self.objectpath(digest)
+        if not os.path.isfile(path):
+            self._forget(digest)
+            return None
+        if digest not in self._verified:
+            if rpUtil.file_sha256(path) != digest:
+                self.logger.info(_("Cached object {} failed its integrity check, discarding.").format(digest))
+                os.remove(path)
+                self._forget(digest)
+                return None
+            self._verified.add(digest)
+        with self._lock:
+            self.index['objects'].setdefault(digest, {'size':os.path.getsize(path)})['atime'] = time.time()
+        return path
+
+    def refresh(self):
+        # forget which origins were validated, so a long running process checks them again.
+        with self._lock:
+            self._fresh.clear()
+            self._origininfo.clear()
+
+    def info(self, digest:str) -> dict:
+        # [Info] of a cached object, parsed once and kept in the index next to its size.
+        with self._lock:
+            entry = self.index['objects'].get(digest)
+            if entry is not None and 'info' in entry:
+                return entry['info']
+        path = self.objectpath(digest)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as file:
+            info = rpUtil.plugin_info(file.read(settings.infoheadbytes))
+        with self._lock:
+            self.index['objects'].setdefault(digest, {'size':os.path.getsize(path)})['info'] = info
+        self._write_index()
+        return info
+
+    def origininfo(self, origin:str, name:str) -> dict:
+        # [Info] of what origin serves now without downloading its body: the umodmetadata
+        # endpoint when configured, otherwise a conditional ranged request for the head of
+        # the file, where a 304 means the cached object is still current.
+        with self._originlock(origin):
+            if origin in self._origininfo:
+                return self._origininfo[origin]
+            info = None
+            try:
+                if origin in self._fresh:
+                    info = self.info(self._fresh[origin])
+                if info is None:
+                    with tracer.span('version', name, origin=origin):
+                        if settings.umodmetadata and origin.startswith(settings.umodbase):
+                            info = self._metadatainfo(name)
+                        if info is None:
+                            info = self._headinfo(origin)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.logger.debug("version lookup of %s failed: %s", origin, e)
+            self._origininfo[origin] = info
+            return info
+
+    def _metadatainfo(self, name:str) -> dict:
+        r = self.origin_request(settings.umodmetadata.format(name=os.path.splitext(name)[0]))
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        data = r.json()
+        version = data.get('latest_release_version') or data.get('version')
+        if not version:
+            return None
+        return {'title':data.get('title') or data.get('name'), 'author':data.get('author'), 'version':str(version)}
+
+    def _headinfo(self, origin:str) -> dict:
+        with self._lock:
+            entry = dict(self.index['origins'].get(origin, {}))
+        headers = dict(self.conditional(entry), Range='bytes=0-{}'.format(settings.infoheadbytes - 1))
+        response = self.origin_request(origin, stream=True, headers=headers)
+        if response.status_code == 304:
+            response.close()
+            self._fresh[origin] = entry['hash']
+            return self.info(entry['hash'])
+        response.raise_for_status()
+        head = rpUtil.read_head(response, settings.infoheadbytes)
+        tracer.moved(len(head))
+        return rpUtil.plugin_info(head)
+
+    def _forget(self, digest:str):
+        with self._lock:
+            self._verified.discard(digest)
+            self.index['objects'].pop(digest, None)
+            for origin in [o for o, e in self.index['origins'].items() if e['hash'] == digest]:
+                self.index['origins'].pop(origin)
+                self._fresh.pop(origin, None)
+            for entry in self.index['origins'].values():
+                if digest in (entry.get('history') or ()):
+                    entry['history'].remove(digest)
+
+    def fetch(self, origin:str, name:str, progress:bool=True):
+        ok = False
+        errors = []
+        digest = None
+        with self._originlock(origin):
+            if origin in self._fresh and self.get(self._fresh[origin]):
+                return True, errors, self._fresh[origin]
+            with self._lock:
+                entry = dict(self.index['origins'].get(origin, {}))
+            with tracer.span('download', name, origin=origin) as span:
+                try:
+                    headers = self.conditional(entry)
+                    partial = self._partialpath(origin)
+                    offset = self._resumeoffset(partial, origin, headers)
+                    self.logger.debug("origin: %s", origin)
+                    response = self.origin_request(origin, stream=True, headers=headers)
+                    if response.status_code == 304:
+                        response.close()
+                        self.logger.debug(_("%s not modified at origin, using cache."), name)
+                        digest = entry['hash']
+                    else:
+                        response.raise_for_status()
+                        digest = self._store(response, origin, name, partial, offset if response.status_code == 206 else 0, errors, progress)
+                        if digest:
+                            self.remember(origin, name, digest, response.headers)
+                    if digest:
+                        ok = True
+                        self._fresh[origin] = digest
+                        self._write_index()
+                    else:
+                        span.error = 'incomplete'
+                except requests.exceptions.RequestException as e:
+                    span.error = e.__class__.__name__
+                    errors.append("request exception: {}".format(e))
+                    self.logger.debug("request exception: %s", e)
+        return ok, errors, digest
+
+    async def fetchasync(self, connection:rpAsyncConnection, origin:str, name:str):
+        # rpCache.fetch over the shared aiohttp client of connection, into the same object store.
+        # interrupted downloads start over rather than resume.
+        errors = []
+        digest = None
+        async with connection.lock(('origin', origin)):
+            if origin in self._fresh and self.get(self._fresh[origin]):
+                return True, errors, self._fresh[origin]
+            with self._lock:
+                entry = dict(self.index['origins'].get(origin, {}))
+            with tracer.span('download', name, origin=origin) as span:
+                try:
+                    headers = dict(self.conditional(entry), **{'User-Agent': settings.useragent, 'Accept-Encoding': 'identity'})
+                    started = time.perf_counter()
+                    async with connection.client().get(origin, headers=headers) as response:
+                        if response.status == 304:
+                            digest = entry['hash']
+                        else:
+                            response.raise_for_status()
+                            digest = await self._storeasync(response, origin, name, errors)
+                            if digest:
+                                self.remember(origin, name, digest, response.headers)
+                    tracer.observe(response, 'origin', time.perf_counter() - started)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    span.error = e.__class__.__name__
+                    errors.append("request exception: {}".format(e))
+                    self.logger.debug("request exception: %s", e)
+                if not digest:
+                    span.error = span.error or 'incomplete'
+                    return False, errors, None
+            self._fresh[origin] = digest
+            self._write_index()
+        return True, errors, digest
+
+    async def _storeasync(self, response:aiohttp.ClientResponse, origin:str, name:str, errors:list) -> str:
+        os.makedirs(self.tmpdir, exist_ok=True)
+        partial = self._partialpath(origin)
+        sha = hashlib.sha256()
+        written = 0
+        loop = asyncio.get_running_loop()
+        with open(partial, 'wb') as file:
+            async for data in response.content.iter_chunked(settings.downloadchunksize):
+                sha.update(data)
+                await loop.run_in_executor(None, file.write, data)
+                written += len(data)
+        tracer.moved(written)
+        if response.content_length is not None and written != response.content_length:
+            errors.append(_("Unexpected remaining bytes during download."))
+            self._discardpartial(partial)
+            return None
+        digest = sha.hexdigest()
+        expected = rpUtil.header_sha256(response.headers)
+        if expected and expected != digest:
+            errors.append(_("Download of {} does not match the checksum sent by its origin.").format(name))
+            self._discardpartial(partial)
+            return None
+        return self.adopt(partial, digest)
+
+    def fetchmany(self, wanted:list, progress:bool=True) -> dict:
+        # wanted is a list of (origin, name), downloaded downloadconcurrency at a time.
+        # returns origin -> (ok, errors, digest).
+        results = {}
+        if not wanted:
+            return results
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(settings.downloadconcurrency, len(wanted)))) as pool:
+            futures = {origin: pool.submit(self.fetch, origin, name, progress) for origin, name in wanted}
+            for origin, future in futures.items():
+                results[origin] = future.result()
+        return results
+
+    def _partialpath(self, origin:str) -> str:
+        return os.path.join(self.tmpdir, "{}.part".format(hashlib.sha256(origin.encode()).hexdigest()))
+
+    def _resumeoffset(self, partial:str, origin:str, headers:dict) -> int:
+        # an interrupted download is resumed with a Range request, If-Range makes the
+        # origin send the whole body instead if the file changed in between.
+        meta = {}
+        if os.path.isfile("{}.yaml".format(partial)):
+            try:
+                with open("{}.yaml".format(partial)) as file:
+                    meta = yaml.safe_load(file) or {}
+            except (OSError, yaml.YAMLError):
+                meta = {}
+        validator = meta.get('etag') or meta.get('last_modified')
+        if meta.get('origin') != origin or not validator or not os.path.isfile(partial) or os.path.getsize(partial) == 0:
+            return 0
+        offset = os.path.getsize(partial)
+        headers['Range'] = 'bytes={}-'.format(offset)
+        headers['If-Range'] = validator
+        return offset
+
+    def _store(self, response:requests.Response, origin:str, name:str, partial:str, offset:int, errors:list, progress:bool=True):
+        os.makedirs(self.tmpdir, exist_ok=True)
+        total_size_in_bytes = offset + int(response.headers.get('content-length', 0))
+        if response.status_code == 206:
+            contentrange = re.match(r'bytes (\d+)-\d+/(\d+)', response.headers.get('Content-Range', ''))
+            if not contentrange or int(contentrange.group(1)) != offset:
+                errors.append(_("Origin answered the resume of {} with an unexpected range.").format(name))
+                self._discardpartial(partial)
+                return None
+            total_size_in_bytes = int(contentrange.group(2))
+        with open("{}.yaml".format(partial), 'w') as file:
+            yaml.safe_dump({'origin':origin, 'etag':response.headers.get('ETag'), 'last_modified':response.headers.get('Last-Modified')}, file)
+        sha = hashlib.sha256()
+        if offset:
+            self.logger.debug("resuming %s at %s bytes", name, offset)
+            with open(partial, 'rb') as file:
+                for data in iter(lambda: file.read(settings.downloadchunksize), b''):
+                    sha.update(data)
+        written = offset
+        progress_bar = tqdm.tqdm(total=total_size_in_bytes or None, initial=offset, unit='iB', unit_scale=True, desc=name, leave=False, mininterval=0.5) if progress else None
+        with open(partial, 'ab' if offset else 'wb') as file:
+            for data in response.iter_content(settings.downloadchunksize):
+                sha.update(data)
+                file.write(data)
+                written += len(data)
+                if progress_bar:
+                    progress_bar.update(len(data))
+        if progress_bar:
+            progress_bar.close()
+        tracer.moved(written - offset)
+        if total_size_in_bytes and written != total_size_in_bytes:
+            errors.append(_("Unexpected remaining bytes during download."))                
+            self.logger.debug(_("Unexpected remaining bytes during download.")) 
+            if written > total_size_in_bytes:
+                self._discardpartial(partial)
+            return None
+        digest = sha.hexdigest()
+        expected = rpUtil.header_sha256(response.headers)
+        if expected and expected != digest:
+            errors.append(_("Download of {} does not match the checksum sent by its origin.").format(name))
+            self._discardpartial(partial)
+            return None
+        return self.adopt(partial, digest)
+
+    def conditional(self, entry:dict) -> dict:
+        # validators of a cached origin entry, so an unchanged origin answers 304.
+        headers = {}
+        if entry and self.get(entry['hash']):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def adopt(self, partial:str, digest:str) -> str:
+        # moves a complete download whose content hashes to digest into the object store.
+        path = self.objectpath(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(partial, path)
+        self._discardpartial(partial)
+        with self._lock:
+            self._verified.add(digest)
+            self.index['objects'][digest] = {'size':os.path.getsize(path), 'atime':time.time()}
+        return digest
+
+    def remember(self, origin:str, name:str, digest:str, headers):
+        # what the origin served before is kept in its history, newest first and up to
+        # cacheversions in all, for --rollback. collect never evicts those objects.
+        with self._lock:
+            previous = self.index['origins'].get(origin) or {}
+            history = [h for h in [previous.get('hash')] + list(previous.get('history') or ()) if h and h != digest]
+            self.index['origins'][origin] = {'hash':digest, 'name':name, 'etag':headers.get('ETag'), 'last_modified':headers.get('Last-Modified'), 'history':list(dict.fromkeys(history))[:max(0, settings.cacheversions - 1)]}
+
+    def versions(self, origin:str) -> list:
+        # digests of every version of origin still in the cache, newest first.
+        with self._lock:
+            entry = self.index['origins'].get(origin)
+            digests = [entry['hash']] + list(entry.get('history') or ()) if entry else []
+        return [digest for digest in digests if self.get(digest)]
+
+    def _discardpartial(self, partial:str):
+        for path in (partial, "{}.yaml".format(partial)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def collect(self, keep:set=None):
+        # size capped LRU eviction, objects in keep and earlier versions kept for --rollback are never evicted.
+        if not self.maxbytes:
+            return []
+        evicted = []
+        with self._lock:
+            keep = set(keep or ()) | {digest for entry in self.index['origins'].values() for digest in entry.get('history') or ()}
+            objects = []
+            if os.path.isdir(self.objectdir):
+                for prefix in os.listdir(self.objectdir):
+                    for digest in os.listdir(os.path.join(self.objectdir, prefix)):
+                        path = os.path.join(self.objectdir, prefix, digest)
+                        atime = self.index['objects'].get(digest, {}).get('atime', 0)
+                        objects.append((atime, digest, path, os.path.getsize(path)))
+            total = sum(o[3] for o in objects)
+            for atime, digest, path, size in sorted(objects):
+                if total <= self.maxbytes:
+                    break
+                if digest in keep:
+                    continue
+                os.remove(path)
+                self._forget(digest)
+                evicted.append(digest)
+                total -= size
+            if evicted:
+                self.logger.debug("evicted %s cached objects", len(evicted))
+                self._write_index()
+        return evicted
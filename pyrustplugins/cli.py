@@ -0,0 +1,483 @@
+from __future__ import annotations
+from pathlib import Path
+from urllib import parse
+
+from . import settings
+import logging
+import argparse
+import sys
+import os
+import gettext
+import json
+import sqlite3
+import signal
+import atexit
+from . import util
+from .util import _, appname, rpUtil, validators
+from .trace import tracer
+from .log import start_logging
+from .connection import rpConnection
+from .cache import rpCache
+from .server import rpServer
+from .state import rpConfig
+from .rollout import rpDaemon, rpRollout
+
+#operations
+
+def sync_plugins(connection:rpConnection, cache:rpCache, server:rpServer, localnames:list, force:bool=False):
+    # downloads come first, so the overwrite question is only asked about files that really differ.
+    ready = []
+    for localname, (ok, derr) in server.plugindownloadmany(cache, localnames).items():
+        lpath = server.pluginlist[localname]['local'] if ok else None
+        if not ok:
+            print(_("Downloading {} from {} failed.").format(localname, server.pluginlist[localname]['origin']))
+            for de in derr:
+                print(_("Error {}".format(de)))
+        elif not rpUtil.file_isnt_zero(lpath):
+            print(_("File download appeared successful however the resulting file is empty, Check {}".format(lpath)))
+        else:
+            ready.append(localname)
+    plan = server.plan(connection, cache, ready)
+    for localname in plan.unchanged:
+        print(_("File {} at destination is identical, skipping upload and reload.").format(localname))
+    for localname in list(plan.uploads):
+        details = server.file_detail(connection, server.pluginlist[localname]['remote'])
+        if details and not force:
+            deleteresp = input(_("File {} already exists at destination with size {} and modify data {}, delete(y/n)?".format(localname, details['size'], details['modified_at'])))
+            if deleteresp not in ["Y","y","Yes","yes"]:
+                plan.skip(localname)
+    if plan.uploads:
+        print(_("Uploading Plugin {}...").format(", ".join(plan.uploads)))
+    for localname, (status, detail) in server.apply(connection, cache, plan).items():
+        if status == 'failed':
+            print(_("Plugin {} failed: {}").format(localname, detail))
+        elif status != 'unchanged':
+            print(_("Plugin {} {}: {}").format(localname, status, detail))
+
+
+def submit_job(parser:argparse.ArgumentParser, args:argparse.Namespace, socketfile:str):
+    # thin client for --daemon, nothing here touches the config, keyring or panel.
+    if args.outdated:
+        request = {'op':'outdated', 'server':args.smanage}
+    elif args.update and args.all_servers and not args.smanage:
+        request = {'op':'update'}
+    elif args.smanage and args.update:
+        request = {'op':'update', 'server':args.smanage}
+    elif args.smanage and args.individual:
+        request = {'op':'update', 'server':args.smanage, 'plugins':[args.individual]}
+    elif args.smanage and args.umod:
+        request = {'op':'install', 'server':args.smanage, 'plugins':{umodname: parse.urljoin(settings.umodbase, umodname) for umodname in args.umod}}
+    elif args.smanage and args.gen:
+        request = {'op':'install', 'server':args.smanage, 'plugins':{args.gen[0]: args.gen[1]}}
+    elif args.smanage and args.remove:
+        request = {'op':'remove', 'server':args.smanage, 'plugins':[args.remove]}
+    elif args.rollback and (args.smanage or args.all_servers):
+        request = {'op':'rollback', 'server':args.smanage, 'plugins':[args.rollback]}
+    else:
+        request = {'op':'status'}
+    if args.plan:
+        request['dryrun'] = True
+    try:
+        reply = rpDaemon.request(socketfile, request)
+    except OSError as e:
+        parser.error(_("No daemon is listening on {}, start one with --daemon.\nDetail: {}").format(socketfile, e))
+    if not reply.get('ok'):
+        print(_("Daemon job failed: {}").format(reply.get('error')))
+        sys.exit(1)
+    if request['op'] == 'status':
+        print(_("Daemon on {}: {} jobs queued, next sweep in {:.0f}s.").format(socketfile, reply['queued'], reply['nextsweep'] or 0))
+        if reply.get('lastsweep'):
+            print(_("Last sweep took {:.1f}s and {}.").format(reply['lastsweep']['seconds'], _('succeeded') if reply['lastsweep']['ok'] else _('failed')))
+    elif reply.get('summary'):
+        print(reply['summary'])
+    else:
+        for r in reply['results']:
+            print(_("Server ID:{}\tPlugin:{}\tStatus:{}\t{}").format(r['server'], r['plugin'], r['status'], r['detail']))
+    if any(r['status'] == 'failed' for r in reply.get('results', [])):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=_('Manage rust plugins on rust instances within pterodactyl.'))
+    parser.add_argument('-i','--instance', nargs=2, metavar=('instance-uri','instance-bearer'), help=_('Configure connection to instance with uri and api key (bearer)'))
+    parser.add_argument('-s','--show-instance', action='store_true', help=_('Show connection to instance with uri and partial api key (bearer)'))
+    parser.add_argument('-t', '--list-available',action='store_true', help=_('List all servers available to manage'))
+    parser.add_argument('-L','--slist', action='store_true', help=_('List Managed Servers'))
+    parser.add_argument('-A','--sadd', metavar='<Server ID>', help=_('Add a server to manage.'))
+    parser.add_argument('-R','--sremove', metavar='<Server ID>', help=_('Remove a currently managed server.'))
+    parser.add_argument('-M', '--smanage', metavar='<Server ID>', help=_('Manage server with -u/-g/-p/-r'))
+    parser.add_argument('--force', action='store_true', help=_('Can be combined with --sremove to force removal of server, or with --umod/--gen to overwrite existing files without asking.'))
+    parser.add_argument('--plan', action='store_true', help=_('Can be combined with --update/--umod/--gen/--remove/--individual to show the uploads, renames, deletes and reloads they would make without making them.'))
+    parser.add_argument('--all-servers', action='store_true', help=_('Can be combined with --update or --rollback to update or roll back every managed server.'))
+    parser.add_argument('--state', metavar='<state>', default='running', help=_('Can be combined with --list-available to list servers in this state, or any.'))
+    parser.add_argument('--json', action='store_true', help=_('Can be combined with --list-available to print one JSON object per server.'))
+    parser.add_argument('--outdated', action='store_true', help=_('Report maintained plugins with a newer version available, on every managed server or the one given by --smanage, without downloading them.'))
+    parser.add_argument('--daemon', action='store_true', help=_('Run in the foreground, sweeping managed servers for updates on a schedule and accepting --submit jobs.'))
+    parser.add_argument('--submit', action='store_true', help=_('Send --update/--umod/--gen/--remove/--individual/--rollback to the running --daemon instead of running them here, alone shows the daemon status.'))
+    parser.add_argument('--profile', action='store_true', help=_('Print the time spent in each panel, wings and origin operation when finished.'))
+    parser.add_argument('-v','--verbose', action='store_true', help=_('Verbose mode. Print debugging messages about progress and process.'))
+
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-l','--list', action='store_true', help=_('List maintained plugins.'))
+    group.add_argument('-u','--umod', nargs='+', metavar='umod-filename', help=_('Install and Maintain one or more Umod Plugins.'))
+    group.add_argument('-g','--gen', nargs=2, metavar=('gen-filename','gen-url'), help=_('Install and Maintain Generic Plugin.'))
+    group.add_argument('-p','--update', action='store_true', help=_('Update currently maintained plugins, combine with --smanage or --all-servers.'))
+    group.add_argument('-d','--individual', metavar='filename', help=_('Update individual plugin.'))
+    group.add_argument('-r', '--remove', help=_('Remove currently maintained plugin.'))
+    group.add_argument('--rollback', metavar='filename', help=_('Put back the version of a maintained plugin before its last update, combine with --smanage or --all-servers. It is held there until installed again or updated with --individual.'))
+    #group.add_argument('-f', '--ftpauth', metavar='ftp-user', help=_('Set FTP Authentication Details prompting for password.'))
+    args = parser.parse_args()
+
+
+    #configuration vars - do not edit - see config.py
+    #the state database location is specified by config.py in this directory, and defaults the same directory as this script.
+    appfile = (Path(sys.argv[0]).name)
+    approot = str(Path(sys.argv[0]).parent.absolute())
+
+    #paths
+    #configuration
+    if os.path.isabs(settings.statename):
+        statefile = settings.statename
+    else:
+        statefile = os.path.join(approot,settings.statename)
+    #legacy configuration, migrated into the state database on first run
+    if os.path.isabs(settings.configname):
+        configfile = settings.configname
+    else:
+        configfile = os.path.join(approot,settings.configname)
+    #cache directory
+    if os.path.isabs(settings.cachedirname):
+        cachedir = settings.cachedirname
+    else:
+        cachedir = os.path.join(approot, settings.cachedirname)
+    #log    
+    if os.path.isabs(settings.logname):
+        logfile = settings.logname
+    else:
+        logfile = os.path.join(approot,settings.logname)
+    #daemon socket
+    if os.path.isabs(settings.daemonsocketname):
+        socketfile = settings.daemonsocketname
+    else:
+        socketfile = os.path.join(approot,settings.daemonsocketname)
+    #seed files, read by rpServer.plan
+    if settings.seeddirname and not os.path.isabs(settings.seeddirname):
+        settings.seeddirname = os.path.join(approot, settings.seeddirname)
+    #trace export
+    if not settings.tracefile or os.path.isabs(settings.tracefile):
+        tracepath = settings.tracefile
+    else:
+        tracepath = os.path.join(approot,settings.tracefile)
+
+    if(args.submit):
+        submit_job(parser, args, socketfile)
+        return
+
+    #spans are exported and --profile printed however main exits
+    tracer.configure(tracepath, settings.traceformat, args.profile)
+    atexit.register(tracer.finish)
+
+    #config objects
+    config = rpConfig()
+    config.open(statefile, configfile)
+
+    #directory structure
+    if not os.path.isdir(cachedir):
+        try:
+            os.mkdir(cachedir)
+        except Exception:
+            print(_("Directory Structure setup failed creating {}").format(cachedir))
+    plugincache = rpCache(cachedir, settings.cachemaxbytes)
+
+
+    #logging
+    logger = start_logging(logfile)
+
+
+    # set current language
+    lang_translations = gettext.translation('base', localedir='{}/locales'.format(approot), languages=[config.get('lang') or 'en'], fallback=True)
+
+    lang_translations.install()
+    # route _ in every module of the package through it
+    util.translations = lang_translations
+
+
+
+
+
+
+
+    #connection
+
+
+    if(config.check_config_instance()):
+        basecon=rpConnection(config.get('instance'), rpConfig.getsecure('bearer'))
+    else:    
+        if not args.instance and len(sys.argv) > 1:    
+            parser.error(_("-i/--instance configuration is required before using other features of {}").format(appfile))
+        if len(sys.argv)  == 1:
+            parser.print_help()
+
+    if(args.verbose):
+        logging.getLogger(appname).setLevel(logging.INFO)
+    
+    if(args.daemon):
+        if not config.check_config_instance():
+            parser.error(_("-i/--instance configuration is required before using other features of {}").format(appfile))
+        daemon = rpDaemon(basecon, plugincache, config, socketfile, settings.daemoninterval, settings.daemonjitter)
+        signal.signal(signal.SIGTERM, daemon.stop)
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if(args.instance):
+        print(_("Validating instance-uri {}.").format(args.instance[0]))
+        if settings.credentialbackend == 'keyring':
+            print(_("Note: This tool uses your operating systems keyring to store your sensitive authentication data.\nYou may be asked for your keyring passord or to set one."))
+        if(validators.url(args.instance[0])):
+            if(settings.appkey == 'changeme' and settings.credentialbackend == 'keyring'):
+                print(_("You must change the application key from the default in config.py."))        
+                sys.exit()
+            try:
+                rpConfig.setsecure('bearer',args.instance[1])
+            except PermissionError as e:
+                parser.error(str(e))
+        
+            print(_("Validating instance-bearer {}.").format(rpConfig.getsecure('bearer')))
+            con = rpConnection(args.instance[0], rpConfig.getsecure('bearer'))
+            e = con.check()
+            if not e == True:
+                parser.error(_('Connection failure, double check uri and more importantly bearer.\nDetail: {}.').format(e))
+            else:
+                print(_("instance-uri and instance-bearer pass connection test."))
+                print(_('Writing configuration to {}...').format(str(statefile)), end='')
+                config.set('instance', args.instance[0])
+                print(_("...done"))
+                basecon = con
+
+        else:
+            parser.error(_("instance-uri is not a valid uri."))
+
+    if(args.show_instance):
+        print(_("{} - Currently configured instance.\nuri: {}\npartial bearer: {}").format(appfile, config.get('instance'), rpConfig.getsecure('bearer')[:16] ))
+
+    
+    if(args.list_available):
+        # no check() here, it would page through every server before the first row prints.
+        if not args.json:
+            print(_('{} - Available Servers:').format(appfile))
+        rust_servers = (cs_attr for cs_attr in basecon.iter_servers() if 'core:rust' in cs_attr['docker_image'])
+        for cs_attr, server_util in basecon.probe_servers(rust_servers, settings.rolloutpanelconcurrency):
+            if isinstance(server_util, Exception):
+                logger.debug("utilization of %s failed: %s", cs_attr['identifier'], server_util)
+                continue
+            if args.state != 'any' and args.state != server_util['current_state']:
+                continue
+            if args.json:
+                print(json.dumps({'identifier':cs_attr['identifier'], 'name':cs_attr['name'], 'state':server_util['current_state'], 'docker_image':cs_attr['docker_image']}), flush=True)
+            else:
+                print(_('Server ID:{}\tName:{}\tState:{}\tManage Command: {} --sadd {}').format(cs_attr["identifier"],cs_attr["name"],server_util['current_state'],appfile,cs_attr["identifier"]), flush=True)
+
+    if(args.sadd):
+        if not basecon.check() == True:
+            basecon = rpConnection(config.get('instance'), rpConfig.getsecure('bearer'))
+        print(_('{} - Add Server({}):').format(appfile,args.sadd))
+        e = basecon.server_exists(args.sadd)    
+        if e == True:
+            server = rpServer(args.sadd)
+            print(_('Fetching status data from {}...').format(basecon.get_instance_url()))
+            server.fetch(basecon)
+            if config.server_ismanaged(server.identifier):
+                parser.error(_("Error storing server {} in configuration, server already configured.").format(server.name))
+            print(_("Adding \"{}\" with ID {} to configuration.").format(server.name, server.identifier))
+            print(_('Writing configuration to {}...').format(str(statefile)), end='')
+            try:
+                config.server_save(server)
+            except sqlite3.Error as err:
+                parser.error(_("Error storing server {} in configuration.\nDetail: {}").format(server.name, err))
+            print(_("...done"))
+        
+        else:
+            parser.error(_("Specified server does not exist.\nDetail: {}").format(e))
+
+    if(args.sremove):
+        if not basecon.check() == True:
+            basecon = rpConnection(config.get('instance'), rpConfig.getsecure('bearer'))
+        print(_('{} - Remove Server({}):').format(appfile,args.sremove))
+        e = basecon.server_exists(args.sremove)    
+        if e == True:
+            server = config.server_getmanaged(args.sremove)
+            if server:
+                print(_('Writing configuration to {}...').format(str(statefile)), end='')
+                config.server_remove(args.sremove)
+                print(_("...done"))
+                print(_('Server {} Removed').format(server.name))
+            else:
+                print(_('Server {} is not managed.').format(args.sremove))
+        else:
+            if(args.force):
+                    if config.server_remove(args.sremove):
+                        print(_('Server {} Removed Forcibly.').format(args.sremove))
+            else:
+                parser.error(_("Specified server does not exist in pterodactyl, use --force to force removal\nDetail: {}").format(e))
+
+    if(args.slist):
+        if not basecon.check() == True:
+            basecon = rpConnection(config.get('instance'), rpConfig.getsecure('bearer'))
+        print(_('{} - Managed Servers:').format(appfile))
+        print(_('Fetching status data from {}...').format(basecon.get_instance_url()))
+        serverlist = config.servers()
+        if len(serverlist) > 0:
+            basecon.prefetch_utilization([server.identifier for server in serverlist], settings.rolloutpanelconcurrency)
+            for server in serverlist:
+                try:
+                    server.fetch(basecon)
+                except Exception as e:
+                    logger.debug("fetch of %s failed: %s", server.identifier, e)
+            for server in serverlist:       
+                print(_("Server ID:{}\tName:{}\tState:{}\tUUID:{}").format(server.identifier, server.name, server.state, server.uuid))
+        else:
+            print(_('No managed servers configured. Use --list-available and --sadd to add rust servers to manage.'))
+    
+    if(args.outdated):
+        if not basecon.check() == True:
+            basecon = rpConnection(config.get('instance'), rpConfig.getsecure('bearer'))
+        print(_('{} - Outdated Plugins:').format(appfile))
+        serverlist = [config.server_getmanaged(args.smanage)] if args.smanage else config.servers()
+        if args.smanage and not serverlist[0]:
+            parser.error(_("Server {} is not managed by {}").format(args.smanage,appfile))
+        if len(serverlist) > 0:
+            rollout = rpRollout(basecon, plugincache, serverlist, settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency)
+            rollout.outdated()
+            print(rollout.summary())
+            for server in serverlist:
+                config.server_save(server)
+        else:
+            print(_('No managed servers configured. Use --list-available and --sadd to add rust servers to manage.'))
+        return
+
+    if(args.rollback):
+        if not args.smanage and not args.all_servers:
+            parser.error(_("Option {} requires one of {}").format('--rollback','--smanage/--all-servers'))
+        if not basecon.check() == True:
+            basecon = rpConnection(config.get('instance'), rpConfig.getsecure('bearer'))
+        print(_('{} - Roll Back {}:').format(appfile, args.rollback))
+        serverlist = [config.server_getmanaged(args.smanage)] if args.smanage else config.servers()
+        if args.smanage and not serverlist[0]:
+            parser.error(_("Server {} is not managed by {}").format(args.smanage,appfile))
+        if not any(args.rollback in (server.pluginlist or {}) for server in serverlist):
+            parser.error(_("{} is unknown and not maintained.").format(args.rollback))
+        rollout = rpRollout(basecon, plugincache, serverlist, settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency)
+        rollout.rollback(args.rollback)
+        print(rollout.summary())
+        print(_('Writing configuration to {}...').format(str(statefile)), end='')
+        for server in serverlist:
+            config.server_save(server, [args.rollback])
+        print(_("...done"))
+        if any(r['status'] == 'failed' for r in rollout.results):
+            sys.exit(1)
+        return
+
+    if(args.update and args.all_servers and not args.smanage):
+        if not basecon.check() == True:
+            basecon = rpConnection(config.get('instance'), rpConfig.getsecure('bearer'))
+        print(_('{} - Update All Managed Servers:').format(appfile))
+        serverlist = config.servers()
+        if len(serverlist) > 0:
+            rollout = rpRollout(basecon, plugincache, serverlist, settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency, dryrun=args.plan)
+            rollout.run()
+            print(rollout.summary())
+            if not args.plan:
+                print(_('Writing configuration to {}...').format(str(statefile)), end='')
+                for server in serverlist:
+                    config.server_save(server)
+                print(_("...done"))
+        else:
+            print(_('No managed servers configured. Use --list-available and --sadd to add rust servers to manage.'))
+    elif(args.update and not args.smanage):
+        parser.error(_("Option {} requires one of {}").format('--update','--smanage/--all-servers'))
+
+    if(args.smanage):
+        if not basecon.check() == True:
+            basecon = rpConnection(config.get('instance'), rpConfig.getsecure('bearer'))
+        print(_('{} - Manage Server({}):').format(appfile,args.smanage))
+        e = basecon.server_exists(args.smanage)
+        if e == True:        
+            if(not args.umod and not args.gen and not args.update and not args.individual and not args.remove):
+                print(_("Option {} requires one of {}").format('--smanage','--umod/--gen/--update/--individual/--remove'))
+            else:
+                if(args.umod or args.gen):
+                    print(_('Confirming server {} details... ').format(args.smanage))
+                    if config.server_ismanaged(args.smanage):                     
+                        server = config.server_getmanaged(args.smanage)
+                        server.fetch(basecon)
+                        if server.state == 'running' or args.plan:
+                            ox = config.get('remoteoxideplugins')     
+                            if(args.gen and not validators.url(args.gen[1])):
+                                parser.error(_("gen-url {} is not a valid url.").format(args.gen[1]))
+                            if(ox):
+                                if(args.umod):
+                                    origins = {umodname: parse.urljoin(settings.umodbase, umodname) for umodname in args.umod}
+                                    for umodname in args.umod:
+                                        print(_("Adding Umod Plugin to configuration {}...").format(umodname))
+                                else:
+                                    origins = {args.gen[0]: args.gen[1]}
+                                    print(_("Adding Generic Plugin to configuration {}...").format(args.gen[0]))
+                                for localname, origin in origins.items():
+                                    server.pluginadd(origin, localname, "{}/{}".format(ox,localname))
+                                if(args.plan):
+                                    rollout = rpRollout(basecon, plugincache, [server], settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency, list(origins), dryrun=True)
+                                    rollout.run()
+                                    print(rollout.summary())
+                                else:
+                                    sync_plugins(basecon, plugincache, server, list(origins), args.force)
+                                    config.server_save(server, list(origins))
+                                    plugincache.collect({server.pluginlist[localname].get('hash') for localname in origins})
+                        else:
+                            print(_("Server {} is not running. The server must be running for this operation.").format(args.smanage)) 
+                    else:
+                        print(_("Server {} is not managed by {}").format(args.smanage,appfile))
+                if(args.update or args.individual or args.remove):
+                    if config.server_ismanaged(args.smanage):
+                        server = config.server_getmanaged(args.smanage)
+                        name = args.individual or args.remove
+                        if name and name not in (server.pluginlist or {}):
+                            parser.error(_("{} is unknown and not maintained.").format(name))
+                        if(args.remove):
+                            rollout = rpRollout(basecon, plugincache, [server], settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency, [], [args.remove], dryrun=args.plan)
+                            print(_("Removing {} from {}...").format(args.remove, args.smanage))
+                        else:
+                            rollout = rpRollout(basecon, plugincache, [server], settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency, [args.individual] if args.individual else None, dryrun=args.plan)
+                            print(_("Updating maintained plugins on {}...").format(args.smanage))
+                        rollout.run()
+                        print(rollout.summary())
+                        if not args.plan:
+                            print(_('Writing configuration to {}...').format(str(statefile)), end='')
+                            config.server_save(server)
+                            print(_("...done"))
+                    else:
+                        print(_("Server {} is not managed by {}").format(args.smanage,appfile))
+                # if(args.ftpauth):
+                #     p = getpass.getpass(prompt=_("SFTP Password:"))
+                #     server = config.server_getmanaged(args.smanage)
+                #     server.fetch(basecon)
+                #     server.sftp_set_auth(args.ftpauth)                
+                #     if server.sftp_check_auth(appname,basecon,p):              
+                #         rpConfig.setsecure("ftp_"+args.ftpauth,p)
+                #         print(_('Successfully Authenticated {}').format(args.ftpauth))
+                #         print(_('Writing configuration to {}...').format(str(configfile)), end='')
+                #         config.write_config(configfile)
+                #         print(_("...done"))
+                #     else:
+                #         print(_('Failure Authenticating {}').format(args.ftpauth))
+
+                
+        else:
+            parser.error(_("Specified server does not exist in pterodactyl.\nDetail: {}").format(e))     
+
+
+    if len(sys.argv) == 1:
+        parser.error(_("No operations specified. Expecting one of (--instance/--show-instance/--list-available/--sadd/--sremove/--smanage)"))
+    
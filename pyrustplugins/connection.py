@@ -0,0 +1,380 @@
+from __future__ import annotations
+from urllib import parse
+
+from . import settings
+import logging
+import threading
+import queue
+import json
+import time
+import random
+import hashlib
+import email.utils
+import concurrent.futures
+from .util import _, pydactyl, requests, rpTTLCache, rpUtil, websocket
+from .trace import tracer
+
+class rpTokenBucket:
+    # requests allowed against one api key or host, perminute of them refilled evenly and at most
+    # a minute's worth saved up. 0 per minute never waits except after a 429. the panel's
+    # X-RateLimit headers and Retry-After correct it as responses come back.
+
+    def __init__(self, perminute:int):
+        self._lock = threading.Lock()
+        self.configure(perminute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked = 0
+
+    def configure(self, perminute:int):
+        self.perminute = max(0, int(perminute or 0))
+        self.capacity = max(1, self.perminute)
+        self.rate = self.perminute / 60
+
+    def _refill(self, now:float):
+        if self.perminute:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        # takes a token and returns the seconds to wait before using it. tokens go negative
+        # while requests queue up, so concurrent callers are spaced out rather than bunched.
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0, self.blocked - now)
+            if self.perminute:
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def update(self, limit:int=None, remaining:int=None, retryafter:float=None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if limit and limit != self.perminute:
+                self.configure(limit)
+            # another client on the same key spent some, or the window is not what we assumed.
+            if remaining is not None and remaining < self.tokens:
+                self.tokens = remaining
+            if retryafter:
+                self.blocked = max(self.blocked, now + retryafter)
+                self.tokens = min(self.tokens, 0)
+
+
+class rpRateLimiter:
+    # token buckets shared by every connection in the process, one per api key on a panel and
+    # one per wings node or plugin origin host, and the retry policy of requests made through them.
+    _buckets = {}
+    _lock = threading.Lock()
+    idempotent = ('GET', 'HEAD', 'OPTIONS')
+    logger = logging.getLogger('rustplugins.ratelimit')
+
+    def bucket(key, perminute:int) -> rpTokenBucket:
+        with rpRateLimiter._lock:
+            if key not in rpRateLimiter._buckets:
+                rpRateLimiter._buckets[key] = rpTokenBucket(perminute)
+            return rpRateLimiter._buckets[key]
+
+    def panelbucket(instance:str, authbearer:str) -> rpTokenBucket:
+        return rpRateLimiter.bucket(('panel', parse.urlsplit(instance).netloc, hashlib.sha256((authbearer or '').encode()).hexdigest()), settings.panelratelimit)
+
+    def hostbucket(url:str) -> rpTokenBucket:
+        return rpRateLimiter.bucket(('host', parse.urlsplit(url).netloc), settings.hostratelimit)
+
+    def retryable(method:str, status:int) -> bool:
+        # a 429 was turned away before it did anything, so any method is sent again.
+        return status == 429 or (method.upper() in rpRateLimiter.idempotent and status in (502, 503, 504))
+
+    def backoff(attempt:int) -> float:
+        # exponential with jitter, so servers throttled together don't retry together.
+        delay = min(settings.httpbackoffmax, settings.httpbackoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def headers(headers) -> tuple:
+        # (limit, remaining, retry after seconds), None where the response didn't say.
+        counts = []
+        for key in ('X-RateLimit-Limit', 'X-RateLimit-Remaining'):
+            try:
+                counts.append(int(headers[key]))
+            except (KeyError, TypeError, ValueError):
+                counts.append(None)
+        retryafter = headers.get('Retry-After')
+        if retryafter is not None:
+            try:
+                retryafter = float(retryafter)
+            except ValueError:
+                # an http date rather than seconds.
+                try:
+                    retryafter = max(0, email.utils.parsedate_to_datetime(retryafter).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    retryafter = None
+        return counts[0], counts[1], retryafter
+
+    def request(bucket:rpTokenBucket, session:requests.Session, service:str, method:str, url:str, **kwargs) -> requests.Response:
+        # waits for a token, then retries 429s and, for idempotent methods, 502/503/504 and
+        # connection errors up to httpretries times. streamed bodies can't be sent twice.
+        kwargs.setdefault('timeout', settings.httptimeout)
+        replayable = not hasattr(kwargs.get('data'), 'read')
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait:
+                tracer.throttled(wait)
+                time.sleep(wait)
+            started = time.perf_counter()
+            try:
+                r = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= settings.httpretries or not replayable or method.upper() not in rpRateLimiter.idempotent:
+                    raise
+                rpRateLimiter.logger.debug("%s %s failed, retrying: %s", method, rpUtil.redact(url), e)
+            else:
+                tracer.observe(r, service, time.perf_counter() - started)
+                limit, remaining, retryafter = rpRateLimiter.headers(r.headers)
+                bucket.update(limit, remaining, retryafter if r.status_code == 429 else None)
+                if attempt >= settings.httpretries or not replayable or not rpRateLimiter.retryable(method, r.status_code):
+                    return r
+                rpRateLimiter.logger.debug("%s %s answered %s, retrying", method, rpUtil.redact(url), r.status_code)
+                r.close()
+            tracer.retried()
+            time.sleep(rpRateLimiter.backoff(attempt))
+            attempt += 1
+
+
+class rpConnection:    
+    
+    def __init__(self, instance:str, authbearer:str):
+        self._instance = instance
+        self._authbearer = authbearer        
+        self._client = None
+        # (server identifier, directory) -> {name: attributes}, see rpServer.file_listing
+        self.listings = rpTTLCache(settings.listingttl)
+        self._listinglocks = {}
+        # keep-alive sessions, one for the panel and one per wings node host.
+        self._session = None
+        self._nodesessions = {}
+        self._sessionlock = threading.Lock()
+        # 'servers' -> {identifier: attributes}, ('resources', identifier) -> attributes
+        self.metadata = rpTTLCache(settings.metadatattl)
+        self._metadatalock = threading.Lock()
+        # identifier -> plugin file names waiting for rpServer.pluginreloadflush
+        self._reloads = {}
+        self._reloadlock = threading.Lock()
+        # shared with every other connection using the same bearer on this panel.
+        self.ratelimit = rpRateLimiter.panelbucket(instance, authbearer)
+    
+    def check(self):    
+        try:
+            self.list_servers()
+        except Exception as e:
+            return e
+        else:
+            return True
+    
+    def server_exists(self, serverid: str):
+        try:
+            servers = self.list_servers()
+        except Exception as e:
+            return e
+        if serverid in servers:
+            return True
+        return LookupError(_("Server {} is not available on {}.").format(serverid, self._instance))
+
+    def list_servers(self, refresh:bool=False) -> dict:
+        # one listing fills uuid/name for every server, concurrent callers share it.
+        with self._metadatalock:
+            servers = None if refresh else self.metadata.get('servers')
+            if servers is None:
+                servers = {attributes['identifier']: attributes for attributes in self.iter_servers()}
+                self.metadata.put('servers', servers)
+            return servers
+
+    def iter_servers(self):
+        # follows the panel's pagination lazily, one page request at a time.
+        page = 1
+        while page:
+            r = self.panel_request('GET', '', params={'page': page})
+            r.raise_for_status()
+            servers, page = rpUtil.server_page(r.json(), page)
+            yield from servers
+
+    def server_metadata(self, serverid:str) -> dict:
+        servers = self.list_servers()
+        if serverid not in servers:
+            raise LookupError(_("Server {} is not available on {}.").format(serverid, self._instance))
+        return servers[serverid]
+
+    def server_utilization(self, serverid:str, refresh:bool=False) -> dict:
+        key = ('resources', serverid)
+        utilization = None if refresh else self.metadata.get(key)
+        if utilization is None:
+            r = self.panel_request('GET', 'servers/{}/resources'.format(serverid))
+            r.raise_for_status()
+            utilization = self.metadata.put(key, r.json()['attributes'])
+        return utilization
+
+    def probe_servers(self, servers, concurrency:int=8):
+        # yields (attributes, utilization or exception) in completion order,
+        # servers may be a lazy iterator that is still paging.
+        results = queue.Queue()
+        pending = 0
+
+        def probe(attributes):
+            try:
+                results.put((attributes, self.server_utilization(attributes['identifier'])))
+            except Exception as e:
+                results.put((attributes, e))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for attributes in servers:
+                pool.submit(probe, attributes)
+                pending += 1
+                while pending:
+                    try:
+                        result = results.get_nowait()
+                    except queue.Empty:
+                        break
+                    pending -= 1
+                    yield result
+            while pending:
+                pending -= 1
+                yield results.get()
+
+    def prefetch_utilization(self, serverids:list, concurrency:int=8) -> dict:
+        results = {}
+        serverids = list(serverids)
+        if not serverids:
+            return results
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(serverids)))) as pool:
+            futures = {serverid: pool.submit(self.server_utilization, serverid) for serverid in serverids}
+            for serverid, future in futures.items():
+                try:
+                    results[serverid] = future.result()
+                except Exception as e:
+                    results[serverid] = e
+        return results
+    
+    def get_client(self):
+        if self._client is None:
+            self._client = pydactyl.PterodactylClient(self._instance, self._authbearer)
+        return self._client
+    
+    def get_instance_url(self):
+        return self._instance
+
+    def get_full_authbearer(self):
+        return self._authbearer
+
+    def panel_session(self) -> requests.Session:
+        with self._sessionlock:
+            if self._session is None:
+                self._session = rpUtil.pooled_session({
+                'Accept': 'application/json',
+                'Authorization': 'Bearer {}'.format(self._authbearer),
+                })
+            return self._session
+
+    def node_session(self, url:str) -> requests.Session:
+        host = parse.urlsplit(url).netloc
+        with self._sessionlock:
+            if host not in self._nodesessions:
+                self._nodesessions[host] = rpUtil.pooled_session({'Accept': 'application/json'})
+            return self._nodesessions[host]
+
+    def panel_request(self, method:str, path:str, **kwargs) -> requests.Response:
+        # an empty path is the client api root, which lists the account's servers.
+        uri = '{}/api/client{}'.format(self._instance.rstrip('/'), '/' + path if path else '')
+        return rpRateLimiter.request(self.ratelimit, self.panel_session(), 'panel', method, uri, **kwargs)
+
+    def node_request(self, method:str, url:str, **kwargs) -> requests.Response:
+        return rpRateLimiter.request(rpRateLimiter.hostbucket(url), self.node_session(url), 'wings', method, url, **kwargs)
+
+    def listinglock(self, key) -> threading.Lock:
+        with self._sessionlock:
+            return self._listinglocks.setdefault(key, threading.Lock())
+
+    def queue_reload(self, serverid:str, localname:str):
+        with self._reloadlock:
+            queued = self._reloads.setdefault(serverid, [])
+            if localname not in queued:
+                queued.append(localname)
+
+    def take_reloads(self, serverid:str) -> list:
+        with self._reloadlock:
+            return self._reloads.pop(serverid, [])
+
+    def close(self):
+        with self._sessionlock:
+            for session in [self._session] + list(self._nodesessions.values()):
+                if session is not None:
+                    session.close()
+            self._session = None
+            self._nodesessions = {}
+
+
+
+
+
+    def __repr__(self):
+        return "{}({}, ***)".format(self.__class__.__name__,self._instance)
+
+
+            
+
+
+class rpConsole:
+    # console websocket of one server, used to send commands and read their output.
+
+    def __init__(self, connection:rpConnection, identifier:str):
+        self.connection = connection
+        self.identifier = identifier
+        self._ws = None
+
+    def _credentials(self):
+        r = self.connection.panel_request('GET', 'servers/{}/websocket'.format(self.identifier))
+        r.raise_for_status()
+        return r.json()['data']
+
+    def open(self):
+        credentials = self._credentials()
+        self._ws = websocket.create_connection(credentials['socket'], origin=self.connection.get_instance_url().rstrip('/'), timeout=settings.httptimeout)
+        self._send('auth', credentials['token'])
+        deadline = time.monotonic() + settings.httptimeout
+        while time.monotonic() < deadline:
+            event, args = self._recv(deadline)
+            if event == 'auth success':
+                return
+            if event in ('jwt error', 'token expired'):
+                raise ConnectionError(_("Console websocket rejected the token: {}").format(args))
+        raise TimeoutError(_("Console websocket did not authenticate."))
+
+    def _send(self, event:str, *args):
+        self._ws.send(json.dumps({'event': event, 'args': list(args)}))
+
+    def _recv(self, deadline:float):
+        self._ws.settimeout(max(0.1, deadline - time.monotonic()))
+        message = json.loads(self._ws.recv())
+        return message.get('event'), message.get('args') or []
+
+    def send_command(self, command:str):
+        self._send('send command', command)
+
+    def lines(self, deadline:float):
+        while time.monotonic() < deadline:
+            try:
+                event, args = self._recv(deadline)
+            except websocket.WebSocketTimeoutException:
+                return
+            if event == 'console output' and args:
+                yield args[0]
+            elif event == 'token expiring':
+                self._send('auth', self._credentials()['token'])
+
+    def close(self):
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            finally:
+                self._ws = None
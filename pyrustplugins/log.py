@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from . import settings
+import logging
+import logging.handlers
+import sys
+import copy
+import queue
+import atexit
+from .util import appname, rpUtil
+
+class rpLogQueueHandler(logging.handlers.QueueHandler):
+    # never blocks the caller: records are formatted and written by the listener thread,
+    # and once logqueuesize of them are waiting new ones are counted and dropped.
+
+    def __init__(self, records:queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        # merges msg and args like the stdlib does, so arguments changed after the call or
+        # holding secrets never reach the listener, and redacts the result. the copy leaves
+        # the record other handlers see as it was.
+        message = rpUtil.redact(self.format(record))
+        record = copy.copy(record)
+        record.message, record.msg, record.args = message, message, None
+        record.exc_info, record.exc_text, record.stack_info = None, None, None
+        return record
+
+    def enqueue(self, record:logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class rpLogQueueListener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self):
+        # waits for room, a full queue must not stop the listener from draining at exit.
+        self.queue.put(self._sentinel)
+
+
+class rpLogRedactor(logging.Filter):
+    # masks bearer tokens, signed url tokens and passwords in the records written to stdout,
+    # rpLogQueueHandler redacts those going to the debug log.
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        message = record.getMessage()
+        redacted = rpUtil.redact(message)
+        if redacted != message:
+            record.msg, record.args = redacted, None
+        return True
+
+
+def start_logging(logfile:str) -> logging.Logger:
+    # stdout stays synchronous so it interleaves with printed tables, the debug log is
+    # written and rotated on a listener thread that is drained at exit.
+    logger = logging.getLogger(appname)
+    logger.setLevel(logging.DEBUG)
+    redactor = rpLogRedactor()
+    lstdout = logging.StreamHandler(sys.stdout)
+    lstdout.setLevel(logging.INFO)
+    lstdout.addFilter(redactor)
+    lfile = logging.handlers.RotatingFileHandler(logfile, maxBytes=settings.logmaxbytes, backupCount=settings.logbackups, delay=True)
+    lfile.setLevel(logging.DEBUG)
+    lqueue = rpLogQueueHandler(queue.Queue(settings.logqueuesize))
+    listener = rpLogQueueListener(lqueue.queue, lfile, respect_handler_level=True)
+    logger.addHandler(lqueue)
+    logger.addHandler(lstdout)
+    listener.start()
+
+    def stop():
+        listener.stop()
+        if lqueue.dropped:
+            lfile.handle(logging.makeLogRecord({'name':appname, 'levelno':logging.WARNING, 'levelname':'WARNING', 'msg':"{} log records were dropped while the log queue was full.".format(lqueue.dropped)}))
+        lfile.close()
+
+    atexit.register(stop)
+    return logger
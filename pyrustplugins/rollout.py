@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+from . import settings
+import logging
+import os
+import threading
+import queue
+import json
+import time
+import concurrent.futures
+import random
+import socket
+import socketserver
+from .util import _, rpUtil
+from .trace import tracer
+from .connection import rpConnection
+from .cache import rpCache
+from .server import rpPlan, rpServer
+from .state import rpConfig
+
+class rpRollout:
+
+    def __init__(self, connection:rpConnection, cache:rpCache, servers:list, panelconcurrency:int=8, serverconcurrency:int=2, localnames:list=None, removals:list=None, dryrun:bool=False):
+        self.connection = connection
+        self.cache = cache
+        self.servers = servers
+        # when given only these plugins are rolled out, the rest of each server's set is left alone.
+        self.localnames = set(localnames) if localnames is not None else None
+        # plugins to stop maintaining and delete from each server.
+        self.removals = list(removals or [])
+        # with dryrun nothing is downloaded or changed, each server's rpPlan is kept in plans.
+        self.dryrun = dryrun
+        self.plans = []
+        self.panelconcurrency = max(1, int(panelconcurrency))
+        self.serverconcurrency = max(1, int(serverconcurrency))
+        self.results = []
+        self.elapsed = 0
+        self.mode = 'plan' if dryrun else 'update'
+        self.logger = logging.getLogger('rustplugins.rollout')
+        self._panelslots = threading.BoundedSemaphore(self.panelconcurrency)
+        self._resultlock = threading.Lock()
+
+    def run(self):
+        # one thread per server waits on its own plugin pool, the panel wide
+        # semaphore caps how many requests are actually in flight.
+        started = time.monotonic()
+        if self.servers:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.servers)) as pool:
+                for future in [pool.submit(self._runserver, server) for server in self.servers]:
+                    future.result()
+        self.elapsed = time.monotonic() - started
+        if not self.dryrun:
+            self.cache.collect({plugin.get('hash') for server in self.servers for plugin in (server.pluginlist or {}).values()})
+        return self.results
+
+    def _record(self, server:rpServer, plugin:str, status:str, detail:str, started:float):
+        with self._resultlock:
+            self.results.append({'server':server.identifier, 'name':server.name, 'plugin':plugin, 'status':status, 'detail':detail, 'seconds':time.monotonic() - started})
+
+    def _runserver(self, server:rpServer):
+        started = time.monotonic()
+        try:
+            with self._panelslots:
+                server.fetch(self.connection)
+        except Exception as e:
+            self.logger.debug("fetch of %s failed: %s", server.identifier, e)
+            self._record(server, '*', 'failed', _("Fetch failed: {}").format(e), started)
+            return
+        if server.state != 'running' and not self.dryrun:
+            self._record(server, '*', 'skipped', _("Server is {}.").format(server.state), started)
+            return
+        localnames = [localname for localname in (server.pluginlist or {}) if (self.localnames is None or localname in self.localnames) and localname not in self.removals]
+        removals = [localname for localname in self.removals if localname in (server.pluginlist or {})]
+        # plugins rolled back stay where they are until they are named explicitly.
+        if self.localnames is None:
+            for localname in [localname for localname in localnames if server.pluginlist[localname].get('held')]:
+                localnames.remove(localname)
+                self._record(server, localname, 'skipped', _("Held after --rollback."), started)
+        if not localnames and not removals:
+            self._record(server, '*', 'skipped', _("No maintained plugins."), started)
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.serverconcurrency) as pool:
+            pending = [(localname, pool.submit(self._prepareplugin, server, localname)) for localname in localnames]
+            prepared = {localname: future.result() for localname, future in pending}
+        candidates = [localname for localname, verdict in prepared.items() if verdict]
+        if not candidates and not removals:
+            return
+        try:
+            # every candidate is compared against one listing before anything changes it.
+            with self._panelslots:
+                plan = server.plan(self.connection, self.cache, candidates, removals, [localname for localname in candidates if prepared[localname] == 'refresh'])
+        except Exception as e:
+            self.logger.debug("planning %s failed: %s", server.identifier, e)
+            for localname in candidates + removals:
+                self._record(server, localname, 'failed', str(e), started)
+            return
+        if self.dryrun:
+            with self._resultlock:
+                self.plans.append(plan)
+            for localname, operation, detail in plan.operations():
+                self._record(server, localname, operation, detail, started)
+            return
+        self._applyplan(server, plan, started)
+
+    def _prepareplugin(self, server:rpServer, localname:str):
+        # None when the plugin failed here, 'ready' when its cached copy is current
+        # and 'refresh' when a dry run found a newer version it did not download.
+        started = time.monotonic()
+        try:
+            # when both sides declare a version, only a newer one at the origin is downloaded.
+            available = self.cache.origininfo(server.pluginlist[localname]['origin'], localname)
+            if available and available.get('version'):
+                with self._panelslots:
+                    installed = server.remoteinfo(self.connection, localname)
+                newer = rpUtil.newer(available['version'], (installed or {}).get('version'))
+                if newer is False:
+                    # the plan still compares the remote copy with the cached one.
+                    return 'ready'
+                if newer and self.dryrun:
+                    return 'refresh'
+            if self.dryrun:
+                return 'ready'
+            # the cache fetches each origin once per run, however many servers track it.
+            ok, errors = server.plugindownload(self.cache, localname, False)
+            if not ok:
+                self._record(server, localname, 'failed', "; ".join(errors), started)
+                return None
+            if not rpUtil.file_isnt_zero(server.pluginlist[localname]['local']):
+                self._record(server, localname, 'failed', _("Downloaded file is empty."), started)
+                return None
+            return 'ready'
+        except Exception as e:
+            self.logger.debug("rollout of %s to %s failed: %s", localname, server.identifier, e)
+            self._record(server, localname, 'failed', str(e), started)
+            return None
+
+    def _applyplan(self, server:rpServer, plan:rpPlan, started:float):
+        # uploads, renames and deletes hold a panel slot, the reload wait after them happens
+        # outside it, it would otherwise hold up other servers.
+        try:
+            with self._panelslots:
+                results = server.apply(self.connection, self.cache, plan, False, False)
+            results = server.reloaded(self.connection, results)
+        except Exception as e:
+            self.logger.debug("rollout to %s failed: %s", server.identifier, e)
+            results = {localname: ('failed', str(e)) for localname, operation, detail in plan.operations() if localname != '*'}
+        for localname, (status, detail) in results.items():
+            self._record(server, localname, status, detail, started)
+
+    def outdated(self):
+        # compares versions only, no plugin body moves: the origin's metadata or head against
+        # the [Info] of each remote copy, which is read again only when its listing changed.
+        self.mode = 'outdated'
+        started = time.monotonic()
+        if self.servers:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.servers)) as pool:
+                for future in [pool.submit(self._checkserver, server) for server in self.servers]:
+                    future.result()
+        self.elapsed = time.monotonic() - started
+        return self.results
+
+    def _checkserver(self, server:rpServer):
+        localnames = [localname for localname in (server.pluginlist or {}) if self.localnames is None or localname in self.localnames]
+        if not localnames:
+            self._record(server, '*', 'skipped', _("No maintained plugins."), time.monotonic())
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.serverconcurrency) as pool:
+            for future in [pool.submit(self._checkplugin, server, localname) for localname in localnames]:
+                future.result()
+
+    def _checkplugin(self, server:rpServer, localname:str):
+        started = time.monotonic()
+        try:
+            available = self.cache.origininfo(server.pluginlist[localname]['origin'], localname) or {}
+            with self._panelslots:
+                installed = server.remoteinfo(self.connection, localname)
+        except Exception as e:
+            self.logger.debug("version check of %s on %s failed: %s", localname, server.identifier, e)
+            self._record(server, localname, 'failed', str(e), started)
+            return
+        if installed is None:
+            self._record(server, localname, 'outdated', _("not installed -> {}").format(available.get('version') or '?'), started)
+            return
+        newer = rpUtil.newer(available.get('version'), installed.get('version'))
+        status = 'unknown' if newer is None else 'outdated' if newer else 'current'
+        self._record(server, localname, status, "{} -> {}".format(installed.get('version') or '?', available.get('version') or '?'), started)
+
+    def rollback(self, localname:str):
+        # up to three renames and one reload per server tracking localname, see rpServer.pluginrollback.
+        self.mode = 'rollback'
+        started = time.monotonic()
+        servers = [server for server in self.servers if localname in (server.pluginlist or {})]
+        if servers:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(servers)) as pool:
+                for future in [pool.submit(self._rollbackserver, server, localname) for server in servers]:
+                    future.result()
+        self.elapsed = time.monotonic() - started
+        return self.results
+
+    def _rollbackserver(self, server:rpServer, localname:str):
+        started = time.monotonic()
+        try:
+            with self._panelslots:
+                ok, detail = server.pluginrollback(self.connection, self.cache, localname)
+            if not ok:
+                self._record(server, localname, 'failed', detail, started)
+                return
+            for reloaded, (loaded, reloaddetail, seconds) in server.pluginreloadflush(self.connection).items():
+                if loaded is False:
+                    ok, detail = False, "; ".join((detail, reloaddetail))
+                elif loaded:
+                    detail = "; ".join((detail, _("loaded after {:.1f}s").format(seconds)))
+                else:
+                    detail = "; ".join((detail, reloaddetail))
+        except Exception as e:
+            self.logger.debug("rollback of %s on %s failed: %s", localname, server.identifier, e)
+            ok, detail = False, str(e)
+        self._record(server, localname, 'rolledback' if ok else 'failed', detail, started)
+
+    def summary(self):
+        rows = sorted(self.results, key=lambda r: (r['server'], r['plugin']))
+        header = (_('Server ID'), _('Name'), _('Plugin'), _('Status'), _('Time'), _('Detail'))
+        table = [header] + [(r['server'], str(r['name']), r['plugin'], r['status'], "{:.1f}s".format(r['seconds']), r['detail']) for r in rows]
+        widths = [max(len(row[i]) for row in table) for i in range(len(header) - 1)]
+        lines = []
+        for row in table:
+            lines.append("  ".join(col.ljust(widths[i]) for i, col in enumerate(row[:-1])) + "  " + row[-1])
+        counts = {}
+        for r in rows:
+            counts[r['status']] = counts.get(r['status'], 0) + 1
+        if self.mode == 'outdated':
+            lines.append(_("{} outdated, {} current, {} unknown, {} failed in {:.1f}s.").format(counts.get('outdated', 0), counts.get('current', 0), counts.get('unknown', 0), counts.get('failed', 0), self.elapsed))
+        elif self.mode == 'rollback':
+            lines.append(_("{} rolled back, {} failed in {:.1f}s.").format(counts.get('rolledback', 0), counts.get('failed', 0), self.elapsed))
+        elif self.mode == 'plan':
+            lines.append(_("Plan: {} downloads, {} uploads, {} renames, {} deletes, {} unchanged. Nothing was changed.").format(counts.get('download', 0), counts.get('upload', 0), counts.get('rename', 0), counts.get('delete', 0) + counts.get('forget', 0), counts.get('unchanged', 0)))
+        else:
+            lines.append(_("{} updated, {} removed, {} unchanged, {} skipped, {} failed in {:.1f}s.").format(counts.get('updated', 0), counts.get('removed', 0), counts.get('unchanged', 0), counts.get('skipped', 0), counts.get('failed', 0), self.elapsed))
+        return "\n".join(lines)
+
+    
+
+
+class rpDaemon:
+    # keeps one rpConnection, its server metadata and the plugin cache warm between update
+    # sweeps on a jittered schedule and jobs sent by --submit over a unix socket.
+    # sweeps and jobs run one at a time on the worker thread, in the order they arrive.
+    ops = ('update', 'install', 'remove', 'rollback', 'outdated', 'status')
+
+    def __init__(self, connection:rpConnection, cache:rpCache, config:rpConfig, socketpath:str, interval:float=3600, jitter:float=300):
+        self.connection = connection
+        self.cache = cache
+        self.config = config
+        self.socketpath = socketpath
+        self.interval = max(1, interval)
+        self.jitter = max(0, min(jitter, self.interval))
+        self.logger = logging.getLogger('rustplugins.daemon')
+        self.jobs = queue.Queue()
+        self.nextsweep = None
+        self.lastsweep = None
+        self._sweeping = threading.Event()
+        self._stop = threading.Event()
+        self._listener = None
+
+    def run(self):
+        self._listen()
+        worker = threading.Thread(target=self._work, name='rustplugins-worker', daemon=True)
+        worker.start()
+        # the first sweep lands somewhere inside the jitter window, so restarts of many daemons don't line up.
+        self.nextsweep = time.monotonic() + random.uniform(0, self.jitter)
+        self.logger.info(_("Daemon listening on {}, first sweep in {:.0f}s.").format(self.socketpath, self.nextsweep - time.monotonic()))
+        try:
+            while not self._stop.wait(max(0, self.nextsweep - time.monotonic())):
+                if not self._sweeping.is_set():
+                    self._sweeping.set()
+                    self.submit({'op':'update', 'sweep':True})
+                self.nextsweep = time.monotonic() + self.interval + random.uniform(-self.jitter, self.jitter)
+        finally:
+            self.jobs.put(None)
+            self._listener.shutdown()
+            self._listener.server_close()
+            if os.path.exists(self.socketpath):
+                os.remove(self.socketpath)
+            self.connection.close()
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def submit(self, request:dict) -> dict:
+        job = {'request':request, 'done':threading.Event(), 'reply':None}
+        self.jobs.put(job)
+        return job
+
+    def _listen(self):
+        if os.path.exists(self.socketpath):
+            try:
+                rpDaemon.request(self.socketpath, {'op':'status'})
+            except OSError:
+                os.remove(self.socketpath)
+            else:
+                raise RuntimeError(_("A daemon is already listening on {}.").format(self.socketpath))
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline())
+                    reply = daemon.handle(request)
+                except Exception as e:
+                    reply = {'ok':False, 'error':str(e)}
+                self.wfile.write((json.dumps(reply) + "\n").encode())
+
+        self._listener = socketserver.ThreadingUnixStreamServer(self.socketpath, Handler)
+        self._listener.daemon_threads = True
+        os.chmod(self.socketpath, 0o600)
+        threading.Thread(target=self._listener.serve_forever, name='rustplugins-socket', daemon=True).start()
+
+    def handle(self, request:dict) -> dict:
+        if request.get('op') not in rpDaemon.ops:
+            return {'ok':False, 'error':_("Unknown operation {}, expecting one of {}.").format(request.get('op'), ", ".join(rpDaemon.ops))}
+        if request['op'] == 'status':
+            return {'ok':True, 'queued':self.jobs.qsize(), 'nextsweep':max(0, self.nextsweep - time.monotonic()) if self.nextsweep else None, 'lastsweep':self.lastsweep}
+        if request['op'] in ('install', 'remove'):
+            # the names become remote paths, anything that could leave the plugin directory is turned away.
+            unsafe = [str(localname) for localname in request.get('plugins') or () if not rpDaemon.plainname(localname)]
+            if unsafe:
+                return {'ok':False, 'error':_("Plugin names can't contain path separators or '..': {}.").format(", ".join(unsafe))}
+        job = self.submit(request)
+        job['done'].wait()
+        return job['reply']
+
+    def plainname(localname) -> bool:
+        return isinstance(localname, str) and localname.strip() != '' and '..' not in localname and not any(sep in localname for sep in ('/', '\\', os.sep, os.altsep, '\0') if sep)
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            request = job['request']
+            started = time.monotonic()
+            try:
+                job['reply'] = dict(self._execute(request), ok=True)
+            except Exception as e:
+                self.logger.debug("daemon job %s failed: %s", request, e)
+                job['reply'] = {'ok':False, 'error':str(e)}
+            if request.get('sweep'):
+                self.lastsweep = {'finished':time.time(), 'seconds':time.monotonic() - started, 'ok':job['reply']['ok']}
+                self._sweeping.clear()
+                self.logger.info(job['reply'].get('summary') or job['reply'].get('error'))
+            try:
+                tracer.flush()
+            except OSError as e:
+                self.logger.info(_("Could not export trace to {}: {}").format(tracer.path, e))
+            job['done'].set()
+
+    def _managed(self, identifier:str) -> rpServer:
+        server = self.config.server_getmanaged(identifier)
+        if not server:
+            raise LookupError(_("Server {} is not managed.").format(identifier))
+        return server
+
+    def _execute(self, request:dict) -> dict:
+        op = request['op']
+        # origins are validated again for every job, the connection and cache stay warm.
+        self.cache.refresh()
+        if op == 'outdated':
+            servers = [self._managed(request['server'])] if request.get('server') else self.config.servers()
+            rollout = rpRollout(self.connection, self.cache, servers, settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency)
+            rollout.outdated()
+            for server in servers:
+                self.config.server_save(server)
+            return {'results':rollout.results, 'summary':rollout.summary()}
+        if op == 'rollback':
+            servers = [self._managed(request['server'])] if request.get('server') else self.config.servers()
+            rollout = rpRollout(self.connection, self.cache, servers, settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency)
+            rollout.rollback(request['plugins'][0])
+            for server in servers:
+                self.config.server_save(server, request['plugins'])
+            return {'results':rollout.results, 'summary':rollout.summary()}
+        dryrun = bool(request.get('dryrun'))
+        if op == 'update':
+            servers = [self._managed(request['server'])] if request.get('server') else self.config.servers()
+            return self._rollout(servers, request.get('plugins'), dryrun=dryrun)
+        server = self._managed(request['server'])
+        if op == 'install':
+            ox = self.config.get('remoteoxideplugins')
+            for localname, origin in request['plugins'].items():
+                server.pluginadd(origin, localname, "{}/{}".format(ox, localname))
+            return self._rollout([server], list(request['plugins']), dryrun=dryrun)
+        # remove
+        return self._rollout([server], [], request['plugins'], dryrun)
+
+    def _rollout(self, servers:list, localnames:list=None, removals:list=None, dryrun:bool=False) -> dict:
+        rollout = rpRollout(self.connection, self.cache, servers, settings.rolloutpanelconcurrency, settings.rolloutserverconcurrency, localnames, removals, dryrun)
+        rollout.run()
+        if not dryrun:
+            for server in servers:
+                self.config.server_save(server, None if removals else localnames)
+        return {'results':rollout.results, 'summary':rollout.summary()}
+
+    def request(socketpath:str, request:dict) -> dict:
+        # the --submit side, one json line each way over the daemon's socket.
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socketpath)
+            sock.sendall((json.dumps(request) + "\n").encode())
+            with sock.makefile('rb') as reply:
+                line = reply.readline()
+        if not line:
+            raise ConnectionError(_("Daemon on {} closed the connection without replying.").format(socketpath))
+        return json.loads(line)
@@ -0,0 +1,928 @@
+from __future__ import annotations
+
+from . import settings
+import logging
+import os
+import io
+import uuid
+import hashlib
+import tempfile
+from .util import _, requests, rpReloadBatch, rpUtil, tarfile, tqdm, websocket
+from .trace import tracer
+from .connection import rpConnection, rpConsole
+from .cache import rpCache
+
+class rpMultipartBody:
+    # multipart/form-data body read from disk on demand, requests sends it with
+    # a Content-Length and never holds more than one chunk in memory.
+
+    def __init__(self, parts:list, callback=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={}'.format(self.boundary)
+        self._callback = callback
+        self._segments = []
+        self._length = 0
+        for field, filename, path in parts:
+            head = '--{}\r\nContent-Disposition: form-data; name="{}"; filename="{}"\r\nContent-Type: application/octet-stream\r\n\r\n'.format(self.boundary, field, filename.replace('"', '%22')).encode()
+            self._segments.append((io.BytesIO(head), False))
+            self._segments.append((path, True))
+            self._segments.append((io.BytesIO(b'\r\n'), False))
+            self._length += len(head) + os.path.getsize(path) + 2
+        tail = '--{}--\r\n'.format(self.boundary).encode()
+        self._segments.append((io.BytesIO(tail), False))
+        self._length += len(tail)
+        self._current = None
+
+    def __len__(self):
+        return self._length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, size:int=-1) -> bytes:
+        chunks = []
+        wanted = size if size is not None and size >= 0 else None
+        while self._segments or self._current:
+            if self._current is None:
+                segment, isfile = self._segments.pop(0)
+                self._current = (open(segment, 'rb') if isfile else segment, isfile)
+            data = self._current[0].read(-1 if wanted is None else wanted)
+            if not data:
+                self._current[0].close()
+                self._current = None
+                continue
+            if self._current[1] and self._callback:
+                self._callback(len(data))
+            chunks.append(data)
+            if wanted is not None:
+                wanted -= len(data)
+                if wanted <= 0:
+                    break
+        return b''.join(chunks)
+
+    def close(self):
+        if self._current:
+            self._current[0].close()
+            self._current = None
+        self._segments = []
+
+
+class rpServer:
+    
+    def __init__(self, identifier:str):
+
+        self.identifier = identifier
+        self.uuid = None
+        self.name = None
+        self.state = None
+        self.pluginlist = None
+        self.logger = logging.getLogger('rustplugins.server')
+        self.pbar = None
+        self.pbarfile=None
+        self.ftpuser = None        
+        
+    
+    def fetch(self, connection:rpConnection):
+        
+        with tracer.span('fetch', self.identifier):
+            server = connection.server_metadata(self.identifier)
+            self.uuid = server['uuid']
+            self.name = server['name']
+            _util = connection.server_utilization(self.identifier)
+            self.state = _util['current_state']
+    #region rp specific
+       
+
+
+    def console_command(self, connection:rpConnection, command:str):
+        return connection.panel_request('POST', 'servers/{}/command'.format(self.identifier), json={'command': command})
+    
+    def file_upload(self, connection:rpConnection, file:str, remotedir:str='/', uploadname:str=None, progress:bool=True) -> requests.Response:        
+        return self.files_upload(connection, [(file, uploadname or os.path.split(file)[1])], remotedir, progress)
+
+    def files_upload(self, connection:rpConnection, files:list, remotedir:str='/', progress:bool=True) -> requests.Response:
+        # files is a list of (localpath, uploadname). the signed wings url takes the
+        # destination directory, so all of them land in place in one streamed request.
+        with tracer.span('upload', self.identifier, files=len(files)) as span:
+            signeduriresp = connection.panel_request('GET', 'servers/{}/files/upload'.format(self.identifier))
+            signeduriresp.raise_for_status()
+            posturi = rpUtil.url_with_params(signeduriresp.json()['attributes']['url'], {'directory': '/{}'.format(remotedir.strip('/'))})
+            desc = files[0][1] if len(files) == 1 else _("{} files").format(len(files))
+
+            progress_bar = tqdm.tqdm(total=sum(os.path.getsize(path) for path, name in files), unit='B', unit_scale=True, desc=desc, leave=False) if progress else None
+            with rpMultipartBody([('files', name, path) for path, name in files], progress_bar.update if progress_bar else None) as body:
+                span.bytes = len(body)
+                r = connection.node_request('POST', posturi, data=body, headers={'Content-Type': body.content_type})
+            if progress_bar:
+                progress_bar.close()
+        connection.listings.invalidate(self._listingkey(remotedir))
+                        
+        if not r.ok:
+            self._logfailure(self.files_upload, r)
+    
+
+        return r
+
+
+    def file_rename(self, connection:rpConnection, source:str, dest:str) -> requests.Response:
+        return self.files_rename(connection, [(source, dest)])
+
+    def files_rename(self, connection:rpConnection, renames:list, root:str='/') -> requests.Response:
+        uri = 'servers/{}/files/rename'.format(self.identifier)
+        payload = {
+            'root': root,
+            'files': [
+                {
+                    'from': source,
+                    'to': dest,
+                } for source, dest in renames
+            ],
+        }
+    
+        with tracer.span('rename', self.identifier, files=len(renames)):
+            r = connection.panel_request('PUT', uri, json=payload)
+        for source, dest in renames:
+            for path in (source, dest):
+                connection.listings.invalidate(self._listingkey(os.path.join(root, os.path.split(path)[0])))
+
+        if not r.ok:
+            self._logfailure(self.files_rename, r)
+      
+
+        return r
+    
+    def file_delete(self, connection:rpConnection, remotefile:str) -> requests.Response:
+        return self.files_delete(connection, [remotefile])
+
+    def files_delete(self, connection:rpConnection, remotefiles:list, root:str='/') -> requests.Response:
+        uri = 'servers/{}/files/delete'.format(self.identifier)
+        payload = {
+            'root': root,
+            'files': list(remotefiles),
+        }
+
+        with tracer.span('delete', self.identifier, files=len(remotefiles)):
+            r = connection.panel_request('POST', uri, json=payload)
+        for remotefile in remotefiles:
+            connection.listings.invalidate(self._listingkey(os.path.join(root, os.path.split(remotefile)[0])))
+
+        if not r.ok:
+            self._logfailure(self.files_delete, r)
+
+        return r
+
+    def files_decompress(self, connection:rpConnection, remotefile:str, root:str='/') -> requests.Response:
+        uri = 'servers/{}/files/decompress'.format(self.identifier)
+        payload = {
+            'root': root,
+            'file': remotefile,
+        }
+
+        with tracer.span('decompress', self.identifier, file=remotefile):
+            r = connection.panel_request('POST', uri, json=payload)
+        connection.listings.invalidate(self._listingkey(root))
+
+        if not r.ok:
+            self._logfailure(self.files_decompress, r)
+
+        return r
+
+    def files_upload_archive(self, connection:rpConnection, files:list, progress:bool=True) -> requests.Response:
+        # files is a list of (localpath, remotepath). they are packed into one tar.gz, uploaded
+        # to the server root, unpacked there by wings and the archive deleted again, so any
+        # number of files in any number of directories costs four requests. the response is
+        # the first one that failed, or the decompress response.
+        fd, archive = tempfile.mkstemp(prefix='rustplugins-', suffix='.tar.gz')
+        remotearchive = '.{}'.format(os.path.split(archive)[1])
+        try:
+            with tracer.span('archive', self.identifier, files=len(files)) as span:
+                with os.fdopen(fd, 'wb') as file, tarfile.open(fileobj=file, mode='w:gz', compresslevel=settings.archivecompresslevel) as tar:
+                    for localpath, remotepath in files:
+                        tar.add(localpath, arcname=remotepath.strip('/'), filter=rpUtil.tar_normalize)
+                span.bytes = os.path.getsize(archive)
+            r = self.files_upload(connection, [(archive, remotearchive)], '/', progress)
+            if not r.ok:
+                return r
+            try:
+                r = self.files_decompress(connection, remotearchive)
+            finally:
+                self.files_delete(connection, [remotearchive])
+                for localpath, remotepath in files:
+                    connection.listings.invalidate(self._listingkey(os.path.split(remotepath)[0]))
+            return r
+        finally:
+            os.remove(archive)
+
+    def archivesaves(remotepaths:list) -> bool:
+        # an archive costs four requests, plain uploads two per destination directory, so it
+        # only pays off for a large set spread over more than two directories.
+        return bool(settings.archiveminfiles) and len(remotepaths) >= settings.archiveminfiles and len({os.path.split(remotepath)[0] for remotepath in remotepaths}) > 2
+
+    def _logfailure(self, caller, r:requests.Response):
+        # failed calls are summarized rather than dumped, bodies are cut to logbodybytes and
+        # the bearer and signed url tokens never reach the log.
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(_("Error in %s: %s %s -> %s\nReq Headers: %s\nReq Body: %s\nResp Text: %s"), caller.__qualname__, r.request.method, rpUtil.redact(r.request.url), r.status_code, rpUtil.redact_headers(r.request.headers), rpUtil.log_body(r.request.body), rpUtil.log_body(r.content))
+
+    def files_result(self, response:requests.Response, names:list) -> dict:
+        # the batch endpoints succeed or fail as a whole, report that per file.
+        if response.ok:
+            return {name: None for name in names}
+        try:
+            detail = "; ".join(e.get('detail', '') for e in response.json().get('errors', []))
+        except ValueError:
+            detail = response.text
+        return {name: detail or str(response.status_code) for name in names}
+
+
+    def file_details(self, connection:rpConnection, remotepath:str) -> requests.Response:
+        uri = 'servers/{}/files/list'.format(self.identifier)
+        
+        params = {'directory': remotepath}
+        self.logger.debug("params: %s", params)
+        r = connection.panel_request('GET', uri, params=params)        
+
+        if not r.ok:
+            self._logfailure(self.file_details, r)
+      
+
+        return r
+    
+        
+    def _listingkey(self, remotepath:str):
+        return (self.identifier, remotepath.strip('/'))
+
+    def file_listing(self, connection:rpConnection, remotepath:str, refresh:bool=False):
+        # name -> attributes for remotepath, served from the connection's listing cache.
+        # concurrent callers for the same directory share one request.
+        key = self._listingkey(remotepath)
+        with connection.listinglock(key):
+            if not refresh:
+                listing = connection.listings.get(key)
+                if listing is not None:
+                    return listing
+            with tracer.span('listing', self.identifier, directory=remotepath) as span:
+                listresp = self.file_details(connection, remotepath)
+                span.bytes = len(listresp.content)
+            if not listresp.ok:
+                return None
+            return connection.listings.put(key, rpUtil.file_listing(listresp.json()))
+
+    def file_detail(self, connection:rpConnection, remotefile:str):
+        fpath,fname = os.path.split(remotefile)
+        listing = self.file_listing(connection, fpath)
+        if listing and fname in listing:
+            self.logger.debug(_("Found Item %s"), listing[fname])
+            return listing[fname]
+        return None
+
+    def files_exist(self, connection:rpConnection, remotefiles:list) -> dict:
+        # one listing per distinct directory, however many files are asked about.
+        found = {}
+        for remotefile in remotefiles:
+            fpath,fname = os.path.split(remotefile)
+            listing = self.file_listing(connection, fpath)
+            found[remotefile] = listing.get(fname) if listing else None
+        return found
+
+    def file_contents(self, connection:rpConnection, remotefile:str) -> requests.Response:
+        uri = 'servers/{}/files/contents'.format(self.identifier)
+        params = {'file': remotefile}
+        r = connection.panel_request('GET', uri, params=params, stream=True)
+
+        if not r.ok:
+            self._logfailure(self.file_contents, r)
+
+        return r
+
+    #region - disabled sftp functionality
+
+    # def sftp_set_auth(self,user:str):
+    #     self.ftpuser = user
+    # def sftp_auth_exists(self):
+    #     if self.ftpuser:
+    #         return self.ftpuser
+    #     else:
+    #         return False
+        
+
+    # def sftp_check_auth(self,content:str, connection:rpConnection, password:str):
+    #     fn = Path(self._sftp_writetestfile(content))
+    #     return self.sftp_upload_file(self.ftpuser,password, fn, fn.name, connection)
+
+    # def sftp_get_details(self, connection:rpConnection):
+    #     details = connection.get_client().client.get_server(self.identifier)['sftp_details']
+    #     return [details['ip'],details['port']]
+    
+    
+    
+    # def sftp_upload_file(self, username:str, password:str, file:Path, remotepath:str, connection:rpConnection):
+    #     self._sftp_processupload(str(file.absolute()))
+    #     s = os.path.getsize(str(file.absolute()))
+    #     a = self.sftp_get_details(connection)[0]
+    #     p = self.sftp_get_details(connection)[1]
+    #     t = paramiko.Transport((a,p))
+    #     try:
+    #         t.connect(username=username,password=password)
+    #         sftp = paramiko.SFTPClient.from_transport(t)
+    #     except Exception as e:
+    #         self.pbar=None
+    #         t.close()
+    #         self.logger.error(e)
+    #         return
+                            
+    #     self.pbarfile = file.name
+    #     try:                    
+    #         r = sftp.put(str(file.absolute()),"{}/{}".format(remotepath,file.name),self._sftp_progress, True)
+    #         sftp.chmod("{}/{}".format(remotepath,file.name), 644)
+    #         sftp.chown("{}/{}".format(remotepath,file.name), 0,0)            
+    #     except Exception as e:
+    #         self.pbar=None
+    #         t.close()
+    #         self.logger.error(e)
+    #         return
+    #     else:
+    #         if self.pbar.last_print_n < s:
+    #             print(self.pbar.last_print_n)
+    #             self._sftp_progress(r.st_size, r.st_size)
+    #             self.pbar.close()
+    #         t.close()
+    #         self.pbar=None
+    #         return  #r.st_size
+
+    # def _sftp_progress(caller,transferred, total):
+    #     if(caller.pbar):
+    #         caller.pbar.n = int(transferred/1000)
+    #         caller.pbar.update()
+    #     else:
+    #         caller.pbar = tqdm(range(int(total/1000)),'Uploading {}'.format(caller.pbarfile),unit='kb', position=0, leave=True,miniters=1)
+    #         caller.pbar.n = int(transferred/1000)
+    #         caller.pbar.update()
+
+    # def _sftp_processupload(self, path:str):     
+    #     with open(path, 'rb') as open_file:
+    #      content = open_file.read()
+        
+    #     content = content.replace(b'\r\n', b'\n')
+    #     content = content.replace(b'\r', b'\n')
+
+    #     with open(path, 'wb') as open_file:
+    #         open_file.write(content)
+
+    # def _sftp_writetestfile(caller, content:str):
+    #     fd,path = tempfile.mkstemp()
+    #     with os.fdopen(fd,'w') as f:
+    #         f.write(content)
+    #         f.close             
+    #     return path
+    #endregion
+    
+    def pluginreload(self, connection:rpConnection, pluginfilename:str):
+        self.logger.debug("plugin file %s", pluginfilename)
+        reloadname = os.path.splitext(pluginfilename)[0]        
+        self.logger.info(_("Attenpting automatic reload of plugin {}...".format(reloadname)))
+        cmdresp = self.console_command(connection,"oxide.reload {}".format(reloadname))
+        if(cmdresp.ok):
+            self.logger.info(_("Umod plugin {} successfully locded on server.".format(pluginfilename)))
+        else:
+            self.logger.info(_("Umod plugin {} successfully loaded on server you may need to issue, but you will need to issue oxide.reload {} as we weren't able to.".format(pluginfilename,reloadname)))
+
+    def pluginreloadflush(self, connection:rpConnection) -> dict:
+        # sends every queued reload as one oxide.reload command and, when the console
+        # websocket is reachable, waits for each plugin's loaded/compile error line.
+        # results are localname -> (ok, detail, seconds), ok is None when unconfirmed.
+        localnames = connection.take_reloads(self.identifier)
+        if not localnames:
+            return {}
+        with tracer.span('reload', self.identifier, plugins=len(localnames)):
+            batch = rpReloadBatch(localnames)
+            self.logger.info(_("Reloading {} plugins on {}...").format(len(batch.pending), self.identifier))
+            console = None
+            if websocket.available():
+                try:
+                    console = rpConsole(connection, self.identifier)
+                    console.open()
+                except Exception as e:
+                    self.logger.debug("console websocket for %s unavailable: %s", self.identifier, e)
+                    console = None
+            if console is None:
+                return batch.sent(self.console_command(connection, batch.command).ok)
+            try:
+                console.send_command(batch.command)
+                for line in console.lines(batch.deadline):
+                    if batch.line(line):
+                        break
+            except Exception as e:
+                self.logger.debug("console websocket for %s failed: %s", self.identifier, e)
+            finally:
+                console.close()
+            return batch.finish()
+
+    def pluginidentical(self, connection:rpConnection, localname:str) -> bool:
+        # size from the listing is the cheap filter, remote content is only hashed
+        # when sizes match and the listing changed since we last saw it.
+        if not self.pluginlist or localname not in self.pluginlist:
+            return False
+        plugin = self.pluginlist[localname]
+        localpath = plugin.get('local')
+        if not plugin['cached'] or not localpath or not os.path.isfile(localpath):
+            return False
+        details = self.file_detail(connection, plugin['remote'])
+        if not details or details['size'] != os.path.getsize(localpath):
+            return False
+        localhash = plugin.get('hash') or rpUtil.file_sha256(localpath)
+        remotestate = self._remotestate(plugin, details)
+        if remotestate.get('hash'):
+            return remotestate['hash'] == localhash
+        with tracer.span('contents', self.identifier, file=plugin['remote']) as span:
+            contentresp = self.file_contents(connection, plugin['remote'])
+            if not contentresp.ok:
+                contentresp.close()
+                return False
+            sha = hashlib.sha256()
+            head = b''
+            for data in contentresp.iter_content(64 * 1024):
+                sha.update(data)
+                span.bytes += len(data)
+                if len(head) < settings.infoheadbytes:
+                    head += data
+        plugin['remotestate'] = {'hash':sha.hexdigest(), 'size':details['size'], 'modified_at':details['modified_at'], 'info':rpUtil.plugin_info(head[:settings.infoheadbytes])}
+        return plugin['remotestate']['hash'] == localhash
+
+    def remoteinfo(self, connection:rpConnection, localname:str) -> dict:
+        # [Info] of the copy on the server, None when there is none. it is kept in remotestate
+        # against the listing's size and modified_at, so only a changed file is read again,
+        # and then only its head.
+        plugin = self.pluginlist[localname]
+        details = self.file_detail(connection, plugin['remote'])
+        if not details:
+            return None
+        remotestate = self._remotestate(plugin, details)
+        if remotestate.get('info') is not None:
+            return remotestate['info']
+        contentresp = self.file_contents(connection, plugin['remote'])
+        if not contentresp.ok:
+            contentresp.close()
+            return {}
+        info = rpUtil.plugin_info(rpUtil.read_head(contentresp, settings.infoheadbytes))
+        plugin['remotestate'] = dict(remotestate, size=details['size'], modified_at=details['modified_at'], info=info)
+        return info
+
+    def _remotestate(self, plugin:dict, details:dict) -> dict:
+        # what we last knew of the remote copy, or {} when the listing shows it changed since.
+        # right after our own upload modified_at is unknown, the first listing of the same size fills it in.
+        remotestate = plugin.get('remotestate') or {}
+        if remotestate.get('size') != details['size'] or remotestate.get('modified_at') not in (None, details['modified_at']):
+            return {}
+        remotestate['modified_at'] = details['modified_at']
+        return remotestate
+
+    def pluginexistsremote(self, connection:rpConnection, remotepath:str) -> bool:
+        if remotepath:
+            res = self.file_detail(connection,remotepath)
+            if res:
+                return True
+            else:
+                return False
+        else:
+            return False
+
+    def pluginadd(self, origin:str, localname:str, remotepath:str):
+        localname = os.path.split(localname)[1]
+        if self.pluginlist:
+            # installing again releases a rollback hold but keeps the copy moved aside on the server.
+            previous = self.pluginlist[localname].get('previous') if self.pluginlist.get(localname, {}).get('remote') == remotepath else None
+            self.pluginlist[localname] = {'origin':origin,'local':None, 'hash':None, 'remote':remotepath, 'cached':False, 'previous':previous}
+            return localname
+        else:
+            self.pluginlist = {localname: {'origin':origin,'local':None, 'hash':None, 'remote':remotepath, 'cached':False}}
+            return localname
+    
+    def pluginremove(self, connection:rpConnection, localname:str, deleteremote:bool) -> requests.Response:
+        # the plugin stays maintained when its remote file could not be deleted.
+        r = None
+        if self.pluginlist:
+            if localname in self.pluginlist:
+                if deleteremote:
+                    r = self.file_delete(connection, self.pluginlist[localname]['remote'])
+                    if not r.ok:
+                        return r
+                self.pluginlist.pop(localname)
+        return r
+
+
+    def plan(self, connection:rpConnection, cache:'rpCache', localnames:list=None, removals:list=(), refresh:list=()) -> 'rpPlan':
+        # diffs localnames (default all maintained plugins) against one listing per plugin
+        # directory and the cache. removals are dropped, refresh is fetched from its origin again.
+        plan = rpPlan(self)
+        pluginlist = self.pluginlist or {}
+        removals = [localname for localname in removals if localname in pluginlist]
+        desired = [localname for localname in (pluginlist if localnames is None else localnames) if localname in pluginlist and localname not in removals]
+        listings = {}
+        def present(remotefile:str):
+            fpath,fname = os.path.split(remotefile)
+            if fpath not in listings:
+                listings[fpath] = self.file_listing(connection, fpath) or {}
+            return listings[fpath].get(fname)
+        def backup(localname:str, details:dict):
+            # the copy about to be overwritten is moved aside first, see pluginbackup.
+            if settings.backupsuffix:
+                remote = pluginlist[localname]['remote']
+                plan.backups.append((localname, remote, remote + settings.backupsuffix, bool(present(remote + settings.backupsuffix)), dict(self._remotestate(pluginlist[localname], details))))
+        desiredpaths = {pluginlist[localname]['remote'] for localname in desired}
+        # a removed plugin whose file already holds what an added one needs is renamed
+        # instead of being deleted and uploaded again.
+        spare = {}
+        for localname in removals:
+            plugin = pluginlist[localname]
+            details = present(plugin['remote'])
+            if plugin['remote'] in desiredpaths or not details:
+                plan.forgets.append(localname)
+                plan.reasons[localname] = _("nothing to delete")
+                continue
+            remotehash = self._remotestate(plugin, details).get('hash')
+            spare.setdefault(remotehash, []).append(localname)
+        for localname in desired:
+            plugin = pluginlist[localname]
+            if localname in refresh or not plugin.get('hash') or not plugin.get('cached') or not cache.get(plugin['hash']):
+                plan.downloads.append(localname)
+            details = present(plugin['remote'])
+            if not details:
+                donors = spare.get(plugin.get('hash')) if localname not in plan.downloads and plugin.get('hash') else None
+                if donors:
+                    donor = donors.pop(0)
+                    plan.renames.append((localname, donor, pluginlist[donor]['remote'], plugin['remote']))
+                    plan.reasons[localname] = _("same content as {}").format(donor)
+                else:
+                    plan.uploads.append(localname)
+                    plan.reasons[localname] = _("missing on server")
+            elif localname in plan.downloads:
+                plan.uploads.append(localname)
+                plan.reasons[localname] = _("newer at origin") if localname in refresh else _("not cached")
+                backup(localname, details)
+            elif self.pluginidentical(connection, localname):
+                plan.unchanged.append(localname)
+            else:
+                plan.uploads.append(localname)
+                plan.reasons[localname] = _("differs from cache")
+                backup(localname, details)
+        for donors in spare.values():
+            for localname in donors:
+                plan.deletes.append((localname, pluginlist[localname]['remote']))
+        for localname in plan.uploads:
+            plan.seeds.extend((localname, localpath, remotepath) for localpath, remotepath in rpServer.seedfiles(pluginlist[localname]['remote']) if not present(remotepath))
+        return plan
+
+    def seedfiles(remote:str) -> list:
+        # (localpath, remotepath) of the config and data files seeddirname holds for the plugin
+        # at remote, placed under the oxide directory the plugin directory sits in.
+        if not settings.seeddirname:
+            return []
+        oxide = os.path.dirname(os.path.dirname(remote))
+        stem = os.path.splitext(os.path.basename(remote))[0]
+        files = []
+        for kind in ('config', 'data'):
+            base = os.path.join(settings.seeddirname, kind)
+            if os.path.isfile(os.path.join(base, stem + '.json')):
+                files.append(os.path.join(base, stem + '.json'))
+            for dirpath, dirnames, filenames in os.walk(os.path.join(base, stem)):
+                files.extend(os.path.join(dirpath, filename) for filename in sorted(filenames))
+        return [(localpath, "/".join(p for p in (oxide, os.path.relpath(localpath, settings.seeddirname).replace(os.sep, '/')) if p)) for localpath in files]
+
+    def apply(self, connection:rpConnection, cache:'rpCache', plan:'rpPlan', progress:bool=True, reload:bool=True) -> dict:
+        # each kind of operation goes in one batch: downloads, renames, deletes, uploads and
+        # finally one reload. results are localname -> (status, detail). with reload=False
+        # the reloads stay queued and the caller passes the results through reloaded.
+        results = {localname: ('unchanged', '') for localname in plan.unchanged}
+        uploads = list(plan.uploads)
+        if plan.downloads:
+            for localname, (ok, errors) in self.plugindownloadmany(cache, plan.downloads, progress).items():
+                if not ok:
+                    results[localname] = ('failed', "; ".join(errors))
+                elif not rpUtil.file_isnt_zero(self.pluginlist[localname]['local']):
+                    results[localname] = ('failed', _("Downloaded file is empty."))
+                elif localname in uploads and self.file_detail(connection, self.pluginlist[localname]['remote']) and self.pluginidentical(connection, localname):
+                    results[localname] = ('unchanged', '')
+            uploads = [localname for localname in uploads if localname not in results]
+        if plan.renames:
+            r = self.files_rename(connection, [(source, dest) for localname, donor, source, dest in plan.renames])
+            failures = self.files_result(r, [localname for localname, donor, source, dest in plan.renames])
+            for localname, donor, source, dest in plan.renames:
+                if failures[localname]:
+                    results[localname] = ('failed', _("Rename from {} failed with {}").format(source, failures[localname]))
+                    continue
+                self.pluginlist[localname]['remotestate'] = self.pluginlist[donor].get('remotestate')
+                self.pluginlist.pop(donor)
+                connection.queue_reload(self.identifier, localname)
+                results[donor] = ('removed', _("renamed to {}").format(localname))
+                results[localname] = ('updated', _("renamed from {}").format(donor))
+        if plan.deletes:
+            r = self.files_delete(connection, [remote for localname, remote in plan.deletes])
+            failures = self.files_result(r, [localname for localname, remote in plan.deletes])
+            for localname, remote in plan.deletes:
+                if failures[localname]:
+                    results[localname] = ('failed', _("Delete failed with {}").format(failures[localname]))
+                else:
+                    self.pluginlist.pop(localname)
+                    results[localname] = ('removed', '')
+        for localname in plan.forgets:
+            self.pluginlist.pop(localname)
+            results[localname] = ('removed', plan.reasons.get(localname, ''))
+        backups = [backup for backup in plan.backups if backup[0] in uploads]
+        if backups:
+            backups = self.pluginbackup(connection, backups)
+        if uploads:
+            uploaded = {}
+            try:
+                uploaded = self.pluginuploadmany(connection, uploads, True, progress, False, [seed for seed in plan.seeds if seed[0] in uploads])
+            finally:
+                # a plugin whose upload failed is left without a live file, its copy goes back.
+                self.pluginbackuprestore(connection, [backup for backup in backups if not uploaded.get(backup[0], (False, []))[0]])
+            for localname, (ok, errors) in uploaded.items():
+                results[localname] = ('updated', '') if ok else ('failed', "; ".join(e.strip() for e in errors))
+        return self.reloaded(connection, results) if reload else results
+
+    def reloaded(self, connection:rpConnection, results:dict) -> dict:
+        # flushes the queued reloads and adds their confirmation to apply's results.
+        for localname, (ok, detail, seconds) in self.pluginreloadflush(connection).items():
+            status, previous = results.get(localname, ('updated', ''))
+            if ok is False:
+                results[localname] = ('failed', detail)
+            elif ok:
+                results[localname] = (status, "; ".join(d for d in (previous, _("loaded after {:.1f}s").format(seconds)) if d))
+            else:
+                results[localname] = (status, "; ".join(d for d in (previous, detail) if d))
+        return results
+
+    def pluginbackup(self, connection:rpConnection, backups:list) -> list:
+        # moves the remote copies about to be overwritten aside with one rename, backups from
+        # the previous update in the way are deleted first. when that fails the uploads still
+        # go ahead, only --rollback has to fall back to the cache. returns the backups moved.
+        stale = [backuppath for localname, remote, backuppath, exists, remotestate in backups if exists]
+        if stale:
+            self.files_delete(connection, stale)
+        r = self.files_rename(connection, [(remote, backuppath) for localname, remote, backuppath, exists, remotestate in backups])
+        if not r.ok:
+            self.logger.info(_("Could not move the current copies of {} aside on {}, rolling back will upload from the cache.").format(", ".join(backup[0] for backup in backups), self.identifier))
+            for localname, remote, backuppath, exists, remotestate in backups:
+                self.pluginlist[localname]['previous'] = None
+            # the renames that went through before the failure are still moved aside.
+            found = self.files_exist(connection, [backup[2] for backup in backups])
+            return [backup for backup in backups if found.get(backup[2])]
+        for localname, remote, backuppath, exists, remotestate in backups:
+            self.pluginlist[localname]['previous'] = {'remote':backuppath, 'hash':remotestate.get('hash'), 'remotestate':remotestate or None}
+        return backups
+
+    def pluginbackuprestore(self, connection:rpConnection, backups:list):
+        # moves copies pluginbackup set aside back to their live path. a failed upload can leave
+        # a partial file there, it is deleted first.
+        if not backups:
+            return
+        self.files_delete(connection, [remote for localname, remote, backuppath, exists, remotestate in backups])
+        r = self.files_rename(connection, [(backuppath, remote) for localname, remote, backuppath, exists, remotestate in backups])
+        if not r.ok:
+            self.logger.error(_("Could not move the previous copies of {} back on {}: {}").format(", ".join(backup[0] for backup in backups), self.identifier, r.text.strip()))
+        for localname, remote, backuppath, exists, remotestate in backups:
+            self.pluginlist[localname]['previous'] = None
+
+    def pluginrollback(self, connection:rpConnection, cache:'rpCache', localname:str) -> tuple:
+        # puts the copy pluginbackup moved aside back in place by swapping it with the live file,
+        # so rolling back again returns to the newer version. wings refuses to rename onto an
+        # existing file and runs the renames of one request concurrently, so the swap takes up to
+        # three requests of one rename each, each checked before the next. without a copy on the
+        # server the version cached before the current one is uploaded. either way the plugin is
+        # held there, updates pass it by until it is installed again or updated individually.
+        # returns (ok, detail), the reload is queued on the connection.
+        plugin = self.pluginlist[localname]
+        previous = plugin.get('previous') or {}
+        remote = plugin['remote']
+        standard = remote + settings.backupsuffix if settings.backupsuffix else None
+        backuppath = previous.get('remote') or standard
+        swap = next(path for path in (remote + '.rollback', remote + '.rollback.1') if path != backuppath)
+        found = self.files_exist(connection, [path for path in (remote, backuppath, standard, swap) if path])
+        if backuppath and found.get(backuppath):
+            # the live copy goes straight to the usual backup path when that is free, as after a
+            # rollback whose last rename failed, otherwise it swaps places with the backup via swap.
+            keep = standard if standard and standard != backuppath and not found.get(standard) else backuppath
+            current = {'remote':keep, 'hash':plugin.get('hash'), 'remotestate':plugin.get('remotestate')} if found.get(remote) else None
+            moved = swap if keep == backuppath else keep
+            if current and moved == swap and found.get(swap):
+                # left behind by a rollback that failed half way.
+                self.files_delete(connection, [swap])
+            if current:
+                r = self.file_rename(connection, remote, moved)
+                if not r.ok:
+                    return False, _("Rename of {} failed with {}").format(remote, self.files_result(r, [localname])[localname])
+            r = self.file_rename(connection, backuppath, remote)
+            if not r.ok:
+                if current:
+                    self.file_rename(connection, moved, remote)
+                return False, _("Rename of {} failed with {}").format(backuppath, self.files_result(r, [localname])[localname])
+            self._restore(cache, localname, previous.get('hash'), previous.get('remotestate'))
+            plugin['previous'] = current
+            if current and moved != keep and not self.file_rename(connection, swap, keep).ok:
+                # the newer version stays where it was moved aside, the next rollback picks it up there.
+                current['remote'] = swap
+            detail = _("restored {}").format(backuppath)
+        else:
+            versions = cache.versions(plugin['origin'])
+            if plugin.get('hash') not in versions or versions.index(plugin['hash']) + 1 >= len(versions):
+                return False, _("No previous version of {} is kept on the server or in the cache.").format(localname)
+            restored = dict(plugin)
+            self.plugincached(cache, localname, versions[versions.index(plugin['hash']) + 1])
+            ok, errors = self.pluginuploadmany(connection, [localname], True, False, False)[localname]
+            if not ok:
+                self.pluginlist[localname] = restored
+                return False, "; ".join(e.strip() for e in errors)
+            detail = _("uploaded the version cached before it")
+        plugin['held'] = 1
+        connection.queue_reload(self.identifier, localname)
+        return True, detail
+
+    def _restore(self, cache:'rpCache', localname:str, digest:str, remotestate:dict):
+        # the plugin record after its previous copy is back in place, cached when the cache still has it.
+        plugin = self.pluginlist[localname]
+        if digest and cache.get(digest):
+            self.plugincached(cache, localname, digest)
+        else:
+            plugin['hash'], plugin['local'], plugin['cached'] = digest, None, False
+            plugin['info'] = (remotestate or {}).get('info')
+        plugin['remotestate'] = remotestate
+
+    def pluginupload(self, connection:rpConnection, localname:str, overwrite:bool, progress:bool=True):
+        return self.pluginuploadmany(connection, [localname], overwrite, progress)[localname]
+
+    def pluginuploadmany(self, connection:rpConnection, localnames:list, overwrite:bool, progress:bool=True, reload:bool=True, seeds:list=()) -> dict:
+        # one upload request per destination directory, results are (ok, errors) per plugin.
+        # reloads are queued on the connection, with reload=False the caller flushes them.
+        # seeds are (localname, localpath, remotepath) of config and data files going with
+        # the plugins, see rpPlan.seeds. they are uploaded beside plugins that uploaded.
+        results = {}
+        batches = {}
+        for localname in localnames:
+            errors = []
+            if self.pluginlist and localname in self.pluginlist:
+                if not self.pluginlist[localname]['cached'] == True:
+                    errors.append(_("Cannot upload a plugin which has not yet been cached."))
+                localpath = self.pluginlist[localname]['local']
+                remotepath = self.pluginlist[localname]['remote']
+                if not errors and (not localpath or not os.path.isfile(localpath)):
+                    errors.append(_("Cached copy of {} is missing, download it again.").format(localname))
+            else:
+                errors.append(_("{} is unknown and not maintained.").format(localname))
+            if errors:
+                results[localname] = (False, errors)
+            else:
+                batches.setdefault(os.path.split(remotepath)[0], []).append((localname, localpath, remotepath))
+
+        if not overwrite:
+            existing = self.files_exist(connection, [remotepath for batch in batches.values() for localname, localpath, remotepath in batch])
+            for remotedir in list(batches):
+                for entry in [e for e in batches[remotedir] if existing.get(e[2])]:
+                    results[entry[0]] = (False, [_("Plugin exists but overwrite is not true, skipping.")])
+                    batches[remotedir].remove(entry)
+
+        pending = [entry for batch in batches.values() for entry in batch]
+        seeds = [seed for seed in seeds if seed[0] in {localname for localname, localpath, remotepath in pending}]
+        if rpServer.archivesaves([remotepath for localname, localpath, remotepath in pending + seeds]):
+            # a large set goes as one archive, the per directory uploads below only run
+            # when wings could not unpack it.
+            archiveresp = self.files_upload_archive(connection, [(localpath, remotepath) for localname, localpath, remotepath in pending + seeds], progress)
+            if archiveresp.ok:
+                for localname, localpath, remotepath in pending:
+                    self.logger.info(_("Upload of {} success.").format(localname))
+                    self.pluginuploaded(localpath, localname)
+                    connection.queue_reload(self.identifier, localname)
+                    results[localname] = (True, [])
+                batches = {}
+                seeds = []
+            else:
+                self.logger.info(_("Archive upload to {} failed with {}, uploading files one directory at a time.").format(self.identifier, archiveresp.status_code))
+
+        for remotedir, batch in batches.items():
+            if not batch:
+                continue
+            uploadresp = self.files_upload(connection, [(localpath, os.path.split(remotepath)[1]) for localname, localpath, remotepath in batch], remotedir, progress)
+            failures = self.files_result(uploadresp, [localname for localname, localpath, remotepath in batch])
+            for localname, localpath, remotepath in batch:
+                if failures[localname]:
+                    results[localname] = (False, [_("File upload failed with {}\n".format(failures[localname]))])
+                else:
+                    self.logger.info(_("Upload of {} success.").format(localname))
+                    self.pluginuploaded(localpath, localname)
+                    connection.queue_reload(self.identifier, localname)
+                    results[localname] = (True, [])
+        seedbatches = {}
+        for localname, localpath, remotepath in seeds:
+            if results.get(localname, (False,))[0]:
+                seedbatches.setdefault(os.path.split(remotepath)[0], []).append((localname, localpath, remotepath))
+        for remotedir, batch in seedbatches.items():
+            # a plugin runs without its seed files, oxide writes it a default config.
+            uploadresp = self.files_upload(connection, [(localpath, os.path.split(remotepath)[1]) for localname, localpath, remotepath in batch], remotedir, progress)
+            if not uploadresp.ok:
+                self.logger.info(_("Upload of {} to {} failed with {}.").format(", ".join(sorted({localname for localname, localpath, remotepath in batch})), remotedir, uploadresp.status_code))
+        if reload:
+            for localname, (ok, detail, seconds) in self.pluginreloadflush(connection).items():
+                if ok is False:
+                    results[localname] = (False, [detail])
+        return results
+    
+    def pluginuploaded(self, localpath:str, localname:str):
+        # modified_at is unknown until the next listing, see _remotestate.
+        self.pluginlist[localname].pop('held', None)
+        self.pluginlist[localname]['remotestate'] = {'hash':self.pluginlist[localname].get('hash') or rpUtil.file_sha256(localpath), 'size':os.path.getsize(localpath), 'modified_at':None, 'info':self.pluginlist[localname].get('info')}
+
+    def plugindownload(self, cache:'rpCache', localname:str, progress:bool=True):
+        return self.plugindownloadmany(cache, [localname], progress)[localname]
+
+    def plugindownloadmany(self, cache:'rpCache', localnames:list, progress:bool=True) -> dict:
+        # results are (ok, errors) per plugin, distinct origins download in parallel.
+        results = {}
+        wanted = {}
+        for localname in localnames:
+            if self.pluginlist and localname in self.pluginlist:
+                wanted[localname] = self.pluginlist[localname]['origin']
+            else:   
+                self.logger.debug(_("%s is unknown and not maintained."), localname)
+                results[localname] = (False, [_("{} is unknown and not maintained.".format(localname))])
+        fetched = cache.fetchmany(list({origin: localname for localname, origin in wanted.items()}.items()), progress)
+        for localname, origin in wanted.items():
+            ok, errors, digest = fetched[origin]
+            if ok:
+                self.plugincached(cache, localname, digest)
+            results[localname] = (ok, errors)
+        return results
+
+    def plugincached(self, cache:'rpCache', localname:str, digest:str):
+        self.pluginlist[localname]['hash'] = digest
+        self.pluginlist[localname]['local'] = cache.objectpath(digest)
+        self.pluginlist[localname]['cached'] = True
+        self.pluginlist[localname]['info'] = cache.info(digest)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__,self.identifier)
+
+
+
+class rpPlan:
+    # what it takes to bring one server's plugins in line with its plugin list, see rpServer.plan.
+
+    def __init__(self, server:rpServer):
+        self.server = server
+        self.downloads = []
+        self.uploads = []
+        # (localname, removed localname, source, dest)
+        self.renames = []
+        # (localname, remote path)
+        self.deletes = []
+        # removed plugins with nothing left on the server to delete
+        self.forgets = []
+        # (localname, remote path, backup path, backup exists, remotestate of the copy moved aside)
+        self.backups = []
+        # (localname, local path, remote path) of config and data files the server lacks, see rpServer.seedfiles
+        self.seeds = []
+        self.unchanged = []
+        self.reasons = {}
+
+    def empty(self) -> bool:
+        return not (self.uploads or self.renames or self.deletes or self.forgets)
+
+    def skip(self, localname:str):
+        for ops in (self.downloads, self.uploads):
+            if localname in ops:
+                ops.remove(localname)
+        self.backups = [backup for backup in self.backups if backup[0] != localname]
+        self.seeds = [seed for seed in self.seeds if seed[0] != localname]
+
+    def operations(self) -> list:
+        # (localname, operation, detail) in the order apply runs them.
+        ops = []
+        for localname in self.downloads:
+            ops.append((localname, 'download', self.server.pluginlist[localname]['origin']))
+        for localname, donor, source, dest in self.renames:
+            ops.append((localname, 'rename', "{} -> {}".format(source, dest)))
+        for localname, remote in self.deletes:
+            ops.append((localname, 'delete', remote))
+        for localname in self.forgets:
+            ops.append((localname, 'forget', self.reasons.get(localname, '')))
+        for localname, remote, backuppath, exists, remotestate in self.backups:
+            ops.append((localname, 'backup', "{} -> {}".format(remote, backuppath)))
+        for localname in self.uploads:
+            ops.append((localname, 'upload', "{} ({})".format(self.server.pluginlist[localname]['remote'], self.reasons.get(localname, ''))))
+        for localname, localpath, remotepath in self.seeds:
+            ops.append((localname, 'seed', remotepath))
+        remotepaths = [self.server.pluginlist[localname]['remote'] for localname in self.uploads] + [remotepath for localname, localpath, remotepath in self.seeds]
+        if rpServer.archivesaves(remotepaths):
+            ops.append(('*', 'archive', _("{} uploads in one archive, unpacked by wings").format(len(remotepaths))))
+        reloads = self.uploads + [localname for localname, donor, source, dest in self.renames]
+        if reloads:
+            ops.append(('*', 'reload', "oxide.reload {}".format(" ".join(os.path.splitext(localname)[0] for localname in reloads))))
+        for localname in self.unchanged:
+            ops.append((localname, 'unchanged', ''))
+        return ops
+
+    def __repr__(self):
+        return "{}({}, {} operations)".format(self.__class__.__name__, self.server.identifier, len(self.operations()) - len(self.unchanged))
@@ -0,0 +1,97 @@
+# every setting the package reads and its default, the one place they are defined. they are
+# read as settings.<name> at the time of use so changes take effect. rustplugins.py applies the
+# overrides in config.py with override, code using the package directly can assign to them.
+
+def override(config):
+    # copies the settings a config module defines over these defaults, other names are ignored.
+    current = globals()
+    for name, value in vars(config).items():
+        if not name.startswith('_') and name in current and not callable(current[name]):
+            current[name] = value
+
+#appkey - change this before working with rustplugins.py
+appkey = 'changeme'
+
+#credentialbackend - where secrets such as the panel bearer are kept: keyring (the operating systems keyring), env (environment variables, see credentialenv) or file (see credentialfile). Each secret is read once per run.
+credentialbackend = 'keyring'
+#credentialenv - environment variable holding each secret when credentialbackend is env, {key} is the upper cased secret name, e.g. RUSTPLUGINS_BEARER.
+credentialenv = 'RUSTPLUGINS_{key}'
+#credentialfile - file holding each secret when credentialbackend is file, {key} is the secret name, e.g. bearer. fd:<n> reads an inherited file descriptor instead.
+credentialfile = '/run/secrets/rustplugins-{key}'
+
+#umodbase - base url for umod plugin downloads.
+umodbase = 'https://umod.org/plugins/'
+#statename - sqlite state database holding settings, managed servers and plugins. Filename or absolute path, filename defaults to location of rustplugins.py
+statename = 'rustplugins.db'
+#configname - legacy YAML configuration, imported into statename once and renamed to <configname>.migrated. Filename or absolute path, filename defaults to location of rustplugins.py
+configname = 'config.yaml'
+#cachedirname - directory name or absolute path, directory name defaults to a directory under the location of rustplugins.py
+cachedirname = 'cache'
+#logname - Filename or absolute path, filename defaults to location of rustplugins.py
+logname = 'rustplugins.log'
+#rolloutpanelconcurrency - maximum plugin jobs in flight against the panel during --update.
+rolloutpanelconcurrency = 8
+#rolloutserverconcurrency - maximum plugin jobs in flight against a single server during --update.
+rolloutserverconcurrency = 2
+#cachemaxbytes - size cap for the plugin cache, least recently used plugins are evicted past it. 0 disables eviction.
+cachemaxbytes = 256 * 1024 * 1024
+#listingttl - seconds a remote directory listing is reused before it is fetched again.
+listingttl = 30
+#httppoolsize - keep-alive connections kept per host for the panel, each wings node and plugin origins.
+httppoolsize = 16
+#httptimeout - seconds to wait on a connect or read from the panel, wings or a plugin origin.
+httptimeout = 30
+#metadatattl - seconds server names, uuids and states fetched from the panel are reused.
+metadatattl = 15
+#reloadtimeout - seconds to wait on the server console for queued plugin reloads to be confirmed.
+reloadtimeout = 60
+#downloadconcurrency - plugin downloads from their origins run in parallel up to this many.
+downloadconcurrency = 4
+#downloadchunksize - bytes read per write while downloading plugins.
+downloadchunksize = 1024 * 1024
+#useragent - User-Agent sent when downloading plugins from their origins.
+useragent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+#daemonsocketname - unix socket --daemon listens on for --submit jobs. Filename or absolute path, filename defaults to location of rustplugins.py
+daemonsocketname = 'rustplugins.sock'
+#daemoninterval - seconds between scheduled update sweeps of every managed server in --daemon mode.
+daemoninterval = 3600
+#daemonjitter - each sweep is moved up to this many seconds earlier or later, so daemons on many hosts don't hit the panel together.
+daemonjitter = 300
+#umodmetadata - optional url of a umod style metadata endpoint used to learn the latest version of a umod plugin without downloading it, {name} is the plugin filename without .cs. It must return JSON with latest_release_version or version. Empty reads the [Info] attribute from the head of the plugin download with a ranged request instead.
+umodmetadata = ''
+#infoheadbytes - bytes read from the start of a plugin to find its [Info("Title", "Author", "1.2.3")] attribute.
+infoheadbytes = 16 * 1024
+#tracefile - spans of every fetch, listing, upload, rename, delete, reload and download are exported here at exit and after each --daemon job. Empty disables export. Filename or absolute path, filename defaults to location of rustplugins.py
+tracefile = ''
+#traceformat - jsonl appends one JSON object per span to tracefile, prometheus rewrites it as a node_exporter textfile of per operation counters.
+traceformat = 'jsonl'
+#logmaxbytes - the log is rotated once it grows past this many bytes, 0 lets it grow without limit.
+logmaxbytes = 5 * 1024 * 1024
+#logbackups - rotated logs kept beside it as rustplugins.log.1, .2 and so on.
+logbackups = 3
+#logqueuesize - log records waiting to be written before new ones are dropped rather than slowing a rollout down.
+logqueuesize = 10000
+#logbodybytes - request and response bodies of failed calls are cut to this many bytes in the log.
+logbodybytes = 512
+#asyncconnections - connections rpAsyncConnection keeps open at once across the panel, wings nodes and plugin origins, httppoolsize of them per host.
+asyncconnections = 64
+#seeddirname - directory of config and data files laid out like a server's oxide directory, config/<Plugin>.json, data/<Plugin>.json and the config/<Plugin> and data/<Plugin> directories. A plugin's files in it are uploaded beside the plugin wherever the server does not have them yet, existing ones are never overwritten. Directory name or absolute path, directory name defaults to a directory under the location of rustplugins.py
+seeddirname = 'seed'
+#archiveminfiles - uploads of at least this many files, plugins and their seed files, to one server spread over more than two directories are sent as a single tar.gz that wings unpacks in place, anything else goes as plain files, two requests per directory against the archive's four. 0 always sends plain files.
+archiveminfiles = 50
+#archivecompresslevel - gzip level, 1 to 9, used when packing those archives.
+archivecompresslevel = 6
+#backupsuffix - before a plugin is overwritten its copy on the server is renamed aside to <plugin>.cs<backupsuffix>, which --rollback swaps back into place. Empty overwrites in place and --rollback uploads the previous version from the cache instead.
+backupsuffix = '.previous'
+#cacheversions - versions of each plugin kept in the cache for --rollback, the current one included. They are kept even past cachemaxbytes.
+cacheversions = 3
+#panelratelimit - requests per minute allowed per api key on the panel, pterodactyl's default is 720 (APP_API_CLIENT_RATELIMIT). Requests are spaced out to stay under it and the panel's X-RateLimit headers correct it. 0 only waits when the panel answers 429.
+panelratelimit = 720
+#hostratelimit - requests per minute to each wings node and plugin origin host, 0 only waits when one answers 429.
+hostratelimit = 0
+#httpretries - times a request answered 429, or an idempotent one answered 502, 503 or 504 or cut off, is sent again.
+httpretries = 4
+#httpbackoff - seconds before the first retry, doubled for each retry after it up to httpbackoffmax and jittered. A Retry-After from the server is always waited out.
+httpbackoff = 0.5
+#httpbackoffmax - longest wait between two retries in seconds.
+httpbackoffmax = 30
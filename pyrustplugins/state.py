@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+from . import settings
+import os
+import threading
+import json
+import sqlite3
+import contextlib
+from .util import _, appname, keyring, yaml
+from .server import rpServer
+
+class rpCredentials:
+    # secrets such as the panel bearer, resolved once per process from the backend chosen by
+    # credentialbackend in config.py and memoized, so repeated lookups never go back to it.
+    backends = {}
+    _provider = None
+    _providerlock = threading.Lock()
+
+    def __init__(self):
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def provider() -> rpCredentials:
+        with rpCredentials._providerlock:
+            if rpCredentials._provider is None:
+                if settings.credentialbackend not in rpCredentials.backends:
+                    raise ValueError(_("Unknown credentialbackend {} in config.py, expecting one of {}.").format(settings.credentialbackend, ", ".join(rpCredentials.backends)))
+                rpCredentials._provider = rpCredentials.backends[settings.credentialbackend]()
+            return rpCredentials._provider
+
+    def get(self, key:str) -> str:
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = self.read(key)
+            return self._memo[key]
+
+    def set(self, key:str, data:str):
+        with self._lock:
+            self.write(key, data)
+            self._memo[key] = data
+
+    def read(self, key:str) -> str:
+        # None is no secret stored, the backends below read theirs from where they keep them.
+        return None
+
+    def write(self, key:str, data:str):
+        raise PermissionError(_("The {} credential backend is read only, provide {} through it directly.").format(settings.credentialbackend, key))
+
+
+class rpKeyringCredentials(rpCredentials):
+
+    def read(self, key:str) -> str:
+        return keyring.get_password(appname,"{}-{}".format(settings.appkey,key))
+
+    def write(self, key:str, data:str):
+        keyring.set_password(appname,"{}-{}".format(settings.appkey,key),data)
+
+
+class rpEnvCredentials(rpCredentials):
+    # RUSTPLUGINS_BEARER and the like, see credentialenv in config.py.
+
+    def read(self, key:str) -> str:
+        return os.environ.get(settings.credentialenv.format(key=key.upper())) or None
+
+    def write(self, key:str, data:str):
+        if self.read(key) != data:
+            super().write(key, data)
+
+
+class rpFileCredentials(rpCredentials):
+    # one secret per file, see credentialfile in config.py. fd:<n> reads an inherited file
+    # descriptor instead, which can only be read once and so relies on the memo.
+
+    def path(self, key:str) -> str:
+        return settings.credentialfile.format(key=key)
+
+    def read(self, key:str) -> str:
+        path = self.path(key)
+        try:
+            if path.startswith('fd:'):
+                with os.fdopen(int(path[3:]), 'r') as file:
+                    data = file.read()
+            else:
+                with open(path, 'r') as file:
+                    data = file.read()
+        except OSError:
+            return None
+        return data.strip() or None
+
+    def write(self, key:str, data:str):
+        path = self.path(key)
+        if path.startswith('fd:'):
+            super().write(key, data)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as file:
+            file.write(data + "\n")
+
+rpCredentials.backends = {'keyring': rpKeyringCredentials, 'env': rpEnvCredentials, 'file': rpFileCredentials}
+
+
+class rpConfig:
+    # settings, managed servers and their plugins as plain records in sqlite,
+    # every change is written in its own transaction and looked up by identifier.
+    defaults = {'config':'rustpluginsv2','remoteoxideplugins':'oxide/plugins','instance':'','lang':'en'}
+    pluginfields = ('origin', 'local', 'hash', 'remote', 'cached', 'remotestate', 'info', 'previous', 'held')
+    jsonfields = ('remotestate', 'info', 'previous')
+    # plugin fields that aren't TEXT, so columns added by a migration match the schema.
+    integerfields = ('cached', 'held')
+    schema = [
+        "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)",
+        "CREATE TABLE IF NOT EXISTS servers (identifier TEXT PRIMARY KEY, uuid TEXT, name TEXT, state TEXT)",
+        "CREATE TABLE IF NOT EXISTS plugins (server TEXT NOT NULL REFERENCES servers(identifier) ON DELETE CASCADE, localname TEXT NOT NULL, origin TEXT, local TEXT, hash TEXT, remote TEXT, cached INTEGER NOT NULL DEFAULT 0, remotestate TEXT, info TEXT, previous TEXT, held INTEGER, PRIMARY KEY (server, localname))",
+        "CREATE INDEX IF NOT EXISTS plugins_origin ON plugins (origin)",
+    ]
+
+    def __init__(self):
+        self._db = None
+        self._lock = threading.RLock()
+
+    def open(self, statefile:str, legacyfile:str=None):
+        with self._lock:
+            self._db = sqlite3.connect(statefile, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA foreign_keys = ON")
+            self._db.execute("PRAGMA journal_mode = WAL")
+            with self._transaction() as db:
+                for statement in rpConfig.schema:
+                    db.execute(statement)
+                # plugin fields added since the database was created.
+                columns = {row[1] for row in db.execute("PRAGMA table_info(plugins)")}
+                for field in rpConfig.pluginfields:
+                    if field not in columns:
+                        db.execute("ALTER TABLE plugins ADD COLUMN {} {}".format(field, 'INTEGER' if field in rpConfig.integerfields else 'TEXT'))
+                # the defaults and the import of a legacy file commit together, a legacy file that
+                # fails to import leaves the database fresh so the next run tries it again.
+                migrate = False
+                if db.execute("SELECT COUNT(*) FROM settings").fetchone()[0] == 0:
+                    db.executemany("INSERT INTO settings (key, value) VALUES (?, ?)", rpConfig.defaults.items())
+                    if legacyfile and os.path.isfile(legacyfile):
+                        self._import_yaml(db, rpConfig._read_yaml(legacyfile))
+                        migrate = True
+            if migrate:
+                os.replace(legacyfile, "{}.migrated".format(legacyfile))
+        return self
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            else:
+                self._db.execute("COMMIT")
+
+    def migrate_yaml(self, legacyfile:str):
+        # one shot import of a v1 config.yaml into an open database.
+        legacy = rpConfig._read_yaml(legacyfile)
+        with self._transaction() as db:
+            self._import_yaml(db, legacy)
+        os.replace(legacyfile, "{}.migrated".format(legacyfile))
+
+    def _read_yaml(legacyfile:str) -> dict:
+        # the pickled rpServer tags are read as plain mappings and anything else python
+        # specific is dropped, nothing is executed.
+        class LegacyLoader(yaml.SafeLoader):
+            pass
+        LegacyLoader.add_multi_constructor('tag:yaml.org,2002:python/object:', lambda loader, suffix, node: loader.construct_mapping(node, deep=True))
+        LegacyLoader.add_multi_constructor('tag:yaml.org,2002:python/object/apply:', lambda loader, suffix, node: None)
+        LegacyLoader.add_multi_constructor('tag:yaml.org,2002:python/', lambda loader, suffix, node: None)
+        with open(legacyfile) as file:
+            return yaml.load(file, Loader=LegacyLoader) or {}
+
+    def _import_yaml(self, db, legacy:dict):
+        for key in ('remoteoxideplugins', 'instance', 'lang'):
+            if legacy.get(key):
+                db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, legacy[key]))
+        for record in legacy.get('serverlist') or []:
+            if not isinstance(record, dict) or not record.get('identifier'):
+                continue
+            server = rpServer(record['identifier'])
+            server.uuid, server.name, server.state = record.get('uuid'), record.get('name'), record.get('state')
+            server.pluginlist = record.get('pluginlist') or None
+            self._save_server(db, server, None)
+
+    def get(self, key:str):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else rpConfig.defaults.get(key)
+
+    def set(self, key:str, value:str):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+    def check_config_instance(self,):
+        if self._db is not None:
+            if(self.get('instance') and rpConfig.getsecure('bearer')):
+                return True
+            else:
+                return False
+        else:
+            return False
+
+    def _server(self, row) -> rpServer:
+        server = rpServer(row[0])
+        server.uuid, server.name, server.state = row[1], row[2], row[3]
+        return server
+
+    def _plugins(self, servers:dict):
+        placeholders = ",".join("?" * len(servers))
+        rows = self._db.execute("SELECT server, localname, {} FROM plugins WHERE server IN ({})".format(", ".join(rpConfig.pluginfields), placeholders), list(servers)).fetchall()
+        for row in rows:
+            plugin = dict(zip(rpConfig.pluginfields, row[2:]))
+            plugin['cached'] = bool(plugin['cached'])
+            for field in rpConfig.jsonfields:
+                plugin[field] = json.loads(plugin[field]) if plugin[field] else None
+            server = servers[row[0]]
+            if server.pluginlist is None:
+                server.pluginlist = {}
+            server.pluginlist[row[1]] = plugin
+
+    def servers(self) -> list:
+        with self._lock:
+            servers = {row[0]: self._server(row) for row in self._db.execute("SELECT identifier, uuid, name, state FROM servers ORDER BY identifier")}
+            if servers:
+                self._plugins(servers)
+        return list(servers.values())
+
+    def server_ismanaged(self, identifier:str):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM servers WHERE identifier = ?", (identifier,)).fetchone() is not None
+
+    def server_getmanaged(self, identifier:str) -> rpServer:
+        with self._lock:
+            row = self._db.execute("SELECT identifier, uuid, name, state FROM servers WHERE identifier = ?", (identifier,)).fetchone()
+            if row is None:
+                return False
+            server = self._server(row)
+            self._plugins({server.identifier: server})
+        return server
+
+    def server_save(self, server:rpServer, localnames:list=None):
+        # with localnames only those plugin records are written, otherwise the
+        # server's whole plugin set is replaced.
+        with self._transaction() as db:
+            self._save_server(db, server, localnames)
+
+    def _save_server(self, db, server:rpServer, localnames:list):
+        db.execute("INSERT INTO servers (identifier, uuid, name, state) VALUES (?, ?, ?, ?) ON CONFLICT(identifier) DO UPDATE SET uuid = excluded.uuid, name = excluded.name, state = excluded.state", (server.identifier, server.uuid, server.name, server.state))
+        pluginlist = server.pluginlist or {}
+        if localnames is None:
+            db.execute("DELETE FROM plugins WHERE server = ?", (server.identifier,))
+            localnames = list(pluginlist)
+        for localname in localnames:
+            if localname not in pluginlist:
+                db.execute("DELETE FROM plugins WHERE server = ? AND localname = ?", (server.identifier, localname))
+                continue
+            plugin = pluginlist[localname]
+            values = [plugin.get(field) for field in rpConfig.pluginfields]
+            values[rpConfig.pluginfields.index('cached')] = 1 if plugin.get('cached') else 0
+            for field in rpConfig.jsonfields:
+                values[rpConfig.pluginfields.index(field)] = json.dumps(plugin[field]) if plugin.get(field) is not None else None
+            db.execute("INSERT OR REPLACE INTO plugins (server, localname, {}) VALUES (?, ?, {})".format(", ".join(rpConfig.pluginfields), ", ".join("?" * len(values))), [server.identifier, localname] + values)
+
+    def server_remove(self, identifier:str):
+        with self._transaction() as db:
+            return db.execute("DELETE FROM servers WHERE identifier = ?", (identifier,)).rowcount > 0
+
+    def setsecure(key:str,data:str):
+        rpCredentials.provider().set(key, data)
+
+    def getsecure(key:str):
+        return rpCredentials.provider().get(key)
+                    
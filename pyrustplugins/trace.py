@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import threading
+import json
+import time
+import contextvars
+from .util import _, rpUtil
+
+class rpSpan:
+    # one logical operation against the panel, wings or an origin. the requests made while
+    # it is active in this thread or asyncio task add their status, retries and time waited per service.
+
+    def __init__(self, tracer:rpTracer, op:str, target:str=None, **attrs):
+        self.tracer = tracer
+        self.op = op
+        self.target = target
+        self.attrs = attrs
+        self.parent = None
+        self.start = None
+        self.seconds = None
+        self.status = None
+        self.bytes = 0
+        self.retries = 0
+        self.requests = 0
+        # service -> seconds spent waiting on it, 'panel', 'wings' or 'origin'
+        self.waits = {}
+        self.error = None
+        self._started = None
+        self._token = None
+
+    def __enter__(self):
+        self.parent = self.tracer.active()
+        self._token = self.tracer._current.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exctype, exc, tb):
+        self.seconds = time.perf_counter() - self._started
+        self.tracer._current.reset(self._token)
+        if exc is not None and self.error is None:
+            self.error = exctype.__name__
+        self.tracer.record(self)
+        return False
+
+    def observe(self, response, service:str, seconds:float):
+        # response is a requests.Response or an aiohttp.ClientResponse.
+        self.requests += 1
+        self.status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+        self.retries += rpUtil.response_retries(response)
+        self.waits[service] = self.waits.get(service, 0) + seconds
+
+    def ok(self) -> bool:
+        return self.error is None and (self.status is None or self.status < 400)
+
+    def asdict(self) -> dict:
+        return dict({'op':self.op, 'target':self.target, 'parent':self.parent.op if self.parent else None, 'start':self.start, 'seconds':self.seconds, 'status':self.status, 'bytes':self.bytes, 'retries':self.retries, 'requests':self.requests, 'waits':self.waits, 'error':self.error}, **self.attrs)
+
+
+class rpTracer:
+    # collects finished spans for --profile and exports them to tracefile, see traceformat.
+    # prometheus counters cover every span since the process started, json lines are
+    # appended once and then dropped from memory.
+    services = ('panel', 'wings', 'origin', 'throttle')
+
+    def __init__(self):
+        self.path = None
+        self.format = 'jsonl'
+        self.profiling = False
+        self.spans = []
+        # op -> {'count', 'errors', 'seconds', 'bytes', 'retries', 'requests', 'waits':{service: seconds}}
+        self.totals = {}
+        # op -> span seconds, only kept while profiling
+        self.durations = {}
+        self._current = contextvars.ContextVar('rustplugins_span', default=None)
+        self._lock = threading.Lock()
+
+    def configure(self, path:str=None, format:str='jsonl', profiling:bool=False):
+        self.path = path or None
+        self.format = format
+        self.profiling = profiling
+
+    def active(self) -> rpSpan:
+        return self._current.get()
+
+    def span(self, op:str, target:str=None, **attrs) -> rpSpan:
+        return rpSpan(self, op, target, **attrs)
+
+    def observe(self, response, service:str, seconds:float):
+        span = self.active()
+        if span is not None:
+            span.observe(response, service, seconds)
+
+    def retried(self):
+        span = self.active()
+        if span is not None:
+            span.retries += 1
+
+    def throttled(self, seconds:float):
+        # time spent waiting for the rate limiter rather than on a service.
+        span = self.active()
+        if span is not None:
+            span.waits['throttle'] = span.waits.get('throttle', 0) + seconds
+
+    def moved(self, size:int):
+        span = self.active()
+        if span is not None:
+            span.bytes += size
+
+    def record(self, span:rpSpan):
+        with self._lock:
+            total = self.totals.setdefault(span.op, {'count':0, 'errors':0, 'seconds':0, 'bytes':0, 'retries':0, 'requests':0, 'waits':{}})
+            total['count'] += 1
+            total['errors'] += 0 if span.ok() else 1
+            total['seconds'] += span.seconds
+            total['bytes'] += span.bytes
+            total['retries'] += span.retries
+            total['requests'] += span.requests
+            for service, seconds in span.waits.items():
+                total['waits'][service] = total['waits'].get(service, 0) + seconds
+            if self.profiling:
+                self.durations.setdefault(span.op, []).append(span.seconds)
+            if self.path and self.format == 'jsonl':
+                self.spans.append(span.asdict())
+
+    def flush(self):
+        if not self.path:
+            return
+        with self._lock:
+            if self.format == 'prometheus':
+                rpUtil.write_atomic(self.path, self.prometheus())
+            elif self.spans:
+                with open(self.path, 'a') as file:
+                    file.writelines(json.dumps(span) + "\n" for span in self.spans)
+                self.spans = []
+
+    def prometheus(self) -> str:
+        metrics = [
+            ('rustplugins_operations_total', 'Operations finished against the panel, wings and plugin origins.', lambda op, t: [('', t['count'])]),
+            ('rustplugins_operation_errors_total', 'Operations that raised or ended with an HTTP error status.', lambda op, t: [('', t['errors'])]),
+            ('rustplugins_operation_seconds_total', 'Wall time spent in operations.', lambda op, t: [('', t['seconds'])]),
+            ('rustplugins_operation_bytes_total', 'Plugin and listing bytes moved by operations.', lambda op, t: [('', t['bytes'])]),
+            ('rustplugins_operation_requests_total', 'HTTP requests made by operations.', lambda op, t: [('', t['requests'])]),
+            ('rustplugins_operation_retries_total', 'HTTP retries made by operations.', lambda op, t: [('', t['retries'])]),
+            ('rustplugins_operation_wait_seconds_total', 'Time operations spent waiting on each service, throttle is the rate limiter.', lambda op, t: [(',service="{}"'.format(s), w) for s, w in sorted(t['waits'].items())]),
+        ]
+        lines = []
+        for name, help, values in metrics:
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} counter".format(name))
+            for op, total in sorted(self.totals.items()):
+                for labels, value in values(op, total):
+                    lines.append('{}{{op="{}"{}}} {}'.format(name, op, labels, round(value, 6)))
+        lines.append("# HELP rustplugins_trace_export_timestamp_seconds When these counters were written.")
+        lines.append("# TYPE rustplugins_trace_export_timestamp_seconds gauge")
+        lines.append("rustplugins_trace_export_timestamp_seconds {:.3f}".format(time.time()))
+        return "\n".join(lines) + "\n"
+
+    def profile(self) -> str:
+        lines = [_("{:<10} {:>6} {:>9} {:>9} {:>9} {:>10} {:>7} {:>6} {:>9} {:>9} {:>9} {:>10}").format(_("Operation"), _("Count"), _("Total s"), _("p50 ms"), _("Max ms"), _("Bytes"), _("Retries"), _("Errors"), _("Panel s"), _("Wings s"), _("Origin s"), _("Throttle s"))]
+        with self._lock:
+            for op, total in sorted(self.totals.items(), key=lambda item: -item[1]['seconds']):
+                durations = sorted(self.durations.get(op, [])) or [0]
+                waits = [total['waits'].get(service, 0) for service in rpTracer.services]
+                lines.append("{:<10} {:>6} {:>9.2f} {:>9.1f} {:>9.1f} {:>10} {:>7} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.2f}".format(op, total['count'], total['seconds'], durations[len(durations) // 2] * 1000, durations[-1] * 1000, total['bytes'], total['retries'], total['errors'], *waits))
+        if len(lines) == 1:
+            lines.append(_("No panel, wings or origin operations were made."))
+        return "\n".join(lines)
+
+    def finish(self):
+        try:
+            self.flush()
+        except OSError as e:
+            print(_("Could not export trace to {}: {}").format(self.path, e))
+        if self.profiling:
+            print(self.profile())
+
+tracer = rpTracer()
@@ -0,0 +1,298 @@
+from __future__ import annotations
+from urllib import parse
+
+from . import settings
+import os
+import importlib
+import threading
+import base64
+import re
+import time
+import hashlib
+import gettext
+
+#DO NOT EDIT -- SEE config.py for editable parameters.
+
+appname="rustplugins"
+#translations - catalog _ looks messages up in, main() replaces it with the one for the configured lang.
+translations = gettext.NullTranslations()
+
+def _(message:str) -> str:
+    return translations.gettext(message)
+
+class rpLazyModule:
+    # stands in for a heavy dependency until one of its attributes is first used,
+    # so commands that never reach the network or the keyring don't pay to import them.
+
+    def __init__(self, name:str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def available(self) -> bool:
+        try:
+            self._load()
+        except ImportError:
+            return False
+        return True
+
+    def __getattr__(self, attr:str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return "<rpLazyModule {} {}>".format(self._name, 'loaded' if self._module else 'pending')
+
+requests = rpLazyModule('requests')
+yaml = rpLazyModule('yaml')
+validators = rpLazyModule('validators')
+keyring = rpLazyModule('keyring')
+tqdm = rpLazyModule('tqdm')
+websocket = rpLazyModule('websocket')
+pydactyl = rpLazyModule('pydactyl')
+aiohttp = rpLazyModule('aiohttp')
+asyncio = rpLazyModule('asyncio')
+tarfile = rpLazyModule('tarfile')
+
+class rpTTLCache:
+
+    def __init__(self, ttl:float):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+            self._entries.pop(key, None)
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class rpReloadBatch:
+    # the i/o free half of one oxide.reload for several plugins, shared by rpServer and
+    # rpAsyncServer: the command to send, which plugin each console line after it confirms and
+    # the results, localname -> (ok, detail, seconds) with ok None when unconfirmed.
+
+    def __init__(self, localnames:list):
+        self.localnames = list(localnames)
+        self.pending = {os.path.splitext(localname)[0]: localname for localname in self.localnames}
+        self.command = "oxide.reload {}".format(" ".join(self.pending))
+        self.started = time.monotonic()
+        self.deadline = self.started + settings.reloadtimeout
+        self.results = {}
+        self._compiled = []
+
+    def line(self, line:str) -> bool:
+        # records what line confirms, true once no plugin is pending.
+        stem, ok = rpUtil.match_reload_line(line, self.pending, self._compiled)
+        if stem:
+            self.results[self.pending.pop(stem)] = (ok, line.strip(), time.monotonic() - self.started)
+            if stem in self._compiled:
+                self._compiled.remove(stem)
+        return not self.pending
+
+    def sent(self, ok:bool) -> dict:
+        # results when the command went out without a console to confirm it on.
+        detail = _("Reload sent, not confirmed.") if ok else _("Reload command failed, issue {} manually.").format(self.command)
+        return {localname: (None if ok else False, detail, time.monotonic() - self.started) for localname in self.localnames}
+
+    def finish(self) -> dict:
+        for stem, localname in self.pending.items():
+            self.results[localname] = (None, _("No confirmation within {}s.").format(settings.reloadtimeout), time.monotonic() - self.started)
+        return self.results
+
+
+class rpUtil:
+
+    # def https_download_file(url,destpath):        
+    #     # Streaming, so we can iterate over the response.
+    #     filename = os.path.basename(urlparse(url).path)
+    #     try:
+    #         response = requests.get(url, stream=True)
+    #         response.raise_for_status()
+    #         total_size_in_bytes= int(response.headers.get('content-length', 0))
+    #         block_size = 1024 #1 Kibibyte
+    #         progress_bar = tqdm(total=total_size_in_bytes, unit='iB', unit_scale=True)
+    #         with open(os.path.join(destpath,filename), 'wb') as file:
+    #             for data in response.iter_content(block_size):
+    #                 progress_bar.update(len(data))
+    #                 file.write(data)
+    #             file.close()
+    #         progress_bar.close()
+    #         if total_size_in_bytes != 0 and progress_bar.n != total_size_in_bytes:
+    #             print("ERROR, something went wrong")
+    #         else:
+    #             return True
+    #     except requests.exceptions.RequestException as e:
+    #         return e
+    
+    def file_isnt_zero(filepath:str):
+            if os.path.isfile(filepath):
+                if os.path.getsize(filepath) > 0:
+                    return True
+                else:
+                    return False
+            else:
+                return True
+
+    def server_page(jsondata:dict, page:int) -> tuple:
+        # the servers on one page of the panel's server list and the page after it, None on the last.
+        pagination = jsondata.get('meta', {}).get('pagination', {})
+        return [server['attributes'] for server in jsondata['data']], (page + 1 if page < pagination.get('total_pages', 1) else None)
+
+    def file_listing(jsondata:dict) -> dict:
+        # name -> attributes from a files/list response.
+        return {i['attributes']['name']: i['attributes'] for i in jsondata['data']}
+
+    def match_reload_line(line:str, pending:dict, compiled:list):
+        # maps an oxide console line to a pending plugin stem, returns (stem, ok) or (None, None).
+        # a batch compiles together as 'A, B and C were compiled successfully'. 'Loaded plugin'
+        # carries the title, so it is matched on letters and digits only and falls back to the
+        # plugin that compiled longest ago.
+        line = re.sub(r'\x1b\[[0-9;]*m', '', line).strip()
+        normalize = lambda name: re.sub(r'[^a-z0-9]', '', name.lower())
+        match = re.search(r'((?:\w+, )*\w+(?: and \w+)?) (?:was|were) compiled successfully', line)
+        if match:
+            compiled.extend(stem for stem in re.split(r', | and ', match.group(1)) if stem in pending and stem not in compiled)
+            return None, None
+        match = re.search(r'Loaded plugin (.+?) v\S+ by ', line)
+        if match:
+            title = normalize(match.group(1))
+            for stem in pending:
+                if normalize(stem) == title:
+                    return stem, True
+            if compiled:
+                return compiled[0], True
+            return None, None
+        match = re.search(r'(?:Error while compiling|Failed to compile|Unable to load|Failed to initialize plugin)\W*(\w+)', line)
+        if match:
+            for stem in pending:
+                if normalize(stem) == normalize(match.group(1)):
+                    return stem, False
+        return None, None
+
+    def header_sha256(headers) -> str:
+        # sha256 an origin advertises for its body, via Digest or X-Checksum-Sha256.
+        checksum = headers.get('X-Checksum-Sha256')
+        if checksum:
+            return checksum.strip().lower()
+        for digest in headers.get('Digest', '').split(','):
+            algorithm, _sep, value = digest.strip().partition('=')
+            if algorithm.lower() == 'sha-256' and value:
+                try:
+                    return base64.b64decode(value).hex()
+                except ValueError:
+                    return None
+        return None
+
+    def url_with_params(url:str, params:dict) -> str:
+        parts = parse.urlsplit(url)
+        query = [(k, v) for k, v in parse.parse_qsl(parts.query) if k not in params] + list(params.items())
+        return parse.urlunsplit(parts._replace(query=parse.urlencode(query)))
+
+    def pooled_session(headers:dict) -> requests.Session:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=settings.httppoolsize, pool_maxsize=settings.httppoolsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(headers)
+        return session
+
+    def file_sha256(filepath:str) -> str:
+        sha = hashlib.sha256()
+        with open(filepath, 'rb') as file:
+            for data in iter(lambda: file.read(1024 * 1024), b''):
+                sha.update(data)
+        return sha.hexdigest()
+
+    def redact(text:str) -> str:
+        # bearer tokens, token= query parameters of signed wings urls and password fields.
+        text = re.sub(r'(?i)(bearer\s+)[^\s"\',;]+', r'\1***', text)
+        return re.sub(r'(?i)((?:token|password|passwd|secret|api_?key)["\']?\s*[=:]\s*["\']?)[^\s"\'&,;}]+', r'\1***', text)
+
+    def redact_headers(headers) -> dict:
+        return {key: '***' if key.lower() in ('authorization', 'cookie', 'x-api-key') else value for key, value in (headers or {}).items()}
+
+    def log_body(body, limit:int=None) -> str:
+        # a short printable summary of a request or response body for the debug log,
+        # streamed bodies such as multipart uploads are described by their size only.
+        limit = limit or settings.logbodybytes
+        if body is None or len(body if isinstance(body, (bytes, str)) else b'-') == 0:
+            return '<empty>'
+        if not isinstance(body, (bytes, str)):
+            return '<{} {}>'.format(type(body).__name__, "{} bytes".format(len(body)) if hasattr(body, '__len__') else 'stream')
+        text = body[:limit].decode('utf-8', errors='replace') if isinstance(body, bytes) else body[:limit]
+        if len(body) > limit:
+            text = "{}... ({} bytes)".format(text, len(body))
+        return rpUtil.redact(text)
+
+    def response_retries(response) -> int:
+        # retries urllib3 made before handing back this response, 0 when it can't tell.
+        retries = getattr(getattr(response, 'raw', None), 'retries', None)
+        return len(getattr(retries, 'history', None) or ())
+
+    def write_atomic(path:str, data:str):
+        # readers such as the node_exporter textfile collector never see a half written file.
+        tmpfile = "{}.tmp".format(path)
+        with open(tmpfile, 'w') as file:
+            file.write(data)
+        os.replace(tmpfile, path)
+
+    def tar_normalize(tarinfo):
+        # archive members carry no local owner and are readable by the server user.
+        tarinfo.uid = tarinfo.gid = 0
+        tarinfo.uname = tarinfo.gname = ''
+        tarinfo.mode = 0o644 if tarinfo.isfile() else 0o755
+        return tarinfo
+
+    def plugin_info(data) -> dict:
+        # title, author and version from an oxide [Info("Title", "Author", "1.2.3")] attribute,
+        # the version may also be a bare number. {} when the attribute isn't there.
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', errors='replace')
+        match = re.search(r'\[\s*Info\s*\(\s*"((?:[^"\\]|\\.)*)"\s*,\s*"((?:[^"\\]|\\.)*)"\s*,\s*"?\s*v?([0-9][0-9A-Za-z.+-]*)', data)
+        if not match:
+            return {}
+        return {'title':match.group(1), 'author':match.group(2), 'version':match.group(3)}
+
+    def read_head(response, limit:int) -> bytes:
+        # at most limit bytes of a streamed body, the rest is never read.
+        head = b''
+        try:
+            for data in response.iter_content(min(limit, 16 * 1024)):
+                head += data
+                if len(head) >= limit:
+                    break
+        finally:
+            response.close()
+        return head[:limit]
+
+    def version_key(version:str) -> tuple:
+        # 1.2.10 sorts after 1.2.9 and 1.2 equals 1.2.0.
+        parts = [int(part) for part in re.findall(r'\d+', str(version or ''))]
+        while parts and parts[-1] == 0:
+            parts.pop()
+        return tuple(parts)
+
+    def newer(available:str, installed:str):
+        # True when available is a later version than installed, None when either is unknown.
+        if not available or not installed:
+            return None
+        return rpUtil.version_key(available) > rpUtil.version_key(installed)
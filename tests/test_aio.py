@@ -0,0 +1,83 @@
+# rpAsyncConnection and rpAsyncServer against the mock panel. run from the repository root with
+# python -m unittest or pytest.
+from pathlib import Path
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root), str(root / 'bench')]
+
+from pyrustplugins import rpAsyncConnection, rpAsyncServer, rpCache, rpServer
+from mockpanel import rpMockPanel
+
+alpha = b'[Info("Alpha", "me", "1.0.0")] class Alpha {}'
+beta = b'[Info("Beta", "me", "2.0.0")] class Beta {}' + b' ' * 300000
+
+
+class rpAsyncServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.panel = rpMockPanel(2, pagesize=1, origins={'Alpha.cs':alpha, 'Beta.cs':beta}).start()
+        self.identifier = next(iter(self.panel.servers))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = rpServer(self.identifier)
+        self.server.pluginadd(self.panel.origin('Alpha.cs'), 'Alpha.cs', 'oxide/plugins/Alpha.cs')
+        self.server.pluginadd(self.panel.origin('Beta.cs'), 'Beta.cs', 'oxide/plugins/Beta.cs')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        self.panel.stop()
+
+    def run_async(self, coroutine):
+        async def run():
+            async with rpAsyncConnection(self.panel.url, 'token') as connection:
+                return await coroutine(connection, rpAsyncServer(self.server))
+        return asyncio.run(run())
+
+    def test_fetch_follows_pagination(self):
+        async def fetch(connection, server):
+            await server.fetch(connection)
+            return await connection.list_servers()
+        servers = self.run_async(fetch)
+        self.assertEqual(sorted(servers), sorted(self.panel.servers))
+        self.assertEqual(self.panel.calls['GET servers'], 2)
+        self.assertEqual((self.server.name, self.server.state), ('Rust 1', 'running'))
+
+    def test_file_listing_is_cached_until_invalidated(self):
+        self.panel.setfile(self.identifier, 'oxide/plugins/Alpha.cs', alpha)
+        async def listing(connection, server):
+            first = await server.file_listing(connection, 'oxide/plugins')
+            second = await server.file_listing(connection, 'oxide/plugins')
+            await server.files_delete(connection, ['oxide/plugins/Alpha.cs'])
+            return first, second, await server.file_listing(connection, 'oxide/plugins')
+        first, second, third = self.run_async(listing)
+        self.assertEqual(first['Alpha.cs']['size'], len(alpha))
+        self.assertIs(first, second)
+        self.assertEqual(third, {})
+        self.assertEqual(self.panel.calls['GET files/list'], 2)
+
+    def test_download_upload_and_rename(self):
+        cache = rpCache(self.tmp.name)
+        async def roundtrip(connection, server):
+            downloads = await server.plugindownloadmany(connection, cache, ['Alpha.cs', 'Beta.cs', 'Gamma.cs'])
+            upload = await server.files_upload(connection, [(self.server.pluginlist[localname]['local'], localname) for localname in ('Alpha.cs', 'Beta.cs')], 'oxide/plugins')
+            rename = await server.files_rename(connection, [('oxide/plugins/Alpha.cs', 'oxide/plugins/Alpha2.cs')])
+            return downloads, upload.ok, rename.ok, await server.file_listing(connection, 'oxide/plugins')
+        downloads, uploaded, renamed, listing = self.run_async(roundtrip)
+        self.assertEqual(downloads['Alpha.cs'], (True, []))
+        self.assertEqual(downloads['Beta.cs'], (True, []))
+        self.assertFalse(downloads['Gamma.cs'][0])
+        self.assertTrue(os.path.isfile(self.server.pluginlist['Beta.cs']['local']))
+        self.assertTrue(uploaded and renamed)
+        self.assertEqual(sorted(listing), ['Alpha2.cs', 'Beta.cs'])
+        self.assertEqual(self.panel.getfile(self.identifier, 'oxide/plugins/Alpha2.cs'), alpha)
+        self.assertEqual(self.panel.getfile(self.identifier, 'oxide/plugins/Beta.cs'), beta)
+        self.assertEqual(self.panel.calls['wings upload'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# plugins and their seed config and data files uploaded as one archive or as plain files,
+# against the mock panel. run from the repository root with python -m unittest or pytest.
+from pathlib import Path
+
+import os
+import sys
+import tempfile
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root), str(root / 'bench')]
+
+from pyrustplugins import settings, rpCache, rpConnection, rpServer
+from mockpanel import rpMockPanel
+
+names = ['Alpha', 'Beta', 'Gamma']
+
+
+def plugin(name:str) -> bytes:
+    return '[Info("{}", "me", "1.0.0")] class {} {{}}'.format(name, name).encode()
+
+
+class rpArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.panel = rpMockPanel(1, origins={name + '.cs': plugin(name) for name in names}).start()
+        self.identifier = next(iter(self.panel.servers))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = settings.seeddirname, settings.archiveminfiles
+        settings.seeddirname = os.path.join(self.tmp.name, 'seed')
+        settings.archiveminfiles = 6
+        for name in names:
+            self.seed('config/{}.json'.format(name), '{{"{}": true}}'.format(name))
+        self.seed('data/Alpha.json', '{"players": []}')
+        self.seed('data/Alpha/stats.json', '{"kills": 0}')
+        self.connection = rpConnection(self.panel.url, 'token')
+        self.cache = rpCache(os.path.join(self.tmp.name, 'cache'))
+        self.server = rpServer(self.identifier)
+        for name in names:
+            self.server.pluginadd(self.panel.origin(name + '.cs'), name + '.cs', 'oxide/plugins/{}.cs'.format(name))
+
+    def tearDown(self):
+        settings.seeddirname, settings.archiveminfiles = self.saved
+        self.connection.close()
+        self.tmp.cleanup()
+        self.panel.stop()
+
+    def seed(self, path:str, body:str):
+        path = os.path.join(settings.seeddirname, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(body)
+
+    def apply(self) -> dict:
+        plan = self.server.plan(self.connection, self.cache)
+        self.panel.reset()
+        return plan, self.server.apply(self.connection, self.cache, plan, False, False)
+
+    def files(self) -> dict:
+        return {path: body for path, (body, modified) in self.panel.servers[self.identifier]['files'].items()}
+
+    def test_archive_carries_plugins_and_seeds(self):
+        self.panel.setfile(self.identifier, 'oxide/config/Beta.json', b'{"edited": true}')
+        plan, results = self.apply()
+        self.assertIn(('*', 'archive', '7 uploads in one archive, unpacked by wings'), plan.operations())
+        self.assertEqual({status for status, detail in results.values()}, {'updated'})
+        self.assertEqual(self.files(), {
+            'oxide/plugins/Alpha.cs':plugin('Alpha'), 'oxide/plugins/Beta.cs':plugin('Beta'), 'oxide/plugins/Gamma.cs':plugin('Gamma'),
+            'oxide/config/Alpha.json':b'{"Alpha": true}', 'oxide/config/Beta.json':b'{"edited": true}', 'oxide/config/Gamma.json':b'{"Gamma": true}',
+            'oxide/data/Alpha.json':b'{"players": []}', 'oxide/data/Alpha/stats.json':b'{"kills": 0}',
+        })
+        self.assertEqual(self.panel.calls['wings upload'], 1)
+        self.assertEqual(self.panel.calls['POST files/decompress'], 1)
+        self.assertEqual(self.panel.calls['POST files/delete'], 1)
+
+    def test_small_sets_go_as_plain_files(self):
+        settings.archiveminfiles = 50
+        plan, results = self.apply()
+        self.assertNotIn('archive', [operation for localname, operation, detail in plan.operations()])
+        self.assertEqual(len(self.files()), 8)
+        # plugins, config, data and data/Alpha
+        self.assertEqual(self.panel.calls['wings upload'], 4)
+        self.assertNotIn('POST files/decompress', self.panel.calls)
+
+    def test_seeds_only_go_with_uploads(self):
+        self.apply()
+        os.remove(os.path.join(settings.seeddirname, 'data', 'Alpha.json'))
+        self.panel.servers[self.identifier]['files'].pop('oxide/config/Beta.json')
+        plan, results = self.apply()
+        self.assertEqual(plan.uploads, [])
+        self.assertEqual(plan.seeds, [])
+        self.assertNotIn('oxide/config/Beta.json', self.files())
+
+    def test_failed_decompress_removes_archive_and_falls_back(self):
+        def broken(connection, remotearchive, root='/'):
+            raise ConnectionError('dropped')
+        self.server.files_decompress = broken
+        plan = self.server.plan(self.connection, self.cache)
+        with self.assertRaises(ConnectionError):
+            self.server.apply(self.connection, self.cache, plan, False, False)
+        self.assertEqual([path for path in self.files() if path.endswith('.tar.gz')], [])
+        self.server.files_decompress = lambda connection, remotearchive, root='/': self.connection.panel_request('POST', 'servers/{}/files/nowhere'.format(self.identifier))
+        plan, results = self.apply()
+        self.assertEqual({status for status, detail in results.values()}, {'updated'})
+        self.assertEqual(len(self.files()), 8)
+        self.assertEqual([path for path in self.files() if path.endswith('.tar.gz')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# the content addressed plugin cache: integrity checks, resumed downloads, 304 reuse and
+# eviction, against the mock panel's origin. run from the repository root with python -m
+# unittest or pytest.
+from pathlib import Path
+
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+import yaml
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root), str(root / 'bench')]
+
+from pyrustplugins import rpCache
+from mockpanel import rpMockPanel
+
+alpha = b'[Info("Alpha", "me", "1.0.0")] class Alpha {}' + b' ' * 200000
+alpha2 = b'[Info("Alpha", "me", "2.0.0")] class Alpha {}' + b' ' * 200000
+beta = b'[Info("Beta", "me", "1.0.0")] class Beta {}'
+gamma = b'[Info("Gamma", "me", "1.0.0")] class Gamma {}'
+
+
+def sha256(body:bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class rpCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.panel = rpMockPanel(1, origins={'Alpha.cs':alpha, 'Beta.cs':beta, 'Gamma.cs':gamma}).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = self.open()
+        self.responses = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        self.panel.stop()
+
+    def open(self, maxbytes:int=0) -> rpCache:
+        # a new cache over the same directory, as the next run of rustplugins.py sees it.
+        cache = rpCache(self.tmp.name, maxbytes)
+        request = cache.origin_request
+        def recorded(url:str, **kwargs):
+            response = request(url, **kwargs)
+            self.responses.append((dict(kwargs.get('headers') or {}), response.status_code))
+            return response
+        cache.origin_request = recorded
+        return cache
+
+    def fetch(self, name:str='Alpha.cs') -> tuple:
+        return self.cache.fetch(self.panel.origin(name), name, False)
+
+    def test_checksum_mismatch_is_rejected(self):
+        self.panel.checksums['Alpha.cs'] = '0' * 64
+        ok, errors, digest = self.fetch()
+        self.assertFalse(ok)
+        self.assertIsNone(digest)
+        self.assertIn('checksum', errors[0])
+        self.assertIsNone(self.cache.get(sha256(alpha)))
+        self.assertEqual(os.listdir(self.cache.tmpdir), [])
+        self.panel.checksums['Alpha.cs'] = sha256(alpha)
+        self.assertEqual(self.fetch(), (True, [], sha256(alpha)))
+
+    def test_corrupt_object_is_discarded_and_fetched_again(self):
+        self.fetch()
+        with open(self.cache.objectpath(sha256(alpha)), 'r+b') as file:
+            file.write(b'#')
+        self.cache = self.open()
+        self.assertIsNone(self.cache.get(sha256(alpha)))
+        self.assertIsNone(self.cache.lookup(self.panel.origin('Alpha.cs')))
+        self.assertEqual(self.fetch(), (True, [], sha256(alpha)))
+        self.assertEqual(self.responses[-1][1], 200)
+        self.assertIsNotNone(self.cache.get(sha256(alpha)))
+
+    def partial(self, body:bytes, etag:str):
+        # what an interrupted download leaves behind.
+        partial = self.cache._partialpath(self.panel.origin('Alpha.cs'))
+        os.makedirs(os.path.dirname(partial), exist_ok=True)
+        with open(partial, 'wb') as file:
+            file.write(body)
+        with open(partial + '.yaml', 'w') as file:
+            yaml.safe_dump({'origin':self.panel.origin('Alpha.cs'), 'etag':etag, 'last_modified':None}, file)
+
+    def test_resumes_from_partial_download(self):
+        self.partial(alpha[:1000], '"{}"'.format(sha256(alpha)[:16]))
+        self.assertEqual(self.fetch(), (True, [], sha256(alpha)))
+        headers, status = self.responses[-1]
+        self.assertEqual((headers['Range'], status), ('bytes=1000-', 206))
+        with open(self.cache.get(sha256(alpha)), 'rb') as file:
+            self.assertEqual(file.read(), alpha)
+        self.assertEqual(os.listdir(self.cache.tmpdir), [])
+
+    def test_changed_origin_restarts_partial_download(self):
+        self.partial(alpha2[:1000], '"stale"')
+        self.assertEqual(self.fetch(), (True, [], sha256(alpha)))
+        headers, status = self.responses[-1]
+        self.assertEqual((headers['If-Range'], status), ('"stale"', 200))
+
+    def test_unchanged_origin_answers_304(self):
+        self.fetch()
+        self.cache = self.open()
+        self.assertEqual(self.fetch(), (True, [], sha256(alpha)))
+        headers, status = self.responses[-1]
+        self.assertEqual((headers['If-None-Match'], status), ('"{}"'.format(sha256(alpha)[:16]), 304))
+        # the same process asks the origin once.
+        self.fetch()
+        self.assertEqual(len(self.responses), 2)
+        self.panel.origins['Alpha.cs'] = alpha2
+        self.cache.refresh()
+        self.assertEqual(self.fetch(), (True, [], sha256(alpha2)))
+        self.assertEqual(self.responses[-1][1], 200)
+        self.assertEqual(self.cache.versions(self.panel.origin('Alpha.cs')), [sha256(alpha2), sha256(alpha)])
+
+    def test_collect_evicts_least_recently_used(self):
+        self.fetch()
+        self.panel.origins['Alpha.cs'] = alpha2
+        self.cache.refresh()
+        for name in ('Alpha.cs', 'Beta.cs', 'Gamma.cs'):
+            self.fetch(name)
+        # oldest first: the previous Alpha, Beta, Gamma and the current Alpha.
+        for atime, body in enumerate((alpha, beta, gamma, alpha2)):
+            self.cache.index['objects'][sha256(body)]['atime'] = atime
+        self.cache.maxbytes = len(alpha) + len(alpha2) + len(gamma)
+        self.assertEqual(self.cache.collect({sha256(alpha2)}), [sha256(beta)])
+        self.cache.maxbytes = 1
+        self.assertEqual(self.cache.collect({sha256(alpha2)}), [sha256(gamma)])
+        self.assertEqual(self.cache.versions(self.panel.origin('Alpha.cs')), [sha256(alpha2), sha256(alpha)])
+        self.assertIsNone(self.cache.lookup(self.panel.origin('Beta.cs')))
+
+
+if __name__ == '__main__':
+    unittest.main()
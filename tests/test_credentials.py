@@ -0,0 +1,138 @@
+# the credential backends and the memo that resolves each secret once per process. run from the
+# repository root with python -m unittest or pytest.
+from pathlib import Path
+from unittest import mock
+
+import importlib.util
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root)]
+
+from pyrustplugins import settings, rpCredentials, rpKeyringCredentials, rpEnvCredentials, rpFileCredentials
+
+
+class rpCountingCredentials(rpCredentials):
+
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    def read(self, key:str) -> str:
+        self.reads.append(key)
+        return 'secret-' + key
+
+
+class rpCredentialsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = settings.credentialbackend, settings.credentialenv, settings.credentialfile, settings.appkey
+        rpCredentials._provider = None
+
+    def tearDown(self):
+        settings.credentialbackend, settings.credentialenv, settings.credentialfile, settings.appkey = self.saved
+        rpCredentials._provider = None
+
+    def test_memo_reads_each_secret_once(self):
+        credentials = rpCountingCredentials()
+        self.assertEqual([credentials.get('bearer') for i in range(3)], ['secret-bearer'] * 3)
+        self.assertEqual(credentials.get('other'), 'secret-other')
+        self.assertEqual(credentials.reads, ['bearer', 'other'])
+
+    def test_base_has_no_secrets_and_is_read_only(self):
+        credentials = rpCredentials()
+        self.assertIsNone(credentials.get('bearer'))
+        with self.assertRaises(PermissionError):
+            credentials.set('bearer', 'token')
+
+    def test_provider_is_chosen_once(self):
+        settings.credentialbackend = 'env'
+        provider = rpCredentials.provider()
+        self.assertIsInstance(provider, rpEnvCredentials)
+        settings.credentialbackend = 'file'
+        self.assertIs(rpCredentials.provider(), provider)
+
+    def test_unknown_backend(self):
+        settings.credentialbackend = 'vault'
+        with self.assertRaises(ValueError):
+            rpCredentials.provider()
+
+    def test_env(self):
+        settings.credentialenv = 'RPTEST_{key}'
+        credentials = rpEnvCredentials()
+        with mock.patch.dict(os.environ, {'RPTEST_BEARER':'token'}):
+            self.assertEqual(credentials.get('bearer'), 'token')
+            # the same value is accepted, only a different one needs the environment changed.
+            credentials.set('bearer', 'token')
+            with self.assertRaises(PermissionError):
+                credentials.set('bearer', 'other')
+        self.assertEqual(credentials.get('bearer'), 'token')
+        with mock.patch.dict(os.environ, {'RPTEST_OTHER':''}):
+            self.assertIsNone(rpEnvCredentials().get('other'))
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.credentialfile = os.path.join(tmp, 'secret-{key}')
+            credentials = rpFileCredentials()
+            self.assertIsNone(credentials.get('bearer'))
+            credentials.set('bearer', 'token')
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.join(tmp, 'secret-bearer')).st_mode), 0o600)
+            with open(os.path.join(tmp, 'secret-other'), 'w') as file:
+                file.write('other\n')
+            fresh = rpFileCredentials()
+            self.assertEqual((fresh.get('bearer'), fresh.get('other')), ('token', 'other'))
+
+    def test_file_descriptor_is_read_once(self):
+        readfd, writefd = os.pipe()
+        os.write(writefd, b'token\n')
+        os.close(writefd)
+        settings.credentialfile = 'fd:{}'.format(readfd)
+        credentials = rpFileCredentials()
+        self.assertEqual(credentials.get('bearer'), 'token')
+        with self.assertRaises(OSError):
+            os.fstat(readfd)
+        self.assertEqual(credentials.get('bearer'), 'token')
+        with self.assertRaises(PermissionError):
+            credentials.set('bearer', 'other')
+
+    @unittest.skipUnless(importlib.util.find_spec('keyring'), 'keyring is not installed')
+    def test_keyring(self):
+        import keyring
+        import keyring.backend
+
+        class rpMemoryKeyring(keyring.backend.KeyringBackend):
+            priority = 1
+
+            def __init__(self):
+                super().__init__()
+                self.passwords = {}
+
+            def get_password(self, service, username):
+                return self.passwords.get((service, username))
+
+            def set_password(self, service, username, password):
+                self.passwords[(service, username)] = password
+
+            def delete_password(self, service, username):
+                self.passwords.pop((service, username), None)
+
+        saved = keyring.get_keyring()
+        memory = rpMemoryKeyring()
+        keyring.set_keyring(memory)
+        try:
+            settings.appkey = 'test'
+            credentials = rpKeyringCredentials()
+            self.assertIsNone(credentials.get('other'))
+            credentials.set('bearer', 'token')
+            self.assertEqual(memory.passwords, {('rustplugins', 'test-bearer'):'token'})
+            self.assertEqual(rpKeyringCredentials().get('bearer'), 'token')
+        finally:
+            keyring.set_keyring(saved)
+
+
+if __name__ == '__main__':
+    unittest.main()
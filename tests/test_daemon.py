@@ -0,0 +1,40 @@
+# jobs the daemon turns away before they are queued. run from the repository root with
+# python -m unittest or pytest.
+from pathlib import Path
+
+import os
+import sys
+import tempfile
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root)]
+
+from pyrustplugins import rpCache, rpConfig, rpConnection, rpDaemon
+
+
+class rpDaemonRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.daemon = rpDaemon(rpConnection('https://panel.example', 'token'), rpCache(self.tmp.name), rpConfig(), os.path.join(self.tmp.name, 'daemon.sock'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unsafe_plugin_names_are_rejected(self):
+        for localname in ('../../etc/cron.d/x.cs', 'oxide/Kits.cs', '..\\Kits.cs', 'Kits..cs', '..', '', None):
+            for request in ({'op':'install', 'server':'abc12345', 'plugins':{'Kits.cs':'https://umod.org/plugins/Kits.cs', localname:'https://umod.org/plugins/Kits.cs'}},
+                            {'op':'remove', 'server':'abc12345', 'plugins':['Kits.cs', localname]}):
+                reply = self.daemon.handle(request)
+                self.assertFalse(reply['ok'], request)
+                self.assertIn("path separators", reply['error'])
+        self.assertEqual(self.daemon.jobs.qsize(), 0)
+
+    def test_plain_names(self):
+        for localname in ('Kits.cs', 'Better Chat.cs', 'ZLevelsRemastered.cs'):
+            self.assertTrue(rpDaemon.plainname(localname), localname)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# the queued debug log: records are merged and redacted before they are queued, and a full
+# queue drops rather than blocks. run from the repository root with python -m unittest or pytest.
+from pathlib import Path
+
+import logging
+import queue
+import sys
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root)]
+
+from pyrustplugins.log import rpLogQueueHandler
+
+
+class rpLogQueueHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = rpLogQueueHandler(queue.Queue(2))
+        self.logger = logging.getLogger('rustplugins.test')
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_secrets_in_args_are_redacted(self):
+        self.logger.debug("GET %s with %s", "https://node.example/upload/file?token=abc123", {'Authorization':'Bearer sekrit'})
+        record = self.handler.queue.get_nowait()
+        self.assertIsNone(record.args)
+        self.assertEqual(record.getMessage(), "GET https://node.example/upload/file?token=*** with {'Authorization': 'Bearer ***'}")
+
+    def test_args_are_merged_when_logged(self):
+        plugins = ['Alpha.cs']
+        self.logger.debug("uploading %s", plugins)
+        plugins.append('Beta.cs')
+        self.assertEqual(self.handler.queue.get_nowait().getMessage(), "uploading ['Alpha.cs']")
+
+    def test_traceback_is_rendered_when_logged(self):
+        try:
+            raise ValueError('password=hunter2')
+        except ValueError:
+            self.logger.exception("failed")
+        record = self.handler.queue.get_nowait()
+        self.assertIsNone(record.exc_info)
+        self.assertIn('Traceback', record.getMessage())
+        self.assertIn('ValueError: password=***', record.getMessage())
+
+    def test_full_queue_drops(self):
+        for i in range(5):
+            self.logger.debug("record %s", i)
+        self.assertEqual(self.handler.dropped, 3)
+        self.assertEqual(self.handler.queue.get_nowait().getMessage(), 'record 0')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# rpServer.plan and apply against the mock panel: the plan holds only the operations that change
+# something, and a renamed plugin is renamed on the server. run from the repository root with
+# python -m unittest or pytest.
+from pathlib import Path
+
+import os
+import sys
+import tempfile
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root), str(root / 'bench')]
+
+from pyrustplugins import settings, rpCache, rpConnection, rpServer
+from mockpanel import rpMockPanel
+
+alpha = b'[Info("Alpha", "me", "1.0.0")] class Alpha {}'
+beta = b'[Info("Beta", "me", "1.0.0")] class Beta {}'
+
+
+class rpPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.panel = rpMockPanel(1, origins={'Alpha.cs':alpha, 'Beta.cs':beta}).start()
+        self.identifier = next(iter(self.panel.servers))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = settings.seeddirname
+        settings.seeddirname = None
+        self.connection = rpConnection(self.panel.url, 'token')
+        self.cache = rpCache(os.path.join(self.tmp.name, 'cache'))
+        self.server = rpServer(self.identifier)
+        for name in ('Alpha', 'Beta'):
+            self.server.pluginadd(self.panel.origin(name + '.cs'), name + '.cs', 'oxide/plugins/{}.cs'.format(name))
+
+    def tearDown(self):
+        settings.seeddirname = self.saved
+        self.connection.close()
+        self.tmp.cleanup()
+        self.panel.stop()
+
+    def plan(self, localnames:list=None, removals:list=()):
+        self.panel.reset()
+        return self.server.plan(self.connection, self.cache, localnames, removals)
+
+    def apply(self, plan) -> dict:
+        self.panel.reset()
+        return self.server.apply(self.connection, self.cache, plan, False, False)
+
+    def files(self) -> dict:
+        return {path: body for path, (body, modified) in self.panel.servers[self.identifier]['files'].items()}
+
+    def kinds(self, plan) -> list:
+        return [(localname, operation) for localname, operation, detail in plan.operations()]
+
+    def test_fresh_server(self):
+        plan = self.plan()
+        self.assertEqual(self.kinds(plan), [
+            ('Alpha.cs', 'download'), ('Beta.cs', 'download'), ('Alpha.cs', 'upload'), ('Beta.cs', 'upload'), ('*', 'reload'),
+        ])
+        self.assertEqual(self.panel.calls, {'GET files/list':1})
+        self.assertEqual(self.apply(plan), {'Alpha.cs':('updated', ''), 'Beta.cs':('updated', '')})
+        self.assertEqual(self.files(), {'oxide/plugins/Alpha.cs':alpha, 'oxide/plugins/Beta.cs':beta})
+        self.assertEqual(self.panel.calls['wings upload'], 1)
+
+    def test_converged_server_needs_nothing(self):
+        self.apply(self.plan())
+        plan = self.plan()
+        self.assertTrue(plan.empty())
+        self.assertEqual(self.kinds(plan), [('Alpha.cs', 'unchanged'), ('Beta.cs', 'unchanged')])
+        # what was uploaded is known by its listing entry, nothing is read back.
+        self.assertEqual(self.panel.calls, {'GET files/list':1})
+        self.assertEqual(self.apply(plan), {'Alpha.cs':('unchanged', ''), 'Beta.cs':('unchanged', '')})
+        self.assertEqual(self.panel.calls, {})
+
+    def test_only_the_changed_plugin_is_uploaded(self):
+        self.apply(self.plan())
+        self.panel.setfile(self.identifier, 'oxide/plugins/Beta.cs', beta + b' // edited')
+        plan = self.plan()
+        self.assertEqual(self.kinds(plan), [('Beta.cs', 'backup'), ('Beta.cs', 'upload'), ('*', 'reload'), ('Alpha.cs', 'unchanged')])
+        self.assertEqual(plan.reasons['Beta.cs'], 'differs from cache')
+        self.apply(plan)
+        self.assertEqual(self.files()['oxide/plugins/Beta.cs'], beta)
+        self.assertEqual(self.panel.calls['wings upload'], 1)
+
+    def test_renamed_plugin_is_renamed(self):
+        self.apply(self.plan())
+        self.server.pluginadd(self.panel.origin('Alpha.cs'), 'AlphaRenamed.cs', 'oxide/plugins/AlphaRenamed.cs')
+        # rpRollout downloads every candidate before planning, the cache already holds it.
+        self.assertEqual(self.server.plugindownload(self.cache, 'AlphaRenamed.cs', False), (True, []))
+        plan = self.plan(['AlphaRenamed.cs'], ['Alpha.cs'])
+        self.assertEqual(plan.renames, [('AlphaRenamed.cs', 'Alpha.cs', 'oxide/plugins/Alpha.cs', 'oxide/plugins/AlphaRenamed.cs')])
+        self.assertEqual(self.kinds(plan), [('AlphaRenamed.cs', 'rename'), ('*', 'reload')])
+        results = self.apply(plan)
+        self.assertEqual(results, {'Alpha.cs':('removed', 'renamed to AlphaRenamed.cs'), 'AlphaRenamed.cs':('updated', 'renamed from Alpha.cs')})
+        self.assertEqual(self.files(), {'oxide/plugins/AlphaRenamed.cs':alpha, 'oxide/plugins/Beta.cs':beta})
+        self.assertEqual(self.panel.calls, {'PUT files/rename':1})
+        self.assertEqual(sorted(self.server.pluginlist), ['AlphaRenamed.cs', 'Beta.cs'])
+
+    def test_removed_plugins(self):
+        self.apply(self.plan())
+        self.panel.servers[self.identifier]['files'].pop('oxide/plugins/Beta.cs')
+        plan = self.plan([], ['Alpha.cs', 'Beta.cs'])
+        self.assertEqual(self.kinds(plan), [('Alpha.cs', 'delete'), ('Beta.cs', 'forget')])
+        self.apply(plan)
+        self.assertEqual(self.files(), {})
+        self.assertEqual(self.panel.calls, {'POST files/delete':1})
+        self.assertEqual(self.server.pluginlist, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+# the retry policy of rpRateLimiter.request against a scripted session. run from the repository
+# root with python -m unittest or pytest.
+from pathlib import Path
+from unittest import mock
+
+import io
+import sys
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root)]
+
+from pyrustplugins import settings, connection
+from pyrustplugins.connection import rpRateLimiter, rpTokenBucket
+from pyrustplugins.util import requests
+
+
+class rpScriptedSession:
+    # answers each request with the next status, (status, headers) or exception in script.
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.sent = []
+
+    def request(self, method:str, url:str, **kwargs) -> requests.Response:
+        self.sent.append(method)
+        answer = self.script.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers = answer if isinstance(answer, tuple) else (answer, {})
+        r = requests.Response()
+        r.status_code = status
+        r.headers.update(headers)
+        r.raw = io.BytesIO(b'')
+        return r
+
+
+class rpRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = settings.httpretries, settings.httpbackoff, settings.httpbackoffmax
+        settings.httpretries, settings.httpbackoff, settings.httpbackoffmax = 3, 0.5, 8
+        self.sleeps = []
+        patcher = mock.patch.object(connection.time, 'sleep', self.sleeps.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        settings.httpretries, settings.httpbackoff, settings.httpbackoffmax = self.saved
+
+    def request(self, session:rpScriptedSession, method:str, **kwargs) -> requests.Response:
+        return rpRateLimiter.request(rpTokenBucket(0), session, 'panel', method, 'https://panel.example/api', **kwargs)
+
+    def test_429_is_retried_for_any_method(self):
+        for method in ('GET', 'POST', 'PUT', 'DELETE'):
+            session = rpScriptedSession(429, 429, 200)
+            self.assertEqual(self.request(session, method, data=b'{}').status_code, 200)
+            self.assertEqual(session.sent, [method] * 3)
+
+    def test_retries_stop_at_httpretries(self):
+        session = rpScriptedSession(429, 429, 429, 429, 200)
+        self.assertEqual(self.request(session, 'GET').status_code, 429)
+        self.assertEqual(len(session.sent), 4)
+
+    def test_retry_after_is_honored(self):
+        session = rpScriptedSession((429, {'Retry-After':'30'}), 200)
+        self.assertEqual(self.request(session, 'POST').status_code, 200)
+        # the backoff, then the rest of the 30 seconds the panel asked for.
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertLessEqual(self.sleeps[0], 0.5)
+        self.assertAlmostEqual(sum(self.sleeps), 30, delta=0.5)
+
+    def test_gateway_errors_are_retried_only_when_idempotent(self):
+        for status in (502, 503, 504):
+            for method in ('GET', 'HEAD', 'OPTIONS'):
+                session = rpScriptedSession(status, 200)
+                self.assertEqual(self.request(session, method).status_code, 200)
+                self.assertEqual(len(session.sent), 2)
+            for method in ('POST', 'PUT', 'DELETE'):
+                session = rpScriptedSession(status, 200)
+                self.assertEqual(self.request(session, method).status_code, status)
+                self.assertEqual(len(session.sent), 1)
+        session = rpScriptedSession(500, 200)
+        self.assertEqual(self.request(session, 'GET').status_code, 500)
+
+    def test_connection_errors_are_retried_only_when_idempotent(self):
+        session = rpScriptedSession(requests.exceptions.ConnectionError('reset'), 200)
+        self.assertEqual(self.request(session, 'GET').status_code, 200)
+        session = rpScriptedSession(requests.exceptions.ConnectionError('reset'), 200)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.request(session, 'POST')
+
+    def test_streamed_bodies_are_never_replayed(self):
+        for answer in (429, 503, requests.exceptions.Timeout('slow')):
+            session = rpScriptedSession(answer, 200)
+            if isinstance(answer, Exception):
+                with self.assertRaises(requests.exceptions.Timeout):
+                    self.request(session, 'GET', data=io.BytesIO(b'plugin'))
+            else:
+                self.assertEqual(self.request(session, 'GET', data=io.BytesIO(b'plugin')).status_code, answer)
+            self.assertEqual(len(session.sent), 1)
+        self.assertEqual(self.sleeps, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
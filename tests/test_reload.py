@@ -0,0 +1,109 @@
+# reload confirmation against the mock panel's console websocket, for the sync and the asyncio
+# servers. run from the repository root with python -m unittest or pytest.
+from pathlib import Path
+
+import asyncio
+import sys
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root), str(root / 'bench')]
+
+from pyrustplugins import settings, rpAsyncConnection, rpAsyncServer, rpConnection, rpServer, rpUtil
+from mockpanel import rpMockPanel
+
+
+class rpMatchReloadLineTest(unittest.TestCase):
+
+    def test_compiled_single(self):
+        compiled = []
+        self.assertEqual(rpUtil.match_reload_line("Alpha was compiled successfully in 812ms", {'Alpha':'Alpha.cs'}, compiled), (None, None))
+        self.assertEqual(compiled, ['Alpha'])
+
+    def test_compiled_batch(self):
+        compiled = []
+        pending = {'Alpha':'Alpha.cs', 'Beta':'Beta.cs', 'Gamma':'Gamma.cs'}
+        rpUtil.match_reload_line("\x1b[32mAlpha, Beta and Gamma were compiled successfully in 1534ms\x1b[0m", pending, compiled)
+        self.assertEqual(compiled, ['Alpha', 'Beta', 'Gamma'])
+
+    def test_compiled_ignores_others(self):
+        compiled = []
+        rpUtil.match_reload_line("Alpha and Other were compiled successfully in 900ms", {'Alpha':'Alpha.cs'}, compiled)
+        self.assertEqual(compiled, ['Alpha'])
+
+    def test_loaded_by_title(self):
+        self.assertEqual(rpUtil.match_reload_line("Loaded plugin Better Chat v5.2.1 by LaserHydra", {'BetterChat':'BetterChat.cs'}, []), ('BetterChat', True))
+
+    def test_loaded_falls_back_to_compiled(self):
+        self.assertEqual(rpUtil.match_reload_line("Loaded plugin Something Else v1.0.0 by me", {'Alpha':'Alpha.cs', 'Beta':'Beta.cs'}, ['Beta']), ('Beta', True))
+
+    def test_failed(self):
+        self.assertEqual(rpUtil.match_reload_line("Error while compiling: Alpha.cs(1,1): error CS1002: ; expected", {'Alpha':'Alpha.cs'}, []), ('Alpha', False))
+
+    def test_unrelated(self):
+        self.assertEqual(rpUtil.match_reload_line("Saved 1024 ents", {'Alpha':'Alpha.cs'}, []), (None, None))
+
+
+class rpReloadTest(unittest.TestCase):
+    localnames = ['Alpha.cs', 'Beta.cs', 'Gamma.cs']
+
+    def setUp(self):
+        self.panel = rpMockPanel(1).start()
+        self.identifier = next(iter(self.panel.servers))
+        self.timeout = settings.reloadtimeout
+        settings.reloadtimeout = 1
+
+    def tearDown(self):
+        settings.reloadtimeout = self.timeout
+        self.panel.stop()
+
+    def flush(self) -> dict:
+        connection = rpConnection(self.panel.url, 'token')
+        try:
+            for localname in self.localnames:
+                connection.queue_reload(self.identifier, localname)
+            return rpServer(self.identifier).pluginreloadflush(connection)
+        finally:
+            connection.close()
+
+    def flushasync(self) -> dict:
+        async def flush():
+            connection = rpAsyncConnection(self.panel.url, 'token')
+            try:
+                return await rpAsyncServer(rpServer(self.identifier)).pluginreload(connection, self.localnames)
+            finally:
+                await connection.close()
+        return asyncio.run(flush())
+
+    def check(self, results:dict):
+        self.assertEqual(set(results), set(self.localnames))
+        self.assertEqual(results['Alpha.cs'][0], True)
+        self.assertIn('Loaded plugin Alpha', results['Alpha.cs'][1])
+        self.assertEqual(results['Beta.cs'][0], False)
+        self.assertIn('Error while compiling', results['Beta.cs'][1])
+        self.assertIsNone(results['Gamma.cs'][0])
+        self.assertIn('1s', results['Gamma.cs'][1])
+        self.assertEqual(self.panel.calls.get('console command'), 1)
+        self.assertNotIn('POST command', self.panel.calls)
+
+    def test_loaded(self):
+        results = self.flush()
+        self.assertEqual({localname: ok for localname, (ok, detail, seconds) in results.items()}, dict.fromkeys(self.localnames, True))
+
+    def test_loaded_failed_and_timeout(self):
+        self.panel.reloads.update({'Beta':'failed', 'Gamma':'silent'})
+        self.check(self.flush())
+
+    def test_async_loaded_failed_and_timeout(self):
+        self.panel.reloads.update({'Beta':'failed', 'Gamma':'silent'})
+        self.check(self.flushasync())
+
+    def test_without_websocket(self):
+        self.panel.servers[self.identifier]['uuid'] = 'missing'
+        results = self.flush()
+        self.assertEqual({ok for ok, detail, seconds in results.values()}, {None})
+        self.assertEqual(self.panel.calls.get('POST command'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# rolling back to the copy an update moved aside, and again after a rollback whose last rename
+# failed, against the mock panel. run from the repository root with python -m unittest or pytest.
+from pathlib import Path
+
+import os
+import sys
+import tempfile
+import unittest
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root), str(root / 'bench')]
+
+from pyrustplugins import settings, rpCache, rpConnection, rpServer
+from mockpanel import rpMockPanel
+
+v1 = b'[Info("Alpha", "me", "1.0.0")] class Alpha {}'
+v2 = b'[Info("Alpha", "me", "2.0.0")] class Alpha {}'
+live = 'oxide/plugins/Alpha.cs'
+backup = live + settings.backupsuffix
+aside = live + '.rollback'
+
+
+class rpRollbackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.panel = rpMockPanel(1, origins={'Alpha.cs':v1}).start()
+        self.identifier = next(iter(self.panel.servers))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.connection = rpConnection(self.panel.url, 'token')
+        self.cache = rpCache(os.path.join(self.tmp.name, 'cache'))
+        self.server = rpServer(self.identifier)
+        self.server.pluginadd(self.panel.origin('Alpha.cs'), 'Alpha.cs', live)
+        self.apply()
+        self.panel.origins['Alpha.cs'] = v2
+        self.cache.refresh()
+        self.apply(['Alpha.cs'])
+        self.assertEqual(self.files(), {live:v2, backup:v1})
+
+    def tearDown(self):
+        self.connection.close()
+        self.tmp.cleanup()
+        self.panel.stop()
+
+    def apply(self, refresh:list=()):
+        plan = self.server.plan(self.connection, self.cache, refresh=refresh)
+        self.server.apply(self.connection, self.cache, plan, False, False)
+
+    def files(self) -> dict:
+        return {path: body for path, (body, modified) in self.panel.servers[self.identifier]['files'].items()}
+
+    def rollback(self) -> tuple:
+        self.panel.reset()
+        return self.server.pluginrollback(self.connection, self.cache, 'Alpha.cs')
+
+    def test_swaps_back_and_forth(self):
+        self.assertTrue(self.rollback()[0])
+        self.assertEqual(self.files(), {live:v1, backup:v2})
+        self.assertEqual(self.panel.calls['PUT files/rename'], 3)
+        self.assertTrue(self.rollback()[0])
+        self.assertEqual(self.files(), {live:v2, backup:v1})
+
+    def test_failed_last_rename_then_rollback_again(self):
+        self.panel.renamefailures.add(backup)
+        self.assertTrue(self.rollback()[0])
+        self.assertEqual(self.files(), {live:v1, aside:v2})
+        self.assertEqual(self.server.pluginlist['Alpha.cs']['previous']['remote'], aside)
+        self.panel.renamefailures.clear()
+        ok, detail = self.rollback()
+        self.assertTrue(ok, detail)
+        self.assertEqual(self.files(), {live:v2, backup:v1})
+        self.assertEqual(self.panel.calls['PUT files/rename'], 2)
+        self.assertEqual(self.server.pluginlist['Alpha.cs']['previous']['remote'], backup)
+        self.assertTrue(self.rollback()[0])
+        self.assertEqual(self.files(), {live:v1, backup:v2})
+
+    def test_stale_copy_in_the_way_is_cleared(self):
+        self.panel.setfile(self.identifier, aside, b'left over')
+        self.assertTrue(self.rollback()[0])
+        self.assertEqual(self.files(), {live:v1, backup:v2})
+
+
+if __name__ == '__main__':
+    unittest.main()
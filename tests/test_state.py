@@ -0,0 +1,82 @@
+# the sqlite state store and its one shot config.yaml migration. run from the repository root
+# with python -m unittest or pytest.
+from pathlib import Path
+
+import os
+import sys
+import tempfile
+import unittest
+import yaml
+
+root = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(root)]
+
+from pyrustplugins import rpConfig
+
+legacy = """config: rustpluginsv1
+instance: https://panel.example
+lang: en
+remoteoxideplugins: oxide/plugins
+serverlist:
+- !!python/object:rp.rpServer
+  identifier: abc12345
+  logger: !!python/object/apply:logging.getLogger
+  - rustplugins.server
+  name: Main
+  pluginlist:
+    Kits.cs:
+      cached: false
+      hash: null
+      local: null
+      origin: https://umod.org/plugins/Kits.cs
+      remote: oxide/plugins/Kits.cs
+  state: running
+  uuid: abc12345-0000
+"""
+
+
+class rpConfigMigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.statefile = os.path.join(self.tmp.name, 'state.db')
+        self.legacyfile = os.path.join(self.tmp.name, 'config.yaml')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, text:str):
+        with open(self.legacyfile, 'w') as file:
+            file.write(text)
+
+    def check_migrated(self, config:rpConfig):
+        self.assertEqual(config.get('instance'), 'https://panel.example')
+        server = config.server_getmanaged('abc12345')
+        self.assertEqual((server.name, server.uuid), ('Main', 'abc12345-0000'))
+        self.assertEqual(server.pluginlist['Kits.cs']['origin'], 'https://umod.org/plugins/Kits.cs')
+        self.assertFalse(os.path.exists(self.legacyfile))
+        self.assertTrue(os.path.isfile(self.legacyfile + '.migrated'))
+
+    def test_migrates_once(self):
+        self.write(legacy)
+        self.check_migrated(rpConfig().open(self.statefile, self.legacyfile))
+        self.write("instance: https://other.example\n")
+        config = rpConfig().open(self.statefile, self.legacyfile)
+        self.assertEqual(config.get('instance'), 'https://panel.example')
+        self.assertTrue(os.path.isfile(self.legacyfile))
+
+    def test_malformed_legacy_file_is_retried(self):
+        self.write("instance: [unclosed\n")
+        with self.assertRaises(yaml.YAMLError):
+            rpConfig().open(self.statefile, self.legacyfile)
+        self.write(legacy)
+        self.check_migrated(rpConfig().open(self.statefile, self.legacyfile))
+
+    def test_fresh_without_legacy_file(self):
+        config = rpConfig().open(self.statefile, self.legacyfile)
+        self.assertEqual(config.get('instance'), '')
+        self.assertEqual(config.get('remoteoxideplugins'), 'oxide/plugins')
+
+
+if __name__ == '__main__':
+    unittest.main()